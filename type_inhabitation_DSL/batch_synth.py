@@ -0,0 +1,141 @@
+# batch_synth.py
+"""
+プロセスプールによる一括合成
+
+大量の (src, goal) の組（夜間バッチで約20万件）を複数のコアで探索する。
+コンパイル済みカタログはワーカーごとに一度だけ渡す:
+  - fork ではプール作成前に親プロセスのモジュール変数に置き、子はそれを共有する
+  - spawn / forkserver ではプールの initializer で一度だけ pickle して渡す
+問い合わせごとに送るのは型名だけで、ワーカーは Func ではなく辺IDの列を返し、
+親プロセスが自分のカタログの Func に戻す。結果は終わった順に返る。
+
+使用例:
+  python batch_synth.py catalog.dsl pairs.txt --workers 8 > plans.jsonl
+  （pairs.txt は1行に "src goal"）
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+from itertools import islice
+from typing import Iterable, Iterator, Optional, Tuple
+
+from synth_lib import (Catalog, SearchConstraints, _backward_search, _path_edges,
+                       path_to_json)
+
+# ワーカープロセス内のカタログ（fork では親から引き継ぐ）
+_worker_catalog: Optional[Catalog] = None
+_worker_options: dict = {}
+
+def _init_worker(catalog: Catalog, options: dict):
+    """spawn / forkserver のワーカー初期化（カタログを一度だけ受け取る）"""
+    global _worker_catalog, _worker_options
+    _worker_catalog = catalog
+    _worker_options = options
+
+def _search_edges(catalog: Catalog, src_type: str, goal_type: str, options: dict):
+    """synthesize_backward と同じ探索を行い、[(cost, [辺ID])] を返す"""
+    _, results, _, _ = _backward_search(
+        catalog, src_type, goal_type, options['max_cost'], options['max_steps'],
+        options['heuristic'], options['max_results'], None,
+        constraints=options['constraints'])
+    results.sort(key=lambda x: x[0])
+    return [(c, _path_edges(path)) for c, path in results]
+
+def _run_chunk(chunk):
+    """ワーカーで問い合わせのまとまりを処理する"""
+    return [(i, src, goal, _search_edges(_worker_catalog, src, goal, _worker_options))
+            for i, src, goal in chunk]
+
+def _chunks(queries: Iterable[Tuple[str, str]], size: int):
+    it = enumerate(queries)
+    while True:
+        chunk = [(i, src, goal) for i, (src, goal) in islice(it, size)]
+        if not chunk:
+            return
+        yield chunk
+
+def synthesize_many(catalog: Catalog, queries: Iterable[Tuple[str, str]], workers: Optional[int] = None,
+                    max_cost=100, max_steps=10000, heuristic=None, max_results=None,
+                    constraints: Optional[SearchConstraints] = None, chunksize: int = 64,
+                    mp_context=None) -> Iterator[tuple]:
+    """(src, goal) の組をまとめて synthesize_backward で探索する
+
+    結果は終わった順に (i, src, goal, [(cost, [Func])]) として返す（i は queries 内の位置）。
+    workers は並列数（None ならCPU数、1 以下ならこのプロセスで順に実行）。
+    heuristic='alt' のランドマークや到達可能性インデックスは親で前計算してから渡す。
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    options = {
+        'max_cost': max_cost,
+        'max_steps': max_steps,
+        'heuristic': heuristic,
+        'max_results': max_results,
+        'constraints': constraints,
+    }
+    cc = catalog.compile()
+    catalog.reachability()
+    if heuristic == 'alt':
+        catalog.landmarks()
+
+    if workers <= 1:
+        for chunk in _chunks(queries, chunksize):
+            for i, src, goal in chunk:
+                results = _search_edges(catalog, src, goal, options)
+                yield i, src, goal, [(c, cc.to_funcs(edges)) for c, edges in results]
+        return
+
+    global _worker_catalog, _worker_options
+    ctx = mp_context or multiprocessing.get_context()
+    if ctx.get_start_method() == 'fork':
+        # 子プロセスは fork 時点の親のメモリ（コンパイル済みカタログ）をそのまま使う
+        _worker_catalog, _worker_options = catalog, options
+        pool = ctx.Pool(workers)
+    else:
+        pool = ctx.Pool(workers, initializer=_init_worker, initargs=(catalog, options))
+    try:
+        for done in pool.imap_unordered(_run_chunk, _chunks(queries, chunksize)):
+            for i, src, goal, results in done:
+                yield i, src, goal, [(c, cc.to_funcs(edges)) for c, edges in results]
+    finally:
+        pool.terminate()
+        pool.join()
+        _worker_catalog, _worker_options = None, {}
+
+def main():
+    parser = argparse.ArgumentParser(description='Batch type synthesis over a process pool')
+    parser.add_argument('catalog', help='DSL or YAML catalog file')
+    parser.add_argument('pairs', help='File with one "src goal" pair per line')
+    parser.add_argument('--workers', type=int, help='Number of worker processes (default: CPU count)')
+    parser.add_argument('--max-cost', type=float, default=50,
+                        help='Maximum cost for path search')
+    parser.add_argument('--heuristic', choices=['alt'], help='Use the ALT landmark heuristic')
+    args = parser.parse_args()
+
+    cat = Catalog.load(args.catalog)
+
+    def read_pairs(path):
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 2:
+                    yield parts[0], parts[1]
+
+    count = 0
+    for _, src, goal, results in synthesize_many(cat, read_pairs(args.pairs), workers=args.workers,
+                                                 max_cost=args.max_cost, heuristic=args.heuristic,
+                                                 max_results=1):
+        plan = None
+        if results:
+            cost, path = results[0]
+            plan = {"cost": cost, "steps": path_to_json(path),
+                    "proof": " ∘ ".join(f.id for f in path)}
+        print(json.dumps({"goal": f"{src}->{goal}", "plan": plan}, ensure_ascii=False))
+        count += 1
+    print(f"Synthesized {count} queries", file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
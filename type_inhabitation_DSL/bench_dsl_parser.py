@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# bench_dsl_parser.py
+"""
+DSLパーサーのベンチマーク
+
+合成したDSLカタログ（型と関数が一定の比率）をサイズを倍々にしてパースし、
+時間と処理速度を表示する。MB/s がサイズによらずほぼ一定なら線形時間。
+
+使用例:
+  python bench_dsl_parser.py                 # 1, 2, 4, 8, 16 MB
+  python bench_dsl_parser.py --sizes 10 50   # 10 MB と 50 MB
+"""
+
+import argparse
+import random
+import time
+
+from dsl_parser import DSLParser
+
+IMPLS = [
+    'formula("co2 = fuel * emission_factor")',
+    'sparql("SELECT ?f ?e WHERE { ?f :hasEnergy ?e . FILTER(?e > 0) }")',
+    'rest("GET, https://api.example.com/ghg/{id}")',
+]
+
+def generate_dsl(num_bytes: int, seed: int = 0) -> str:
+    """約 num_bytes バイトの合成DSLカタログ"""
+    rnd = random.Random(seed)
+    parts = []
+    size = 0
+    num_types = 0
+    i = 0
+    while size < num_bytes:
+        if i % 4 == 0:
+            block = f"type T{num_types} [unit=kg-CO2, range=>=0]  # 型 {num_types}\n"
+            num_types += 1
+        else:
+            a, b = rnd.randrange(num_types), rnd.randrange(num_types)
+            block = (f"fn f{i} {{\n"
+                     f"  sig: T{a} -> T{b}\n"
+                     f"  impl: {IMPLS[i % len(IMPLS)]}\n"
+                     f"  cost: {rnd.randint(1, 9)}\n"
+                     f"  confidence: 0.{rnd.randint(50, 99)}\n"
+                     f"}}\n\n")
+        parts.append(block)
+        size += len(block.encode('utf-8'))
+        i += 1
+    return ''.join(parts)
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the DSL parser')
+    parser.add_argument('--sizes', type=float, nargs='+', default=[1, 2, 4, 8, 16],
+                        help='Catalog sizes in MB')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Best of N runs per size')
+    args = parser.parse_args()
+
+    print(f"{'MB':>8} {'decls':>10} {'seconds':>10} {'MB/s':>8} {'us/decl':>8}")
+    for mb in args.sizes:
+        content = generate_dsl(int(mb * 1024 * 1024))
+        best = None
+        for _ in range(args.repeat):
+            dsl = DSLParser()
+            started = time.perf_counter()
+            dsl.parse(content)
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        decls = len(dsl.types) + len(dsl.functions)
+        size = len(content.encode('utf-8')) / (1024 * 1024)
+        print(f"{size:8.1f} {decls:10d} {best:10.3f} {size / best:8.1f} {best / decls * 1e6:8.2f}")
+
+if __name__ == '__main__':
+    main()
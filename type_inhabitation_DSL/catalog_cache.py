@@ -0,0 +1,338 @@
+# catalog_cache.py
+"""
+コンパイル済みカタログのバイナリキャッシュ
+
+run_executable.py のように問い合わせごとに起動するCLIでは、DSLのパースと
+カタログのコンパイルが起動時間の大半を占める。初回の読み込みで
+型・関数表・CSR隣接リスト・部分型の閉包をカタログファイルの隣
+（catalog.dsl.compiled.bin）に marshal で保存し、次回からは mmap で読み込んで
+パースもコンパイルもせずに復元する。
+
+到達可能性インデックスは型数の2乗に比例する大きさになるので、既定では保存しない。
+include_reachability=True（CLI では --reachability）のときだけ、型の数が
+REACHABILITY_MAX_TYPES 以下なら保存する。保存したキャッシュから読み込んだ
+カタログでは、作成済みのインデックスとして探索の枝刈りに使われる。
+
+キャッシュの検証:
+  - ソースのサイズと更新時刻（mtime_ns）が保存時と同じならそのまま使う
+  - 違っていればソースの SHA-256 を計算し、保存時と同じなら使う
+    （チェックアウトし直しただけの場合など。ヘッダを今の更新時刻で書き直す）
+  - 内容が変わっていればソースを読み込み直してキャッシュを作り直す
+
+import で複数ファイルに分かれたDSLカタログ（dsl_imports.py）では、
+読み込んだ全ファイルのサイズ・更新時刻・SHA-256 を meta の dependencies に保存し、
+どれか1つでも変わっていればキャッシュを使わない。そのとき変わっていないファイルは
+ファイルごとのパース結果のキャッシュ（other.dsl.decls.bin）から読むので、
+パースし直すのは変更したファイルだけになる。
+
+ファイル形式: MAGIC (8バイト) + (version, meta の長さ) + meta + 本体（どちらも marshal）
+meta だけで検証できるので、古いキャッシュの本体は読まない。
+marshal の形式と array の整数幅は環境に依存するので、異なる環境で作られた
+キャッシュは使わずに作り直す。
+
+使用例:
+  cat = Catalog.load('catalog.dsl')   # キャッシュがあれば使い、無ければ作る
+"""
+
+import hashlib
+import marshal
+import mmap
+import os
+import struct
+import sys
+from array import array
+from pathlib import Path
+from typing import Optional, Tuple
+
+from synth_lib import Catalog, CompiledCatalog, Func, ReachabilityIndex
+
+CACHE_SUFFIX = '.compiled.bin'
+DECLS_SUFFIX = '.decls.bin'  # ファイルごとのパース結果（dsl_imports.py）
+CACHE_VERSION = 2  # 2: 到達可能性インデックスを既定で保存しない
+# これより型の多いカタログでは到達可能性インデックスを保存しない（向きごとに約12MB）
+REACHABILITY_MAX_TYPES = 10_000
+MAGIC = b'TIDSLCC\x00'
+_HEADER = struct.Struct('<II')  # (version, meta の長さ)
+
+def cache_path_for(catalog_path) -> Path:
+    """カタログファイルに対応するキャッシュファイルのパス"""
+    return Path(str(catalog_path) + CACHE_SUFFIX)
+
+def _file_digest(path) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+def decls_cache_path_for(dsl_path) -> Path:
+    """DSLファイルに対応するパース結果のキャッシュファイルのパス"""
+    return Path(str(dsl_path) + DECLS_SUFFIX)
+
+def _meta(size: int, mtime_ns: int, digest: str) -> dict:
+    return {
+        'source_size': size,
+        'source_mtime_ns': mtime_ns,
+        'source_sha256': digest,
+        'marshal_version': marshal.version,
+        'itemsize': array('l').itemsize,
+        'byteorder': sys.byteorder,
+    }
+
+def _compatible(meta: dict) -> bool:
+    return (meta.get('marshal_version') == marshal.version and
+            meta.get('itemsize') == array('l').itemsize and
+            meta.get('byteorder') == sys.byteorder)
+
+def _payload(catalog: Catalog, include_reachability: bool = False) -> dict:
+    cc = catalog.compile()
+    if cc.removed or len(cc.funcs) != len(catalog.funcs):
+        # 変更済みのカタログは辺IDが catalog.funcs とずれているのでコンパイルし直す
+        cc = CompiledCatalog(catalog)
+    reach = None
+    if include_reachability and cc.num_types <= REACHABILITY_MAX_TYPES:
+        reach = cc.reachability or ReachabilityIndex(cc)
+    funcs = cc.funcs
+    return {
+        'types': list(catalog.types.values()),
+        'fingerprint': catalog.fingerprint(),
+        'type_names': cc.type_names,
+        'ids': [f.id for f in funcs],
+        'impls': [f.impl for f in funcs],
+        'inverse_of': [f.inverse_of for f in funcs],
+        'dom': cc.dom.tobytes(),
+        'cod': cc.cod.tobytes(),
+        'cost': cc.cost.tobytes(),
+        'conf': cc.conf.tobytes(),
+        'rev_offsets': cc.rev_offsets.tobytes(),
+        'rev_edges': cc.rev_edges.tobytes(),
+        'fwd_offsets': cc.fwd_offsets.tobytes(),
+        'fwd_edges': cc.fwd_edges.tobytes(),
+        'subtyping': (cc.super_bits, cc.supertypes, cc.subtypes)
+                     if cc.super_bits is not None else None,
+        'reachability': (reach.component, reach.forward, reach.backward)
+                        if reach is not None else None,
+    }
+
+def _array(typecode: str, data: bytes) -> array:
+    values = array(typecode)
+    values.frombytes(data)
+    return values
+
+def _restore(payload: dict) -> Catalog:
+    """保存した本体から Catalog とコンパイル済み表現を組み立てる（パースもコンパイルもしない）"""
+    names = payload['type_names']
+    dom = _array('l', payload['dom'])
+    cod = _array('l', payload['cod'])
+    cost = _array('d', payload['cost'])
+    conf = _array('d', payload['conf'])
+    funcs = [Func(func_id, names[d], names[c], co, cf, impl, inv)
+             for func_id, d, c, co, cf, impl, inv in zip(payload['ids'], dom, cod, cost, conf,
+                                                         payload['impls'], payload['inverse_of'])]
+
+    cat = Catalog.__new__(Catalog)
+    cat._set_types(payload['types'])
+    cat.funcs = funcs
+    cat._index_funcs()
+    cat._fingerprint = payload['fingerprint']
+
+    cc = CompiledCatalog.__new__(CompiledCatalog)
+    cc.type_names = names
+    cc.type_index = {name: i for i, name in enumerate(names)}
+    cc.funcs = list(funcs)
+    cc.dom, cc.cod, cc.cost, cc.conf = dom, cod, cost, conf
+    cc.rev_offsets = _array('l', payload['rev_offsets'])
+    cc.rev_edges = _array('l', payload['rev_edges'])
+    cc.fwd_offsets = _array('l', payload['fwd_offsets'])
+    cc.fwd_edges = _array('l', payload['fwd_edges'])
+    cc.super_bits = cc.supertypes = cc.subtypes = None
+    if payload['subtyping'] is not None:
+        cc.super_bits, cc.supertypes, cc.subtypes = (list(x) for x in payload['subtyping'])
+    cc._init_caches()
+    if payload['reachability'] is not None:
+        reach = ReachabilityIndex.__new__(ReachabilityIndex)
+        reach.component, reach.forward, reach.backward = payload['reachability']
+        reach.num_components = len(reach.forward)
+        cc.reachability = reach
+    cat._compiled = cc
+    return cat
+
+def _write(out: Path, meta: dict, body: bytes):
+    """一時ファイルに書いてから置き換える（同時に起動した他のプロセスが壊れたファイルを読まない）"""
+    meta_bytes = marshal.dumps(meta)
+    tmp = out.with_name(f"{out.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp, 'wb') as f:
+            f.write(MAGIC)
+            f.write(_HEADER.pack(CACHE_VERSION, len(meta_bytes)))
+            f.write(meta_bytes)
+            f.write(body)
+        os.replace(tmp, out)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+
+def _save(catalog: Catalog, catalog_path, meta: dict,
+          include_reachability: bool = False) -> Optional[Path]:
+    out = cache_path_for(catalog_path)
+    try:
+        body = marshal.dumps(_payload(catalog, include_reachability))
+        _write(out, meta, body)
+    except (OSError, ValueError):
+        return None
+    return out
+
+def save_catalog_cache(catalog: Catalog, catalog_path, digest: Optional[str] = None,
+                       stat: Optional[os.stat_result] = None,
+                       include_reachability: bool = False) -> Optional[Path]:
+    """カタログのキャッシュをカタログファイルの隣に保存する
+
+    digest/stat は catalog を読み込む前に取ったソースの SHA-256 と stat（省略時は今の値）。
+    include_reachability=True なら到達可能性インデックスも保存する（型の数が
+    REACHABILITY_MAX_TYPES 以下の場合だけ）。
+    書き込めない場合や marshal できない値（YAML の日付など）を含む場合は None。
+    import のあるDSLカタログには build_catalog_cache を使う（import 先を検証に含める）。
+    """
+    if stat is None:
+        stat = os.stat(catalog_path)
+    if digest is None:
+        digest = _file_digest(catalog_path)
+    return _save(catalog, catalog_path, _meta(stat.st_size, stat.st_mtime_ns, digest),
+                 include_reachability)
+
+def _unchanged(source, size: int, mtime_ns: int, digest: str) -> Optional[bool]:
+    """ソースが保存時と同じ内容か（同じなら更新時刻も同じかを返し、違えば None）"""
+    stat = os.stat(source)
+    if stat.st_size != size:
+        return None
+    if stat.st_mtime_ns == mtime_ns:
+        return True
+    if _file_digest(source) != digest:
+        return None
+    return False
+
+def _read_valid(path: Path, source):
+    """キャッシュファイルの meta を検証し、有効なら (meta, 本体, 書き直しが必要か) を返す
+
+    ソースの内容が同じで更新時刻だけが違う場合は meta の更新時刻を今の値にする。
+    """
+    touched = False
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if mm[:len(MAGIC)] != MAGIC:
+            return None
+        version, meta_len = _HEADER.unpack_from(mm, len(MAGIC))
+        if version != CACHE_VERSION:
+            return None
+        start = len(MAGIC) + _HEADER.size
+        meta = marshal.loads(mm[start:start + meta_len])
+        if not _compatible(meta):
+            return None
+        same = _unchanged(source, meta['source_size'], meta['source_mtime_ns'],
+                          meta['source_sha256'])
+        if same is None:
+            return None
+        if not same:
+            meta['source_mtime_ns'] = os.stat(source).st_mtime_ns
+            touched = True
+        deps = meta.get('dependencies', [])
+        for i, (dep, size, mtime_ns, digest) in enumerate(deps):
+            same = _unchanged(dep, size, mtime_ns, digest)
+            if same is None:
+                return None
+            if not same:
+                deps[i] = (dep, size, os.stat(dep).st_mtime_ns, digest)
+                touched = True
+        body = mm[start + meta_len:]
+    return meta, body, touched
+
+def _refresh(path: Path, meta: dict, body: bytes):
+    """内容は同じ：次回はハッシュを計算しなくて済むように更新時刻を書き直す"""
+    try:
+        _write(path, meta, body)
+    except OSError:
+        pass
+
+def read_catalog_cache(catalog_path) -> Optional[Catalog]:
+    """有効なキャッシュがあればそこからカタログを復元する（無いか古ければ None）"""
+    path = cache_path_for(catalog_path)
+    try:
+        valid = _read_valid(path, catalog_path)
+        if valid is None:
+            return None
+        meta, body, touched = valid
+        cat = _restore(marshal.loads(body))
+    except (OSError, ValueError, EOFError, TypeError, KeyError, struct.error):
+        # 壊れた・途中までのキャッシュは無いものとして扱う
+        return None
+    if touched:
+        _refresh(path, meta, body)
+    return cat
+
+def save_decls_cache(dsl_path, decls: dict, size: int, mtime_ns: int,
+                     digest: str) -> Optional[Path]:
+    """DSLファイル1つのパース結果（'types'/'functions'/'imports' の辞書）を保存する
+
+    size/mtime_ns/digest はパースする前に取ったソースのサイズ・更新時刻・SHA-256。
+    """
+    out = decls_cache_path_for(dsl_path)
+    try:
+        _write(out, _meta(size, mtime_ns, digest), marshal.dumps(decls))
+    except (OSError, ValueError):
+        return None
+    return out
+
+def read_decls_cache(dsl_path) -> Optional[tuple]:
+    """有効なパース結果のキャッシュがあれば (パース結果, meta) を返す（無いか古ければ None）"""
+    path = decls_cache_path_for(dsl_path)
+    try:
+        valid = _read_valid(path, dsl_path)
+        if valid is None:
+            return None
+        meta, body, touched = valid
+        decls = marshal.loads(body)
+    except (OSError, ValueError, EOFError, TypeError, KeyError, struct.error):
+        return None
+    if touched:
+        _refresh(path, meta, body)
+    return decls, meta
+
+def build_catalog_cache(catalog_path, include_reachability: bool = False
+                        ) -> Tuple[Catalog, Optional[Path]]:
+    """ソースからカタログを読み込み、キャッシュを作り直す
+
+    DSLカタログは import 先も含めてファイルごとのキャッシュを使って読み込み
+    （dsl_imports.py）、読み込んだ全ファイルを検証の対象として保存する。
+    include_reachability は save_catalog_cache と同じ。
+    """
+    if not str(catalog_path).endswith('.dsl'):
+        # 読み込み中にソースが書き換えられても、次回の検証で食い違いとして検出される
+        stat = os.stat(catalog_path)
+        digest = _file_digest(catalog_path)
+        cat = Catalog.load(catalog_path, use_cache=False)
+        return cat, save_catalog_cache(cat, catalog_path, digest, stat, include_reachability)
+    from dsl_imports import catalog_from_files, load_dsl_files
+    files = load_dsl_files([catalog_path])
+    cat = catalog_from_files(files)
+    root, deps = files[-1], files[:-1]  # 根のファイルはいちばん最後に併合される
+    meta = _meta(root.size, root.mtime_ns, root.sha256)
+    if deps:
+        meta['dependencies'] = [(f.path, f.size, f.mtime_ns, f.sha256) for f in deps]
+    return cat, _save(cat, catalog_path, meta, include_reachability)
+
+def load_catalog(catalog_path) -> Catalog:
+    """キャッシュを使ってカタログを読み込む（無いか古ければソースから読み込んで作り直す）"""
+    cat = read_catalog_cache(catalog_path)
+    if cat is not None:
+        return cat
+    return build_catalog_cache(catalog_path)[0]
+
+if __name__ == '__main__':
+    args = [a for a in sys.argv[1:] if a != '--reachability']
+    if len(args) != 1:
+        print("Usage: python catalog_cache.py <catalog.dsl|catalog.yaml> [--reachability]")
+        sys.exit(1)
+    _, out = build_catalog_cache(args[0], include_reachability='--reachability' in sys.argv)
+    if out is None:
+        print("Could not write the compiled catalog cache", file=sys.stderr)
+        sys.exit(1)
+    print(f"Saved compiled catalog to {out}")
@@ -0,0 +1,292 @@
+# catalog_watch.py
+"""
+カタログファイルの監視と変更した宣言だけの反映
+
+編集中のDSLカタログ（2万関数規模）を監視し、保存されるたびに変わった宣言だけを
+生きている Catalog に反映する。カタログは作り直さず Catalog.add_function /
+remove_function / update_cost / add_type / remove_type で変更するので、
+コンパイル済みの表現・最短路木・到達可能性インデックスは差分だけ修復される。
+
+差分の取り方:
+  - ファイルを行頭の type / fn / import ごとのブロックに分け、ブロックの本文をキーに
+    前回のパース結果を引く（本文のハッシュによる辞書引き）。パースするのは
+    本文が変わったブロックだけ
+  - 前回から消えたブロックの宣言を取り除き、新しく現れたブロックの宣言を加える。
+    同じIDの関数が消えて現れ、sig・impl・inverse_of が同じならコスト・信頼度の更新で済ませる
+  - import が変われば、新しく辿れるようになったファイルを読み、
+    辿れなくなったファイルの宣言を取り除く（循環していれば DSLImportError）
+
+構文エラーや import のエラーがあれば何も反映せずに例外を送出し、
+カタログは直前の状態のまま（直してから保存すれば次の poll で反映される）。
+
+使用例:
+  watcher = CatalogWatcher('catalog.dsl')
+  tree = watcher.catalog.shortest_path_tree('CO2')  # 部分型宣言の変更後もそのまま使える
+  for changes in watcher.watch():   # 変更を反映するたびに返る
+      print(changes, tree.query('Product'))
+"""
+
+import os
+import time
+from collections import Counter
+from itertools import chain
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from dsl_imports import DSLImportError, import_order
+from dsl_parser import (_DECL_START_RE, _Parser, DSLSyntaxError, FunctionDecl, ImportDecl,
+                        TypeDecl)
+from synth_lib import Catalog
+
+@dataclass
+class CatalogChange:
+    """1つのファイルの変更をカタログに反映した結果"""
+    path: str
+    added: List[str] = field(default_factory=list)  # 追加した関数ID
+    removed: List[str] = field(default_factory=list)  # 削除した関数ID
+    updated: List[str] = field(default_factory=list)  # コスト・信頼度だけを更新した関数ID
+    types: List[str] = field(default_factory=list)  # 追加・変更・削除した型名
+    parsed_blocks: int = 0  # パースし直したブロックの数
+    elapsed: float = 0.0  # ファイルの読み込みから反映までの秒数
+
+class _WatchedFile:
+    """監視中のファイルの前回の状態"""
+
+    def __init__(self, path: str, stamp: Optional[tuple], blocks: List[Tuple[str, list]]):
+        self.path = path
+        self.stamp = stamp  # (サイズ, 更新時刻)
+        self.blocks = dict(blocks)  # ブロックの本文 -> 宣言のリスト（ファイル内の順）
+        self.repeats = {}  # 同じ本文のブロックが複数あるときだけ 本文 -> 個数
+        if len(self.blocks) != len(blocks):
+            self.repeats = {text: n for text, n in Counter(text for text, _ in blocks).items()
+                            if n > 1}
+        self.imports = [d.path for d in chain.from_iterable(self.blocks.values())
+                        if d.__class__ is ImportDecl]
+        if self.repeats:
+            self.imports = list(dict.fromkeys(self.imports))
+
+    def count(self, text: str) -> int:
+        """本文が text のブロックの個数"""
+        if text not in self.blocks:
+            return 0
+        return self.repeats.get(text, 1)
+
+    def dependencies(self) -> List[str]:
+        base = os.path.dirname(self.path)
+        return [os.path.abspath(os.path.join(base, p)) for p in self.imports]
+
+def _block_starts(text: str) -> List[int]:
+    starts = [0]
+    starts.extend(m.end() for m in _DECL_START_RE.finditer(text))
+    starts.append(len(text))
+    return starts
+
+def split_blocks(text: str) -> List[str]:
+    """行頭の type / fn / import の位置で分けたブロックのリスト（つなげると text に戻る）"""
+    starts = _block_starts(text)
+    return [text[a:b] for a, b in zip(starts, starts[1:]) if a < b]
+
+def parse_blocks(path: str, text: str,
+                 known: Optional[Dict[str, list]] = None) -> Tuple[List[Tuple[str, list]], int]:
+    """text をブロックごとにパースして ([(本文, 宣言のリスト)], パースしたブロック数) を返す
+
+    known（前回の 本文 -> 宣言のリスト）にあるブロックはパースしない。
+    行頭の fn が文字列の中にあるなど、ブロックの途中で宣言が終わらない場合は
+    次のブロックとつなげて読み直す。構文エラーは DSLSyntaxError（ファイル内の行番号）。
+    """
+    known = known or {}
+    starts = _block_starts(text)
+    pieces = [text[a:b] for a, b in zip(starts, starts[1:])]
+    found = [known.get(block) for block in pieces]
+    # 前回から変わったブロックだけを先頭から順にパースする（行番号は差分だけ数える）
+    parsed = 0
+    line, counted = 1, 0
+    i = 0
+    while True:
+        try:
+            i = found.index(None, i)
+        except ValueError:
+            break
+        line += text.count('\n', counted, starts[i])
+        counted = starts[i]
+        j = i + 1
+        while True:
+            block = text[starts[i]:starts[j]]
+            try:
+                decls = list(_Parser(block, line).declarations())
+                parsed += 1
+                break
+            except DSLSyntaxError as e:
+                if not e.incomplete or j == len(pieces):
+                    raise DSLSyntaxError(e.message, e.line, path, e.incomplete) from None
+                j += 1  # 次のブロックとつなげて読み直す
+        if j > i + 1:
+            del pieces[i + 1:j], found[i + 1:j], starts[i + 1:j]
+        pieces[i], found[i] = block, decls
+        i += 1
+    return [(block, decls) for block, decls in zip(pieces, found) if block], parsed
+
+def _stamp(path: str) -> tuple:
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+def _same_function(old: FunctionDecl, new: FunctionDecl) -> bool:
+    """コスト・信頼度以外が同じか（update_cost で済むか）"""
+    return (old.sig, old.impl, old.inverse_of) == (new.sig, new.impl, new.inverse_of)
+
+class CatalogWatcher:
+    """DSLカタログ（import 先を含む）を監視し、変更を catalog に反映する
+
+    catalog は作成時に一度だけ作り、以降は同じオブジェクトを変更していく。
+    poll() は変更されたファイルを読み直して反映し、watch() はそれを一定間隔で繰り返す。
+    """
+
+    def __init__(self, path):
+        self.root = os.path.abspath(path)
+        self.catalog = Catalog({})
+        self._files: Dict[str, _WatchedFile] = {}
+        self.poll()
+
+    @property
+    def paths(self) -> List[str]:
+        """監視中のファイル（import 先を含む）"""
+        return list(self._files)
+
+    def poll(self) -> List[CatalogChange]:
+        """変更されたファイルを読み直して反映し、ファイルごとの変更を返す（無ければ空）
+
+        エラーがあればカタログを変更せずに DSLSyntaxError / DSLImportError を送出する。
+        """
+        # 根から import を辿り、変わったファイルだけを読む（まだ何も反映しない）
+        staged: Dict[str, Tuple[_WatchedFile, int, float]] = {}
+        graph: Dict[str, List[str]] = {}
+        queue = [self.root]
+        while queue:
+            path = queue.pop()
+            if path in graph:
+                continue
+            started = time.perf_counter()
+            stamp = _stamp(path)
+            current = self._files.get(path)
+            if current is None or current.stamp != stamp:
+                with open(path, 'r', encoding='utf-8') as f:
+                    text = f.read()
+                blocks, parsed = parse_blocks(path, text, current.blocks if current else None)
+                current = _WatchedFile(path, stamp, blocks)
+                staged[path] = (current, parsed, started)
+            deps = graph[path] = current.dependencies()
+            for dep in deps:
+                if dep not in graph:
+                    if not os.path.isfile(dep):
+                        raise DSLImportError(f"{path}: imported file not found: {dep}")
+                    queue.append(dep)
+        order = import_order(graph, [self.root])
+
+        # import 先が先になる順に反映し、辿れなくなったファイルの宣言を取り除く
+        changes = []
+        for path in order:
+            if path in staged:
+                new, parsed, started = staged[path]
+                change = self._apply(self._files.get(path), new)
+                change.parsed_blocks = parsed
+                change.elapsed = time.perf_counter() - started
+                changes.append(change)
+        for path in [p for p in self._files if p not in graph]:
+            started = time.perf_counter()
+            change = self._apply(self._files[path], _WatchedFile(path, None, []))
+            del self._files[path]
+            change.elapsed = time.perf_counter() - started
+            changes.append(change)
+        return changes
+
+    def watch(self, interval: float = 0.1, stop: Optional[Callable[[], bool]] = None,
+              on_error: Optional[Callable[[Exception], None]] = None) -> Iterator[List[CatalogChange]]:
+        """interval 秒ごとに poll() し、変更を反映するたびにその変更を返す
+
+        stop が True を返すと終わる。on_error を渡すと構文エラーなどを渡して監視を続け
+        （同じエラーは一度だけ渡す）、渡さなければ送出する。
+        """
+        last_error = None
+        while stop is None or not stop():
+            try:
+                changes = self.poll()
+            except (DSLSyntaxError, DSLImportError, OSError) as e:
+                if on_error is None:
+                    raise
+                if str(e) != last_error:
+                    last_error = str(e)
+                    on_error(e)
+                changes = []
+            else:
+                last_error = None
+            if changes:
+                yield changes
+            time.sleep(interval)
+
+    def _declared_elsewhere(self, name: str, path: str) -> Optional[TypeDecl]:
+        """path 以外の監視中のファイルにある型 name の宣言"""
+        for other in self._files.values():
+            if other.path == path:
+                continue
+            for decls in other.blocks.values():
+                for d in decls:
+                    if isinstance(d, TypeDecl) and d.name == name:
+                        return d
+        return None
+
+    def _apply(self, old: Optional[_WatchedFile], new: _WatchedFile) -> CatalogChange:
+        """old から new へのブロックの差分をカタログに反映する"""
+        cat = self.catalog
+        change = CatalogChange(new.path)
+        if old is None:
+            old = _WatchedFile(new.path, None, [])
+        removed = [d for text in old.blocks if text not in new.blocks
+                   for d in old.blocks[text] * old.count(text)]
+        added = [d for text in new.blocks if text not in old.blocks
+                 for d in new.blocks[text] * new.count(text)]
+        for text in old.repeats.keys() | new.repeats.keys():
+            n = new.count(text) - old.count(text)
+            if n > 0 and text in old.blocks:
+                added.extend(new.blocks[text] * n)
+            elif n < 0 and text in new.blocks:
+                removed.extend(old.blocks[text] * -n)
+
+        pending: Dict[str, List[FunctionDecl]] = {}  # 追加する関数（ID ごと）
+        for d in added:
+            if isinstance(d, FunctionDecl):
+                pending.setdefault(d.id, []).append(d)
+        for d in removed:
+            if not isinstance(d, FunctionDecl):
+                continue
+            same = pending.get(d.id)
+            if same and _same_function(d, same[0]):
+                new_decl = same.pop(0)
+                if (new_decl.cost, new_decl.confidence) != (d.cost, d.confidence):
+                    cat.update_cost(d.id, new_decl.cost, new_decl.confidence)
+                    change.updated.append(d.id)
+            else:
+                cat.remove_function(d.id)
+                change.removed.append(d.id)
+
+        removed_types = {d.name: d for d in removed if isinstance(d, TypeDecl)}
+        added_types = {d.name: d for d in added if isinstance(d, TypeDecl)}
+        for name in removed_types:
+            if name not in added_types:
+                other = self._declared_elsewhere(name, new.path)
+                if other is not None:
+                    cat.add_type(other.to_dict())
+                elif name in cat.types:
+                    cat.remove_type(name)
+                change.types.append(name)
+        for name, d in added_types.items():
+            if removed_types.get(name) != d:  # コメントや空白だけの変更は反映しない
+                cat.add_type(d.to_dict())
+                change.types.append(name)
+
+        for decls in pending.values():
+            for d in decls:
+                cat.add_function(d.to_dict())
+                change.added.append(d.id)
+        if new.stamp is not None:
+            self._files[new.path] = new
+        return change
@@ -0,0 +1,303 @@
+# contraction.py
+"""
+縮約階層（Contraction Hierarchies）による最短路の前処理
+
+変更が少なく問い合わせの多いカタログ向けに、型グラフの頂点を
+重要度の低い順に縮約し、縮約で失われる最短路をショートカット辺として残す。
+問い合わせは src から「上り」辺だけを辿る前向き探索と、
+goal から「上り」辺を逆に辿る後ろ向き探索を突き合わせるだけで済み、
+探索する頂点数はカタログ全体に比べてごく少ない。
+
+ショートカット辺は縮約した2本の辺を指しているので、元の Func の列に
+展開でき、証明項は通常の探索と同じ関数だけで構成される。
+階層はカタログファイルの隣に JSON で保存し、fingerprint で整合性を確認する。
+
+使用例:
+  python contraction.py catalog.dsl      # catalog.dsl.ch.json を作成
+"""
+
+import heapq
+import json
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from synth_lib import Catalog, _require_no_subtyping
+
+INF = float('inf')
+
+HIERARCHY_SUFFIX = '.ch.json'
+HIERARCHY_VERSION = 2
+
+def hierarchy_path_for(catalog_path: str) -> Path:
+    """カタログファイルに対応する縮約階層ファイルのパス"""
+    return Path(str(catalog_path) + HIERARCHY_SUFFIX)
+
+class ContractionHierarchy:
+    """縮約階層
+
+    edges[i] は (tail, head, cost, a, b)。元の関数なら a は辺ID（catalog.funcs の添字）で
+    b は -1、ショートカットなら a, b は縮約した2本の辺の edges 上の添字。
+    rank[v] は型 v を縮約した順番で、問い合わせでは rank の大きい方へだけ進む。
+    """
+
+    def __init__(self, catalog: Catalog, rank: List[int], edges: List[tuple],
+                 hierarchy: List[int]):
+        self.catalog = catalog
+        self.rank = rank
+        self.edges = edges
+        self.hierarchy = hierarchy  # 問い合わせに使う辺の添字
+        n = len(rank)
+        # up_fwd[v]: v から rank の大きい型への辺、up_bwd[v]: rank の大きい型から v への辺
+        self.up_fwd: List[List[int]] = [[] for _ in range(n)]
+        self.up_bwd: List[List[int]] = [[] for _ in range(n)]
+        for i in hierarchy:
+            u, v = edges[i][0], edges[i][1]
+            if rank[u] < rank[v]:
+                self.up_fwd[u].append(i)
+            else:
+                self.up_bwd[v].append(i)
+
+    @property
+    def num_shortcuts(self) -> int:
+        return sum(1 for edge in self.edges if edge[4] >= 0)
+
+    @classmethod
+    def build(cls, catalog: Catalog, witness_limit: int = 200) -> 'ContractionHierarchy':
+        """カタログから縮約階層を構築する
+
+        witness_limit は証人探索（v を通らない同コスト以下の迂回路の探索）で
+        確定させる頂点数の上限。打ち切った場合はショートカットを追加するので
+        結果の正しさには影響せず、ショートカットが増えるだけ。
+        """
+        cc = catalog.compile()
+        _require_no_subtyping(cc, 'ContractionHierarchy')
+        n = cc.num_types
+        edges: List[tuple] = []
+        out_adj: List[Dict[int, int]] = [{} for _ in range(n)]
+        in_adj: List[Dict[int, int]] = [{} for _ in range(n)]
+        # 同じ型の組では最小コストの関数だけを使う（同点ならカタログ上で先の関数）
+        for e in cc.live_edges():
+            u, v, c = cc.dom[e], cc.cod[e], cc.cost[e]
+            if u == v:
+                continue
+            old = out_adj[u].get(v)
+            if old is None or c < edges[old][2]:
+                out_adj[u][v] = in_adj[v][u] = len(edges)
+                edges.append((u, v, c, e, -1))
+
+        contracted = [False] * n
+
+        def witness_costs(u, skip, limit, targets):
+            """skip を通らずに u から到達できる型のコスト（limit 以下、上限付き）
+
+            targets がすべて確定した時点で打ち切る。
+            """
+            dist = {u: 0.0}
+            pq = [(0.0, u)]
+            settled = 0
+            remaining = len(targets)
+            while pq and settled < witness_limit and remaining:
+                d, x = heapq.heappop(pq)
+                if d > dist[x]:
+                    continue
+                settled += 1
+                if x in targets:
+                    remaining -= 1
+                for y, i in out_adj[x].items():
+                    if y == skip:
+                        continue
+                    nd = d + edges[i][2]
+                    if nd <= limit and nd < dist.get(y, INF):
+                        dist[y] = nd
+                        heapq.heappush(pq, (nd, y))
+            return dist
+
+        def shortcuts_for(v):
+            """v を縮約したときに必要なショートカット (u, w, cost, 辺1, 辺2)"""
+            needed = []
+            outs = list(out_adj[v].items())
+            if not outs:
+                return needed
+            targets = out_adj[v].keys()
+            max_out = max(edges[j][2] for _, j in outs)
+            for u, i in in_adj[v].items():
+                c_in = edges[i][2]
+                dist = witness_costs(u, v, c_in + max_out, targets)
+                for w, j in outs:
+                    if w == u:
+                        continue
+                    c = c_in + edges[j][2]
+                    if dist.get(w, INF) > c:
+                        needed.append((u, w, c, i, j))
+            return needed
+
+        deleted_neighbors = [0] * n
+
+        def priority(v, needed):
+            # 辺の差分 + 縮約済みの隣接数（一様に縮約が進むように）
+            removed = len(in_adj[v]) + len(out_adj[v])
+            return len(needed) - removed + deleted_neighbors[v]
+
+        pq = [(priority(v, shortcuts_for(v)), v) for v in range(n)]
+        heapq.heapify(pq)
+        rank = [0] * n
+        hierarchy: List[int] = []
+        order = 0
+        while pq:
+            _, v = heapq.heappop(pq)
+            if contracted[v]:
+                continue
+            # 優先度は遅延評価：再計算して先頭でなくなれば積み直す
+            needed = shortcuts_for(v)
+            p = priority(v, needed)
+            if pq and p > pq[0][0]:
+                heapq.heappush(pq, (p, v))
+                continue
+            for u, w, c, i, j in needed:
+                old = out_adj[u].get(w)
+                if old is None or c < edges[old][2]:
+                    out_adj[u][w] = in_adj[w][u] = len(edges)
+                    edges.append((u, w, c, i, j))
+            # v に接続する辺はここで階層に入る（相手の方が rank が大きい）
+            hierarchy.extend(out_adj[v].values())
+            hierarchy.extend(in_adj[v].values())
+            for w in out_adj[v]:
+                del in_adj[w][v]
+                deleted_neighbors[w] += 1
+            for u in in_adj[v]:
+                del out_adj[u][v]
+                deleted_neighbors[u] += 1
+            out_adj[v] = {}
+            in_adj[v] = {}
+            contracted[v] = True
+            rank[v] = order
+            order += 1
+        return cls(catalog, rank, edges, sorted(hierarchy))
+
+    def _unpack(self, i: int, out: List[int]):
+        """辺 i を元の辺IDの列に展開して out に追加する"""
+        stack = [i]
+        while stack:
+            _, _, _, a, b = self.edges[stack.pop()]
+            if b < 0:
+                out.append(a)
+            else:
+                stack.append(b)
+                stack.append(a)
+
+    def query(self, src_type: str, goal_type: str, max_cost=INF):
+        """synthesize_backward と同じ形式の [(cost, [Func])] を返す（最短路のみ）"""
+        if src_type == goal_type:
+            return [(0.0, [])]
+        cc = self.catalog.compile()
+        src = cc.type_index.get(src_type)
+        goal = cc.type_index.get(goal_type)
+        if src is None or goal is None:
+            return []
+        edges = self.edges
+        # side 0: src からの前向き、side 1: goal からの後ろ向き
+        dist = ({src: 0.0}, {goal: 0.0})
+        parent = ({}, {})
+        adj = (self.up_fwd, self.up_bwd)
+        pqs = ([(0.0, src)], [(0.0, goal)])
+        best, meet = INF, -1
+        while pqs[0] or pqs[1]:
+            side = 0 if pqs[0] and (not pqs[1] or pqs[0][0][0] <= pqs[1][0][0]) else 1
+            d, v = heapq.heappop(pqs[side])
+            if d >= best or d > max_cost:
+                # この側はこれ以上良い合流点を作れない
+                pqs[side].clear()
+                continue
+            if d > dist[side][v]:
+                continue
+            other = dist[1 - side].get(v)
+            if other is not None and d + other < best:
+                best, meet = d + other, v
+            for i in adj[side][v]:
+                x = edges[i][1] if side == 0 else edges[i][0]
+                nd = d + edges[i][2]
+                if nd < dist[side].get(x, INF):
+                    dist[side][x] = nd
+                    parent[side][x] = i
+                    heapq.heappush(pqs[side], (nd, x))
+        if meet < 0:
+            return []
+
+        # src -> meet の上り辺と meet -> goal の辺を元の関数に展開する
+        up = []
+        v = meet
+        while v != src:
+            i = parent[0][v]
+            up.append(i)
+            v = edges[i][0]
+        path_edges: List[int] = []
+        for i in reversed(up):
+            self._unpack(i, path_edges)
+        v = meet
+        while v != goal:
+            i = parent[1][v]
+            self._unpack(i, path_edges)
+            v = edges[i][1]
+        # コストは synthesize_backward と同じく goal 側から足し合わせる
+        cost = 0.0
+        for e in reversed(path_edges):
+            cost += cc.cost[e]
+        if cost > max_cost:
+            return []
+        return [(cost, cc.to_funcs(path_edges))]
+
+    def save(self, catalog_path: str) -> Path:
+        """縮約階層をカタログファイルの隣に保存する"""
+        out = hierarchy_path_for(catalog_path)
+        data = {
+            'version': HIERARCHY_VERSION,
+            'fingerprint': self.catalog.fingerprint(),
+            'type_names': self.catalog.compile().type_names,
+            'num_edges': len(self.catalog.compile().funcs),
+            'rank': self.rank,
+            'edges': [list(edge) for edge in self.edges],
+            'hierarchy': self.hierarchy,
+        }
+        with open(out, 'w') as f:
+            json.dump(data, f)
+        return out
+
+    @classmethod
+    def load(cls, catalog_path: str, catalog: Catalog) -> Optional['ContractionHierarchy']:
+        """保存済みの縮約階層を読み込む
+
+        ファイルが無い、またはカタログの内容と一致しない場合は None。
+        """
+        path = hierarchy_path_for(catalog_path)
+        if not path.exists():
+            return None
+        with open(path) as f:
+            data = json.load(f)
+        if data.get('version') != HIERARCHY_VERSION:
+            return None
+        if data['fingerprint'] != catalog.fingerprint():
+            return None
+        cc = catalog.compile()
+        if data['type_names'] != cc.type_names:
+            return None
+        # 関数を削除したカタログでは辺IDが catalog.funcs の順序とずれる
+        if not data['num_edges'] == len(cc.funcs) == len(catalog.funcs):
+            return None
+        return cls(catalog, data['rank'], [tuple(edge) for edge in data['edges']],
+                   data['hierarchy'])
+
+def build_hierarchy_file(catalog_path: str) -> Path:
+    """カタログファイルを読み込み、隣に縮約階層を保存する"""
+    if str(catalog_path).endswith('.dsl'):
+        cat = Catalog.from_dsl(catalog_path)
+    else:
+        cat = Catalog.from_yaml(catalog_path)
+    return ContractionHierarchy.build(cat).save(catalog_path)
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("Usage: python contraction.py <catalog.dsl|catalog.yaml>")
+        sys.exit(1)
+    out = build_hierarchy_file(sys.argv[1])
+    print(f"Saved contraction hierarchy to {out}")
@@ -0,0 +1,177 @@
+# dsl_imports.py
+"""
+import で複数ファイルに分かれたDSLカタログの読み込み
+
+  import "scope1/boilers.dsl"   # 読み込む側のファイルからの相対パス
+
+読み込みの流れ:
+  1. 根のファイルから import を辿り、まだ読んでいないファイルを段ごとにパースする。
+     同じ段のファイルは互いに独立なので、キャッシュに無いファイルの合計が大きければ
+     プロセスプールで並列に読む
+  2. ファイルごとのパース結果は隣の other.dsl.decls.bin にキャッシュし
+     （catalog_cache.py と同じ検証）、変更の無いファイルはパースしない
+  3. import のグラフを深さ優先で辿り、循環していれば DSLImportError。
+     import 先が先になる順（帰りがけ順）で1つの Catalog に併合する。
+     順序はファイルの内容だけで決まり、並列に読んだときの完了順には依らない
+
+同じ名前の型は後から併合したもので置き換える（import した側の定義が優先）。
+
+使用例:
+  cat = load_dsl_catalog('ghg/all.dsl', workers=8)
+"""
+
+import multiprocessing
+import os
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from catalog_cache import _file_digest, read_decls_cache, save_decls_cache
+from dsl_parser import DSLParser, DSLSyntaxError, iter_dsl_decls
+from synth_lib import Catalog
+
+# キャッシュに無いファイルの合計がこれ未満ならプールを作らずにこのプロセスで読む
+PARALLEL_MIN_BYTES = 1 << 20
+
+class DSLImportError(ValueError):
+    """import 先のファイルが無い、または import が循環している"""
+
+@dataclass
+class DSLFile:
+    """DSLファイル1つのパース結果（import は辿らない）"""
+    path: str  # 絶対パス
+    types: List[dict]  # TypeDecl.to_dict() の列
+    functions: List[dict]  # FunctionDecl.to_dict() の列
+    imports: List[str]  # import のパス（書かれたまま）
+    size: int  # パースしたときのソースのサイズ・更新時刻・SHA-256
+    mtime_ns: int
+    sha256: str
+
+    def dependencies(self) -> List[str]:
+        """import 先の絶対パス（書かれた順）"""
+        base = os.path.dirname(self.path)
+        return [os.path.abspath(os.path.join(base, p)) for p in self.imports]
+
+def parse_dsl_source(path: str) -> DSLFile:
+    """DSLファイルを1つパースする（構文エラーはファイル名付きの DSLSyntaxError）"""
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    digest = _file_digest(path)
+    parser = DSLParser()
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            parser.extend(iter_dsl_decls(f))
+    except DSLSyntaxError as e:
+        raise DSLSyntaxError(e.message, e.line, path, e.incomplete) from None
+    return DSLFile(path, [t.to_dict() for t in parser.types],
+                   [fn.to_dict() for fn in parser.functions], parser.imports,
+                   stat.st_size, stat.st_mtime_ns, digest)
+
+def _read_cached(path: str) -> Optional[DSLFile]:
+    cached = read_decls_cache(path)
+    if cached is None:
+        return None
+    decls, meta = cached
+    return DSLFile(path, decls['types'], decls['functions'], decls['imports'],
+                   meta['source_size'], meta['source_mtime_ns'], meta['source_sha256'])
+
+def import_order(graph: Dict[str, List[str]], roots: List[str]) -> List[str]:
+    """import 先が先になる順（帰りがけ順）のファイルの列。循環していれば DSLImportError
+
+    graph はファイルの絶対パスから import 先の絶対パスのリスト（書かれた順）への辞書。
+    """
+    order = []
+    state = {}  # path -> 1（辿っている途中）/ 2（済み）
+    for root in roots:
+        if root in state:
+            continue
+        state[root] = 1
+        stack = [(root, iter(graph[root]))]
+        while stack:
+            path, deps = stack[-1]
+            for dep in deps:
+                seen = state.get(dep)
+                if seen is None:
+                    state[dep] = 1
+                    stack.append((dep, iter(graph[dep])))
+                    break
+                if seen == 1:
+                    cycle = [p for p, _ in stack]
+                    cycle = cycle[cycle.index(dep):] + [dep]
+                    raise DSLImportError("import cycle: " + " -> ".join(cycle))
+            else:
+                stack.pop()
+                state[path] = 2
+                order.append(path)
+    return order
+
+def load_dsl_files(paths, workers: Optional[int] = None, use_cache: bool = True,
+                   mp_context=None) -> List[DSLFile]:
+    """根のファイル（1つまたはリスト）から import を辿り、全ファイルを併合する順に返す
+
+    workers は並列数（None ならCPU数、1 以下ならこのプロセスで順に読む）。
+    use_cache=True ではファイルごとのパース結果のキャッシュを使い、
+    パースしたファイルのキャッシュを保存する（ファイルが1つだけなら保存しない。
+    そのときは catalog_cache.py のカタログ全体のキャッシュで足りる）。
+    """
+    if isinstance(paths, (str, os.PathLike)):
+        paths = [paths]
+    roots = list(dict.fromkeys(os.path.abspath(p) for p in paths))
+    if workers is None:
+        workers = os.cpu_count() or 1
+    files: Dict[str, DSLFile] = {}
+    parsed: List[DSLFile] = []
+    pool = None
+    try:
+        wave = roots
+        while wave:
+            missing = []
+            for path in wave:
+                cached = _read_cached(path) if use_cache else None
+                if cached is None:
+                    missing.append(path)
+                else:
+                    files[path] = cached
+            if (pool is None and workers > 1 and len(missing) > 1 and
+                    sum(os.path.getsize(p) for p in missing) >= PARALLEL_MIN_BYTES):
+                ctx = mp_context or multiprocessing.get_context()
+                pool = ctx.Pool(workers)
+            if pool is not None and len(missing) > 1:
+                results = pool.map(parse_dsl_source, missing, chunksize=1)
+            else:
+                results = [parse_dsl_source(p) for p in missing]
+            for f in results:
+                files[f.path] = f
+                parsed.append(f)
+            # 次の段: まだ読んでいない import 先
+            next_wave = {}
+            for path in wave:
+                for dep in files[path].dependencies():
+                    if dep in files or dep in next_wave:
+                        continue
+                    if not os.path.isfile(dep):
+                        raise DSLImportError(f"{path}: imported file not found: {dep}")
+                    next_wave[dep] = None
+            wave = list(next_wave)
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+    order = import_order({p: f.dependencies() for p, f in files.items()}, roots)
+    if use_cache and len(files) > 1:
+        for f in parsed:
+            save_decls_cache(f.path, {'types': f.types, 'functions': f.functions,
+                                      'imports': f.imports},
+                             f.size, f.mtime_ns, f.sha256)
+    return [files[p] for p in order]
+
+def catalog_from_files(files: List[DSLFile]) -> Catalog:
+    """load_dsl_files の結果を順に併合して1つのカタログにする"""
+    return Catalog({
+        'types': [t for f in files for t in f.types],
+        'functions': [fn for f in files for fn in f.functions],
+    })
+
+def load_dsl_catalog(paths, workers: Optional[int] = None, use_cache: bool = True,
+                     mp_context=None) -> Catalog:
+    """import を辿って複数ファイルのDSLカタログを読み込む"""
+    return catalog_from_files(load_dsl_files(paths, workers, use_cache, mp_context))
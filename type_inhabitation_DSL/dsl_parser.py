@@ -3,8 +3,11 @@
 型理論ベースオントロジー合成システム用DSLパーサー
 
 DSL構文:
+  import "scope1.dsl"
   type Product
   type Energy [unit=J, range=>=0]
+  type PurchasedElectricity <: Electricity
+  type AllScopes = Scope1 × Scope2
 
   fn usesEnergy {
     sig: Product -> Energy
@@ -16,7 +19,7 @@ DSL構文:
 
 import re
 from dataclasses import dataclass, field
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterator, Optional, Union
 import yaml
 
 @dataclass
@@ -54,156 +57,385 @@ class FunctionDecl:
             result['inverse_of'] = self.inverse_of
         return result
 
+@dataclass
+class ImportDecl:
+    """import "other.dsl"（path は書かれたままの文字列。相対パスは読み込む側で解決する）"""
+    path: str
+
+class DSLSyntaxError(ValueError):
+    """DSLの構文エラー（line は1始まりの行番号、path はわかる場合のファイル名）
+
+    incomplete は入力が宣言の途中で終わったこと（続きがあれば読めたかもしれない）を表す。
+    """
+
+    def __init__(self, message: str, line: int, path: Optional[str] = None,
+                 incomplete: bool = False):
+        where = f"line {line}" if path is None else f"{path}: line {line}"
+        super().__init__(f"{where}: {message}")
+        self.message = message
+        self.line = line
+        self.path = path
+        self.incomplete = incomplete
+
+    def __reduce__(self):
+        # プロセスプールのワーカーから親へ送れるように
+        return (DSLSyntaxError, (self.message, self.line, self.path, self.incomplete))
+
+# 字句解析: 空白とコメントはトークンの前で読み飛ばし、
+# 空行・コメント行を挟んだ連続する改行は1つの NL にまとめる。
+# 文字列内の # や括弧はコメント・区切りとして扱わない
+_TOKEN_RE = re.compile(r"""
+    [ \t\r\f]*(?:\#[^\n]*)?
+    (?:
+        (?P<NL>\n(?:[ \t\r\f]*(?:\#[^\n]*)?\n)*)
+      | (?P<STR>"[^"]*"|'[^']*')
+      | (?P<NUM>\d+(?:\.\d*)?|\.\d+)
+      | (?P<ID>\w+)
+      | (?P<OP>->|<:|\S)
+    )""", re.VERBOSE)
+
+# fn の本体は1フィールド（または閉じ括弧）を1回のマッチで読む。
+# よくある形の値（数値、kind("...")、行末までの sig）は同じマッチで取り出し、
+# それ以外の値は ':' の直後からトークン単位で読む
+_FIELD_RE = re.compile(r"""
+    (?:\s|\#[^\n]*)*
+    (?:
+        (?P<close>\})
+      | (?P<key>\w+)[ \t]*(?P<colon>:)[ \t]*
+        (?:
+            (?P<num>\d+(?:\.\d*)?|\.\d+)(?=[\s\#}]|$)
+          | (?P<call>\w+)[ \t]*\([ \t]*(?:"(?P<dq>[^"]*)"|'(?P<sq>[^']*)')[ \t]*\)
+          | (?P<line>[^\n\#}"'(]*)(?=[\n\#}]|$)
+        )?
+    )""", re.VERBOSE)
+_ATTRS_RE = re.compile(r'([^\]]*)\]')  # '[' の直後から ']' まで
+
+# 行頭の type / fn / import 宣言の直前の改行（end() が iter_dsl_decls が入力を区切る位置）。
+# 改行から始まるパターンなので、re は改行だけを探して候補を絞れる
+_DECL_START_RE = re.compile(r'\n(?=[ \t]*(?:(?:type|fn)[ \t]+\w|import[ \t]*["\']))')
+
+# 行末までの値を終えるトークン
+_EOL = ('NL', 'EOF')
+_KIND_NAMES = {'ID': 'a name', 'NUM': 'a number', 'STR': 'a string literal'}
+
+class _Parser:
+    """DSLの再帰下降パーサー
+
+    先読みは現在のトークン1つだけで、入力を先頭から一度だけ走査する。
+    kind/value は現在のトークン、start はその開始位置、end は次に読む位置。
+    sig や属性のように空白を含む値は、':' や '[' の直後から専用のパターンで
+    元の文字列を切り出す（コメント除去後の旧パーサーと同じ値になる）。
+    """
+
+    def __init__(self, content: str, first_line: int = 1):
+        self.text = content
+        self.first_line = first_line  # content の先頭行の行番号（分割して読むとき）
+        self.kind = self.value = None
+        self.start = self.end = 0
+        self.advance()
+
+    def advance(self):
+        """end から次のトークンを読む"""
+        m = _TOKEN_RE.match(self.text, self.end)
+        if m is None:
+            # 残りは空白とコメントだけ
+            self.kind, self.value = 'EOF', ''
+            self.start = self.end = len(self.text)
+            return
+        kind = self.kind = m.lastgroup
+        self.start = m.start(kind)
+        self.end = m.end()
+        self.value = m.group(kind)
+
+    def line_at(self, pos: int) -> int:
+        return self.text.count('\n', 0, pos) + self.first_line
+
+    def error(self, message: str, incomplete: bool = False):
+        line = self.line_at(self.start)
+        if self.kind in _EOL:
+            found = 'end of file' if self.kind == 'EOF' else 'end of line'
+        else:
+            found = repr(self.value)
+        raise DSLSyntaxError(f"{message}, found {found}", line,
+                             incomplete=incomplete or self.kind == 'EOF')
+
+    def expect(self, kind: str, value: Optional[str] = None) -> str:
+        if self.kind != kind or (value is not None and self.value != value):
+            self.error(f"expected {value or _KIND_NAMES.get(kind, kind)}")
+        token = self.value
+        self.advance()
+        return token
+
+    def skip_line(self):
+        """行末（NL の手前）まで読み飛ばす"""
+        while self.kind not in _EOL:
+            self.advance()
+
+    def declarations(self):
+        """宣言を出現順に TypeDecl / FunctionDecl / ImportDecl として返す
+
+        トップレベルの type / fn / import 以外のトークンは読み飛ばす。
+        """
+        while self.kind != 'EOF':
+            if self.kind == 'ID':
+                if self.value == 'type':
+                    self.advance()
+                    yield self.type_decl()
+                    continue
+                if self.value == 'fn':
+                    self.advance()
+                    decl = self.fn_decl()
+                    if decl is not None:
+                        yield decl
+                    continue
+                if self.value == 'import':
+                    self.advance()
+                    # import "path"
+                    path = self.expect('STR')[1:-1]
+                    self.skip_line()
+                    yield ImportDecl(path)
+                    continue
+            self.advance()
+
+    def type_decl(self) -> TypeDecl:
+        # type Name [<: Super, ...] [= A × B | [key=value, ...]]
+        name = self.expect('ID')
+        attrs = {}
+        supertypes = None
+        if self.kind == 'OP' and self.value == '<:':
+            self.advance()
+            supertypes = [self.expect('ID')]
+            while self.kind == 'OP' and self.value == ',':
+                self.advance()
+                supertypes.append(self.expect('ID'))
+        if self.kind == 'OP' and self.value == '=':
+            self.advance()
+            attrs['product_of'] = self.product()
+        elif self.kind == 'OP' and self.value == '[':
+            m = _ATTRS_RE.match(self.text, self.end)
+            if m is None:
+                self.error("unterminated '['", incomplete=True)
+            self.end = m.end()
+            self.advance()
+            for attr in m.group(1).split(','):
+                attr = attr.strip()
+                if '=' in attr:
+                    key, value = attr.split('=', 1)
+                    attrs[key.strip()] = value.strip()
+        if supertypes:
+            attrs['subtype_of'] = supertypes
+        self.skip_line()
+        return TypeDecl(name, attrs)
+
+    def product(self) -> List[str]:
+        # A × B × C（区切りは × または単独の x）。行末か { まで
+        components = []
+        first = last = None
+        while self.kind not in _EOL and not (self.kind == 'OP' and self.value == '{'):
+            if (self.kind == 'OP' and self.value == '×') or (self.kind == 'ID' and self.value == 'x'):
+                components.append(self.text[first:last] if first is not None else '')
+                first = None
+            else:
+                if first is None:
+                    first = self.start
+                last = self.end
+            self.advance()
+        components.append(self.text[first:last] if first is not None else '')
+        return components
+
+    def fn_decl(self) -> Optional[FunctionDecl]:
+        # fn name { field: value ... }（sig の無い関数は捨てる）
+        fn_id = self.expect('ID')
+        if self.kind != 'OP' or self.value != '{':
+            self.error("expected '{'")
+        text = self.text
+        opened = self.start
+        pos = self.end
+        fields = {}
+        while True:
+            m = _FIELD_RE.match(text, pos)
+            if m is None:
+                self.end = pos
+                self.advance()
+                while self.kind == 'NL':
+                    self.advance()
+                if self.kind == 'EOF':
+                    raise DSLSyntaxError(f"unterminated fn {fn_id}", self.line_at(opened),
+                                         incomplete=True)
+                self.error("expected a field name or '}'")
+            key = m.group('key')
+            if key is None:
+                pos = m.end()
+                break
+            # 同じフィールドが複数あれば先のものを使う
+            value = None
+            if key == 'sig':
+                value = m.group('line')
+                if value is not None:
+                    value = value.strip()
+            elif key == 'impl':
+                kind = m.group('call')
+                if kind is not None:
+                    dq = m.group('dq')
+                    value = _make_impl(kind, dq if dq is not None else m.group('sq'))
+            elif key == 'cost' or key == 'confidence':
+                num = m.group('num')
+                if num is not None:
+                    value = float(num)
+            if value is not None:
+                pos = m.end()
+            else:
+                # よくある形でない値はトークン単位で読む
+                self.end = m.end('colon')
+                self.advance()
+                if key == 'impl':
+                    value = self.impl()
+                elif key == 'cost' or key == 'confidence':
+                    self.error("expected a number")
+                elif key == 'inverse_of':
+                    value = self.expect('ID')
+                elif self.kind == 'STR':
+                    value = self.value[1:-1]  # doc: "..." など
+                    self.advance()
+                else:
+                    value = self.rest_of_field()
+                pos = self.start  # 先読みしたトークンは次のマッチで読み直す
+            fields.setdefault(key, value)
+        self.end = pos
+        self.advance()
+        if not fields.get('sig'):
+            return None
+        return FunctionDecl(fn_id, fields['sig'], fields.get('impl', {}),
+                            fields.get('cost', 1.0), fields.get('confidence', 1.0),
+                            fields.get('inverse_of'))
+
+    def rest_of_field(self) -> str:
+        """行末か fn の閉じ括弧までの値（元の文字列）"""
+        first = last = None
+        depth = 0
+        while self.kind not in _EOL:
+            if self.kind == 'OP':
+                if self.value in '([{':
+                    depth += 1
+                elif self.value in ')]}':
+                    if depth == 0:
+                        break
+                    depth -= 1
+            if first is None:
+                first = self.start
+            last = self.end
+            self.advance()
+        return self.text[first:last] if first is not None else ''
+
+    def impl(self) -> Dict[str, Any]:
+        # kind("a", "b") のように引数が複数の場合
+        kind = self.expect('ID')
+        self.expect('OP', '(')
+        args = [self.expect('STR')[1:-1]]
+        while self.kind == 'OP' and self.value == ',':
+            self.advance()
+            args.append(self.expect('STR')[1:-1])
+        self.expect('OP', ')')
+        return _make_impl(kind, ', '.join(args))
+
+def _make_impl(kind: str, value: str) -> Dict[str, Any]:
+    """impl: kind("value") を impl の辞書に変換"""
+    value = value.strip()
+    if kind == 'sparql':
+        return {'kind': 'sparql', 'query': value}
+    if kind == 'rest':
+        # REST呼び出しの場合、メソッドとURLをパース
+        parts = [p.strip().strip('"\'') for p in value.split(',')]
+        if len(parts) >= 2:
+            return {'kind': 'rest', 'method': parts[0], 'url': parts[1]}
+        return {'kind': 'rest', 'url': value}
+    if kind == 'formula':
+        return {'kind': 'formula', 'expr': value}
+    if kind == 'builtin':
+        # ビルトイン関数
+        return {'kind': 'builtin', 'name': value}
+    return {'kind': kind, 'value': value}
+
+def iter_dsl_decls(fileobj, chunk_size: int = 1 << 16) -> Iterator[Union[TypeDecl, FunctionDecl, ImportDecl]]:
+    """テキストモードのファイルからDSLを少しずつ読み、宣言を出現順に返す
+
+    chunk_size 文字ずつ読み、最後の行頭の type / fn より前を完結した宣言として
+    パースする。保持するのは読みかけの宣言と1チャンク分だけなので、
+    ファイル全体を文字列として読み込まずに済む。sig の無い関数は返さない。
+
+    行頭の type / fn が文字列の中にあるなど、区切った位置で宣言が完結しない場合は
+    まとめて読み直す。構文エラーは DSLSyntaxError（ファイル全体での行番号）。
+    """
+    buf = ''
+    line = 1  # buf の先頭行の行番号
+    retry_at = 0  # 区切りを読み直すときは buf がこの長さになるまで読み足す
+    while True:
+        chunk = fileobj.read(chunk_size)
+        if not chunk:
+            break
+        buf += chunk
+        if len(buf) < retry_at:
+            continue
+        # 最後の宣言は次のチャンクに続いているかもしれない
+        cut = 0
+        for m in _DECL_START_RE.finditer(buf):
+            cut = m.end()
+        if cut == 0:
+            continue
+        head = buf[:cut]
+        try:
+            decls = list(_Parser(head, line).declarations())
+        except DSLSyntaxError:
+            # 構文エラーか区切り位置の誤り：残りも含めて読み直す（最後まで読めば確定する）
+            retry_at = 2 * len(buf)
+            continue
+        yield from decls
+        line += head.count('\n')
+        buf = buf[cut:]
+        retry_at = 0
+    yield from _Parser(buf, line).declarations()
+
 class DSLParser:
-    """DSLパーサー"""
+    """DSLパーサー
+
+    1パスの字句解析（_TOKEN_RE）と再帰下降パーサー（_Parser）で、
+    入力の長さに比例する時間で宣言を読む。
+    """
 
     def __init__(self):
         self.types: List[TypeDecl] = []
         self.functions: List[FunctionDecl] = []
+        self.imports: List[str] = []  # import のパス（書かれた順）
 
     def parse(self, content: str):
-        """DSLファイルの内容をパース"""
+        """DSLファイルの内容をパース（構文エラーは DSLSyntaxError）"""
         self.types = []
         self.functions = []
-
-        # コメント除去
-        lines = []
-        for line in content.split('\n'):
-            # # 以降をコメントとして除去
-            line = re.sub(r'#.*$', '', line)
-            lines.append(line)
-        content = '\n'.join(lines)
-
-        # 型宣言のパース
-        # 通常の型: type Name [unit=kg]
-        # Product型: type Name = A × B × C
-        type_pattern = r'type\s+(\w+)(?:\s*=\s*([^{\n]+)|(?:\s*\[([^\]]+)\]))?'
-        for match in re.finditer(type_pattern, content):
-            name = match.group(1)
-            product_def = match.group(2)  # Product型の定義
-            attrs_str = match.group(3)    # 通常の型の属性
-            attrs = {}
-
-            if product_def:
-                # Product型の定義
-                # "A × B × C" または "A x B x C" の形式
-                product_def = product_def.strip()
-                # × または x で分割
-                components = [c.strip() for c in re.split(r'[×x]', product_def)]
-                attrs['product_of'] = components
-            elif attrs_str:
-                # 通常の型の属性をパース
-                for attr in attrs_str.split(','):
-                    attr = attr.strip()
-                    if '=' in attr:
-                        key, value = attr.split('=', 1)
-                        attrs[key.strip()] = value.strip()
-
-            self.types.append(TypeDecl(name, attrs))
-
-        # 関数宣言のパース（ネストした括弧に対応）
-        # 手動で関数宣言を抽出
-        fn_starts = [(m.start(), m.group(1)) for m in re.finditer(r'fn\s+(\w+)\s*\{', content)]
-
-        for i, (start, fn_id) in enumerate(fn_starts):
-            # 対応する閉じ括弧を見つける
-            brace_count = 0
-            in_string = False
-            string_char = None
-            body_start = content.index('{', start) + 1
-
-            for j in range(body_start, len(content)):
-                char = content[j]
-
-                # 文字列リテラル内かどうかチェック
-                if char in ('"', "'") and (j == 0 or content[j-1] != '\\'):
-                    if not in_string:
-                        in_string = True
-                        string_char = char
-                    elif char == string_char:
-                        in_string = False
-                        string_char = None
-
-                # 文字列外の括弧のみカウント
-                if not in_string:
-                    if char == '{':
-                        brace_count += 1
-                    elif char == '}':
-                        if brace_count == 0:
-                            # 対応する閉じ括弧を見つけた
-                            fn_body = content[body_start:j]
-                            fn_data = self._parse_function_body(fn_id, fn_body)
-                            if fn_data:
-                                self.functions.append(fn_data)
-                            break
-                        else:
-                            brace_count -= 1
-
-    def _parse_function_body(self, fn_id: str, body: str) -> Optional[FunctionDecl]:
-        """関数本体をパース"""
-        sig = None
-        impl = {}
-        cost = 1.0
-        confidence = 1.0
-        inverse_of = None
-
-        # sig: の抽出
-        sig_match = re.search(r'sig:\s*([^\n]+)', body)
-        if sig_match:
-            sig = sig_match.group(1).strip()
-        else:
-            return None
-
-        # impl: の抽出（文字列リテラル内の括弧も考慮）
-        # まず文字列リテラルを探す
-        impl_match = re.search(r'impl:\s*(\w+)\s*\(\s*"([^"]+)"\s*\)', body)
-        if not impl_match:
-            impl_match = re.search(r"impl:\s*(\w+)\s*\(\s*'([^']+)'\s*\)", body)
-
-        if impl_match:
-            impl_kind = impl_match.group(1)
-            impl_value = impl_match.group(2).strip()
-
-            if impl_kind == 'sparql':
-                impl = {'kind': 'sparql', 'query': impl_value}
-            elif impl_kind == 'rest':
-                # REST呼び出しの場合、メソッドとURLをパース
-                parts = [p.strip().strip('"\'') for p in impl_value.split(',')]
-                if len(parts) >= 2:
-                    impl = {'kind': 'rest', 'method': parts[0], 'url': parts[1]}
-                else:
-                    impl = {'kind': 'rest', 'url': impl_value}
-            elif impl_kind == 'formula':
-                impl = {'kind': 'formula', 'expr': impl_value}
-            elif impl_kind == 'builtin':
-                # ビルトイン関数
-                impl = {'kind': 'builtin', 'name': impl_value}
+        self.imports = []
+        self.extend(_Parser(content).declarations())
+
+    def extend(self, decls):
+        """宣言の列（iter_dsl_decls など）を追加する"""
+        for decl in decls:
+            if isinstance(decl, TypeDecl):
+                self.types.append(decl)
+            elif isinstance(decl, ImportDecl):
+                self.imports.append(decl.path)
             else:
-                impl = {'kind': impl_kind, 'value': impl_value}
-
-        # cost: の抽出
-        cost_match = re.search(r'cost:\s*([\d.]+)', body)
-        if cost_match:
-            cost = float(cost_match.group(1))
-
-        # confidence: の抽出
-        conf_match = re.search(r'confidence:\s*([\d.]+)', body)
-        if conf_match:
-            confidence = float(conf_match.group(1))
-
-        # inverse_of: の抽出
-        inv_match = re.search(r'inverse_of:\s*(\w+)', body)
-        if inv_match:
-            inverse_of = inv_match.group(1)
-
-        return FunctionDecl(fn_id, sig, impl, cost, confidence, inverse_of)
+                self.functions.append(decl)
 
     def to_catalog_dict(self) -> Dict[str, Any]:
-        """カタログ辞書形式に変換（YAMLとして保存可能）"""
-        return {
+        """カタログ辞書形式に変換（YAMLとして保存可能）
+
+        import があれば 'imports' にパスのリストを入れる（読み込むのは dsl_imports.py）。
+        """
+        result = {
             'types': [t.to_dict() for t in self.types],
             'functions': [f.to_dict() for f in self.functions]
         }
+        if self.imports:
+            result['imports'] = list(self.imports)
+        return result
 
     def to_yaml(self) -> str:
         """YAML文字列に変換"""
@@ -214,11 +446,9 @@ class DSLParser:
 
 def parse_dsl_file(filepath: str) -> Dict[str, Any]:
     """DSLファイルをパースしてカタログ辞書を返す"""
-    with open(filepath, 'r', encoding='utf-8') as f:
-        content = f.read()
-
     parser = DSLParser()
-    parser.parse(content)
+    with open(filepath, 'r', encoding='utf-8') as f:
+        parser.extend(iter_dsl_decls(f))
     return parser.to_catalog_dict()
 
 def parse_dsl_string(content: str) -> Dict[str, Any]:
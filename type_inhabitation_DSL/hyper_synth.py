@@ -0,0 +1,186 @@
+# hyper_synth.py
+"""
+ハイパーグラフ（AND/OR）探索による多入力関数・Product型の合成
+
+通常の探索は A -> B の辺しか扱えないため、Product型や多引数関数は
+コンポーネントごとに個別に探索して手動で集約する必要があった
+（README_GHG_AGGREGATION_ISSUE.md, demo_ghg_multipath.py）。
+
+ここでは関数をハイパー辺（複数の入力型 -> 1つの出力型）として扱い、
+Knuth の一般化Dijkstra法で導出木を1つ求める:
+
+  - 多引数関数 sig: (A, B) -> C または A × B -> C は {A, B} -> C
+  - Product型 P = A × B × C は構築子 {A, B, C} -> P（コスト0）
+    カタログに builtin("product") で P を返す関数があればそれを構築子として使う
+  - 通常の関数 A -> B は入力1つのハイパー辺
+
+各型は一度だけ確定するので、複数のコンポーネントが共有する部分パス
+（例: Facility -> FuelUsage）は一度しか探索しない。
+導出木のコストは部分木のコストの和（共有部分も使う回数だけ数える）。
+"""
+
+import heapq
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from synth_lib import Catalog, Func, _require_no_subtyping
+
+INF = float('inf')
+
+# 多引数シグネチャの区切り: "(A, B)" / "A × B" / "A x B"
+_ARG_SPLIT = re.compile(r'\s*,\s*|\s*×\s*|\s+x\s+')
+
+def split_arg_types(dom: str) -> List[str]:
+    """関数のドメイン文字列を入力型のリストに分解する"""
+    dom = dom.strip()
+    if dom.startswith('(') and dom.endswith(')'):
+        dom = dom[1:-1]
+    return [t for t in _ARG_SPLIT.split(dom) if t]
+
+@dataclass
+class Hyperedge:
+    """ハイパー辺（tails の型がすべて揃うと head の型が得られる）"""
+    func: Optional[Func]      # None は暗黙の Product 構築子
+    tails: Tuple[str, ...]
+    head: str
+    cost: float
+
+@dataclass
+class Derivation:
+    """導出木（型 type を func で children から得る。葉は入力型）"""
+    type: str
+    cost: float
+    func: Optional[Func] = None
+    children: List['Derivation'] = field(default_factory=list)
+
+    def funcs(self) -> List[Func]:
+        """実行順（子が先）に並べた関数のリスト。共有部分木は一度だけ含める"""
+        out, seen = [], set()
+
+        def visit(node):
+            if id(node) in seen:
+                return
+            seen.add(id(node))
+            for child in node.children:
+                visit(child)
+            if node.func is not None:
+                out.append(node.func)
+
+        visit(self)
+        return out
+
+    def proof(self) -> str:
+        """証明項の文字列（例: aggregateAllScopes(⟨s1, s2, s3⟩)）"""
+        if not self.children:
+            return self.type
+        args = ', '.join(child.proof() for child in self.children)
+        if self.func is None:
+            return f"⟨{args}⟩"
+        return f"{self.func.id}({args})"
+
+    def to_dict(self):
+        """JSON出力用の辞書"""
+        return {
+            'type': self.type,
+            'cost': self.cost,
+            'func': self.func.id if self.func else None,
+            'children': [child.to_dict() for child in self.children],
+        }
+
+class Hypergraph:
+    """カタログのハイパー辺と入力型ごとの索引"""
+
+    def __init__(self, catalog: Catalog):
+        _require_no_subtyping(catalog.compile(), 'hyper_synth')
+        self.edges: List[Hyperedge] = []
+        constructors = {}
+        for f in catalog.funcs:
+            if (f.cod in catalog.product_types and f.impl.get('kind') == 'builtin'
+                    and f.impl.get('name') == 'product'):
+                # builtin("product") は Product 型の構築子そのもの
+                constructors.setdefault(f.cod, f)
+                continue
+            tails = split_arg_types(f.dom)
+            self.edges.append(Hyperedge(f, tuple(tails), f.cod, f.cost))
+        for name, product in catalog.product_types.items():
+            func = constructors.get(name)
+            self.edges.append(Hyperedge(func, tuple(product.components), name,
+                                        func.cost if func else 0.0))
+        self.by_tail: Dict[str, List[int]] = {}
+        for i, edge in enumerate(self.edges):
+            for t in set(edge.tails):
+                self.by_tail.setdefault(t, []).append(i)
+
+def hypergraph(catalog: Catalog) -> Hypergraph:
+    """カタログのハイパーグラフを返す（コンパイル済みカタログにキャッシュ）"""
+    cc = catalog.compile()
+    if cc.hypergraph is None:
+        cc.hypergraph = Hypergraph(catalog)
+    return cc.hypergraph
+
+def synthesize_hyper(catalog: Catalog, sources: Union[str, Iterable[str]], goal_type: str,
+                     max_cost=INF) -> Optional[Derivation]:
+    """入力型（複数可）から goal_type への最小コストの導出木を求める
+
+    Knuth の一般化Dijkstra法: ハイパー辺は入力型がすべて確定した時点で
+    cost + Σ(入力のコスト) を出力型の候補とする。
+
+    Returns:
+        導出木（見つからなければ None）
+    """
+    sources = {sources} if isinstance(sources, str) else set(sources)
+    graph = hypergraph(catalog)
+    edges = graph.edges
+
+    dist: Dict[str, float] = {}
+    best_edge: Dict[str, int] = {}
+    remaining = [len(set(edge.tails)) for edge in edges]
+    done = set()
+    pq = []
+    for s in sources:
+        dist[s] = 0.0
+        heapq.heappush(pq, (0.0, s))
+    # 入力の無いハイパー辺（定数）は最初から発火できる
+    for i, edge in enumerate(edges):
+        if remaining[i] == 0 and edge.cost < dist.get(edge.head, INF):
+            dist[edge.head] = edge.cost
+            best_edge[edge.head] = i
+            heapq.heappush(pq, (edge.cost, edge.head))
+
+    while pq:
+        d, v = heapq.heappop(pq)
+        if v in done or d > dist[v]:
+            continue
+        done.add(v)
+        if v == goal_type:
+            break
+        for i in graph.by_tail.get(v, ()):
+            remaining[i] -= 1
+            if remaining[i] > 0:
+                continue
+            edge = edges[i]
+            total = edge.cost + sum(dist[t] for t in edge.tails)
+            if total <= max_cost and total < dist.get(edge.head, INF):
+                dist[edge.head] = total
+                best_edge[edge.head] = i
+                heapq.heappush(pq, (total, edge.head))
+
+    if goal_type not in done:
+        return None
+
+    # 導出木を復元（同じ型の部分木は共有する）
+    nodes: Dict[str, Derivation] = {}
+
+    def build(t):
+        node = nodes.get(t)
+        if node is None:
+            if t in sources:
+                node = Derivation(t, 0.0)
+            else:
+                edge = edges[best_edge[t]]
+                node = Derivation(t, dist[t], edge.func, [build(c) for c in edge.tails])
+            nodes[t] = node
+        return node
+
+    return build(goal_type)
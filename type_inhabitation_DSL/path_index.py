@@ -0,0 +1,160 @@
+# path_index.py
+"""
+全点対の最小コスト・次ホップインデックス
+
+中規模カタログ向けに、NumPy 配列上のベクトル化した min-plus
+Floyd–Warshall で全ての型の組の最小コストと次ホップ（最初に使う関数）を
+前計算する。インデックスはカタログファイルの隣に保存され、
+問い合わせは探索なしで表引きだけで答えられる。
+
+使用例:
+  python path_index.py catalog.dsl      # catalog.dsl.pathidx.npz を作成
+"""
+
+import sys
+from pathlib import Path
+from typing import List, Optional
+
+from synth_lib import Catalog, _require_no_subtyping
+
+# オプショナルな依存関係
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+INDEX_SUFFIX = '.pathidx.npz'
+INDEX_VERSION = 2
+
+def index_path_for(catalog_path: str) -> Path:
+    """カタログファイルに対応するインデックスファイルのパス"""
+    return Path(str(catalog_path) + INDEX_SUFFIX)
+
+class PathIndex:
+    """全点対の最小コストと次ホップを保持するインデックス
+
+    dist[i, j] は型 i から型 j への最小コスト（到達不能なら inf）、
+    next_edge[i, j] は i から j への最短路で最初に使う関数の辺ID（無ければ -1）。
+    辺IDはコンパイル済みカタログの辺IDで、fingerprint と辺の数で整合性を確認する
+    （関数を削除したカタログでは辺IDが catalog.funcs の順序とずれるため）。
+    """
+
+    def __init__(self, catalog: Catalog, dist, next_edge):
+        self.catalog = catalog
+        self.dist = dist
+        self.next_edge = next_edge
+
+    @classmethod
+    def build(cls, catalog: Catalog, max_types: int = 2000) -> 'PathIndex':
+        """カタログから全点対インデックスを構築する"""
+        if not HAS_NUMPY:
+            raise ImportError("numpy is required to build a PathIndex")
+        cc = catalog.compile()
+        _require_no_subtyping(cc, 'PathIndex')
+        n = cc.num_types
+        if n > max_types:
+            raise ValueError(f"Catalog has {n} types; all-pairs index is limited to {max_types}")
+
+        dist = np.full((n, n), np.inf)
+        np.fill_diagonal(dist, 0.0)
+        next_edge = np.full((n, n), -1, dtype=np.int64)
+        # 直接の関数：同じ型の組では最小コスト（同点ならカタログ上で先の関数）
+        for e in cc.live_edges():
+            u, v, c = cc.dom[e], cc.cod[e], cc.cost[e]
+            if u != v and c < dist[u, v]:
+                dist[u, v] = c
+                next_edge[u, v] = e
+
+        # min-plus Floyd–Warshall（k ごとに n×n 配列をまとめて更新）
+        finite_in = np.isfinite(dist).sum(axis=0) > 1
+        finite_out = np.isfinite(dist).sum(axis=1) > 1
+        via_k = np.empty_like(dist)
+        better = np.empty((n, n), dtype=bool)
+        for k in range(n):
+            # k に入る辺か出る辺が無ければ k を経由する改善は起こらない
+            if not (finite_in[k] and finite_out[k]):
+                continue
+            np.add(dist[:, k:k + 1], dist[k:k + 1, :], out=via_k)
+            np.less(via_k, dist, out=better)
+            np.copyto(dist, via_k, where=better)
+            # i から j への次ホップは i から k への次ホップになる
+            np.copyto(next_edge, next_edge[:, k:k + 1], where=better)
+        return cls(catalog, dist, next_edge)
+
+    def query(self, src_type: str, goal_type: str, max_cost=float('inf')):
+        """synthesize_backward と同じ形式の [(cost, [Func])] を返す（最短路のみ）"""
+        if src_type == goal_type:
+            return [(0.0, [])]
+        cc = self.catalog.compile()
+        src = cc.type_index.get(src_type)
+        goal = cc.type_index.get(goal_type)
+        if src is None or goal is None:
+            return []
+        if self.dist[src, goal] == float('inf'):
+            return []
+        path_edges: List[int] = []
+        v = src
+        while v != goal:
+            e = int(self.next_edge[v, goal])
+            path_edges.append(e)
+            v = cc.cod[e]
+        # 表の距離は足す順序が異なり末尾の桁がずれ得るので、
+        # synthesize_backward と同じく goal 側から足し合わせる
+        cost = 0.0
+        for e in reversed(path_edges):
+            cost += cc.cost[e]
+        if cost > max_cost:
+            return []
+        return [(cost, cc.to_funcs(path_edges))]
+
+    def save(self, catalog_path: str) -> Path:
+        """インデックスをカタログファイルの隣に保存する"""
+        out = index_path_for(catalog_path)
+        with open(out, 'wb') as f:
+            np.savez_compressed(
+                f,
+                version=np.array(INDEX_VERSION),
+                fingerprint=np.array(self.catalog.fingerprint()),
+                type_names=np.array(self.catalog.compile().type_names),
+                num_edges=np.array(len(self.catalog.compile().funcs)),
+                dist=self.dist,
+                next_edge=self.next_edge,
+            )
+        return out
+
+    @classmethod
+    def load(cls, catalog_path: str, catalog: Catalog) -> Optional['PathIndex']:
+        """保存済みインデックスを読み込む
+
+        ファイルが無い、NumPy が無い、またはカタログの内容と一致しない場合は None。
+        """
+        path = index_path_for(catalog_path)
+        if not HAS_NUMPY or not path.exists():
+            return None
+        with np.load(path, allow_pickle=False) as data:
+            if int(data['version']) != INDEX_VERSION:
+                return None
+            if str(data['fingerprint']) != catalog.fingerprint():
+                return None
+            cc = catalog.compile()
+            if list(data['type_names']) != cc.type_names:
+                return None
+            if not int(data['num_edges']) == len(cc.funcs) == len(catalog.funcs):
+                return None
+            return cls(catalog, data['dist'], data['next_edge'])
+
+def build_index_file(catalog_path: str) -> Path:
+    """カタログファイルを読み込み、隣にインデックスを保存する"""
+    if str(catalog_path).endswith('.dsl'):
+        cat = Catalog.from_dsl(catalog_path)
+    else:
+        cat = Catalog.from_yaml(catalog_path)
+    return PathIndex.build(cat).save(catalog_path)
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("Usage: python path_index.py <catalog.dsl|catalog.yaml>")
+        sys.exit(1)
+    out = build_index_file(sys.argv[1])
+    print(f"Saved path index to {out}")
@@ -0,0 +1,155 @@
+# query_cache.py
+"""
+探索結果のLRUキャッシュ
+
+同じカタログに同じ問い合わせを繰り返す場合（run_executable.py を
+同じ goal で何度も起動するなど）に、探索をやり直さずに結果を返す。
+キーはカタログの内容のハッシュ（Catalog.fingerprint）、問い合わせ
+(src_type, goal_type, max_cost)、制約と探索オプションから作るので、
+カタログが変わった後に古い結果が返ることはない。
+
+メモリ上のLRUに加えて、path を指定すると SQLite のファイルにも保存し、
+プロセスを再起動しても結果を再利用できる。パスは catalog.funcs 上の
+位置の列として保存し、取り出すときにそのカタログの Func に戻す。
+"""
+
+import hashlib
+import json
+import sqlite3
+import weakref
+from collections import OrderedDict
+from typing import List, Optional
+
+from synth_lib import Catalog, SearchConstraints, synthesize_backward
+
+class QueryCache:
+    """fingerprint 付きの問い合わせキーで探索結果を保持する有界LRUキャッシュ
+
+    hits はメモリ上のヒット、disk_hits は SQLite からのヒット、
+    misses は探索を実行した回数、evictions はメモリから追い出した件数。
+    """
+
+    def __init__(self, maxsize: int = 1024, path: Optional[str] = None):
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        self.maxsize = maxsize
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: 'OrderedDict[str, list]' = OrderedDict()
+        # カタログ -> (fingerprint, {id(Func): catalog.funcs 上の位置})
+        # 同じ内容のカタログでも Func は別のオブジェクトなので、カタログごとに作る
+        self._positions: 'weakref.WeakKeyDictionary[Catalog, tuple]' = weakref.WeakKeyDictionary()
+        self._db = None
+        if path is not None:
+            self._db = sqlite3.connect(str(path))
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS query_cache ("
+                " key TEXT PRIMARY KEY, fingerprint TEXT NOT NULL, value TEXT NOT NULL)")
+            self._db.commit()
+
+    @staticmethod
+    def make_key(catalog: Catalog, src_type: str, goal_type: str, max_cost,
+                 constraints: Optional[SearchConstraints] = None, **options) -> str:
+        """キャッシュのキー（カタログの内容・問い合わせ・制約・オプションのハッシュ）"""
+        content = [
+            catalog.fingerprint(), src_type, goal_type, float(max_cost),
+            constraints.key() if constraints is not None else None,
+            sorted(options.items()),
+        ]
+        data = json.dumps(content, ensure_ascii=False, default=str)
+        return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+    def _encode(self, catalog: Catalog, results) -> list:
+        fingerprint = catalog.fingerprint()
+        cached = self._positions.get(catalog)
+        if cached is None or cached[0] != fingerprint:
+            # 初めてのカタログか、前回から変更されたカタログ
+            positions = {id(f): i for i, f in enumerate(catalog.funcs)}
+            self._positions[catalog] = (fingerprint, positions)
+        else:
+            positions = cached[1]
+        return [(cost, [positions[id(f)] for f in path]) for cost, path in results]
+
+    @staticmethod
+    def _decode(catalog: Catalog, entry) -> List[tuple]:
+        funcs = catalog.funcs
+        return [(cost, [funcs[i] for i in path]) for cost, path in entry]
+
+    def _remember(self, key: str, entry: list):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, catalog: Catalog, key: str) -> Optional[List[tuple]]:
+        """キャッシュ済みの結果 [(cost, [Func])]（無ければ None）"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._decode(catalog, entry)
+        if self._db is not None:
+            row = self._db.execute("SELECT value FROM query_cache WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                entry = json.loads(row[0])
+                self._remember(key, entry)
+                self.disk_hits += 1
+                return self._decode(catalog, entry)
+        return None
+
+    def put(self, catalog: Catalog, key: str, results):
+        """結果を保存する（メモリと、指定されていれば SQLite）"""
+        entry = self._encode(catalog, results)
+        self._remember(key, entry)
+        if self._db is not None:
+            self._db.execute(
+                "INSERT OR REPLACE INTO query_cache (key, fingerprint, value) VALUES (?, ?, ?)",
+                (key, catalog.fingerprint(), json.dumps(entry)))
+            self._db.commit()
+
+    def synthesize(self, catalog: Catalog, src_type: str, goal_type: str, max_cost=100,
+                   constraints: Optional[SearchConstraints] = None, **options) -> List[tuple]:
+        """キャッシュを通した synthesize_backward（options はそのまま渡す。stats は不可）"""
+        key = self.make_key(catalog, src_type, goal_type, max_cost, constraints, **options)
+        results = self.get(catalog, key)
+        if results is None:
+            self.misses += 1
+            results = synthesize_backward(catalog, src_type, goal_type, max_cost=max_cost,
+                                          constraints=constraints, **options)
+            self.put(catalog, key, results)
+        return results
+
+    def purge_stale(self, catalog: Catalog) -> int:
+        """SQLite から現在のカタログと fingerprint が異なる結果を削除し、削除件数を返す"""
+        if self._db is None:
+            return 0
+        cur = self._db.execute("DELETE FROM query_cache WHERE fingerprint != ?",
+                               (catalog.fingerprint(),))
+        self._db.commit()
+        return cur.rowcount
+
+    def clear(self):
+        """メモリ上のキャッシュを空にする（SQLite はそのまま）"""
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        """カウンタの辞書（JSON出力用）"""
+        return {
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+        }
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def __len__(self):
+        return len(self._entries)
@@ -4,11 +4,30 @@ DSLファイルを使って型合成システムを実行
 
 使用例:
   python run_dsl.py catalog.dsl Product CO2
+  python run_dsl.py catalog.dsl Product CO2 50 --k 3   # コスト順に上位3件
+  python run_dsl.py catalog.dsl Product CO2 --min-confidence 0.7   # パレートフロント
+  python run_dsl.py catalog.dsl Product CO2 --beam 1000   # 巨大カタログ向けのビーム探索
+
+catalog.dsl.pathidx.npz（python path_index.py catalog.dsl で作成）があれば
+探索せずに全点対インデックスから最短路を答える。
+catalog.dsl.ch.json（python contraction.py catalog.dsl で作成）があれば
+縮約階層で最短路を答える。
+カタログは初回の実行で catalog.dsl.compiled.bin にコンパイル済みの形で保存し、
+次回からはパースせずに読み込む（catalog.dsl を変更すると作り直す）。
+
+--watch ではカタログ（import 先を含む）を監視し、保存されるたびに変わった宣言だけを
+反映して同じ探索をやり直す（catalog_watch.py。Ctrl-C で終了）:
+  python run_dsl.py catalog.dsl Product CO2 --watch
 """
 
+import argparse
 import json
 import sys
-from synth_lib import Catalog, synthesize_backward, path_to_json
+from itertools import islice
+from synth_lib import (Catalog, SearchStats, synthesize_backward, synthesize_k_best,
+                       synthesize_pareto, synthesize_beam, path_to_json)
+from path_index import PathIndex
+from contraction import ContractionHierarchy
 
 def prod_confidence(path):
     """パスの信頼度を計算（積）"""
@@ -20,30 +39,110 @@ def prod_confidence(path):
     return prod
 
 def main():
-    if len(sys.argv) < 4:
-        print("Usage: python run_dsl.py <catalog.dsl> <src_type> <goal_type> [max_cost]")
-        print("\nExample:")
-        print("  python run_dsl.py catalog.dsl Product CO2")
-        print("  python run_dsl.py catalog.dsl Product CO2 10")
-        sys.exit(1)
-
-    dsl_file = sys.argv[1]
-    src_type = sys.argv[2]
-    goal_type = sys.argv[3]
-    max_cost = int(sys.argv[4]) if len(sys.argv) > 4 else 50
-
-    # DSLファイルからカタログを読み込み
+    parser = argparse.ArgumentParser(
+        description='Run type synthesis on a DSL catalog',
+        epilog='Example: python run_dsl.py catalog.dsl Product CO2 10'
+    )
+    parser.add_argument('dsl_file', help='DSL catalog file')
+    parser.add_argument('src_type', help='Source type')
+    parser.add_argument('goal_type', help='Goal type')
+    parser.add_argument('max_cost', type=int, nargs='?', default=50,
+                       help='Maximum cost for path search (default: 50)')
+    parser.add_argument('--k', type=int,
+                       help='List the k cheapest loopless plans instead of the search frontier')
+    parser.add_argument('--min-confidence', type=float,
+                       help='List the cost/confidence Pareto front, pruning plans below this confidence')
+    parser.add_argument('--backend', choices=['scipy'],
+                       help='Shortest path only, computed with scipy.sparse.csgraph')
+    parser.add_argument('--beam', type=int, metavar='WIDTH',
+                       help='Memory-bounded beam search keeping WIDTH states per depth layer')
+    parser.add_argument('--stats', action='store_true',
+                       help='Print search statistics (nodes popped, pruning, wall time) to stderr; '
+                            'bypasses precomputed path indexes')
+    parser.add_argument('--no-catalog-cache', action='store_true',
+                       help='Always parse the DSL instead of using <dsl_file>.compiled.bin')
+    parser.add_argument('--watch', action='store_true',
+                       help='Watch the catalog files and rerun the search after every change')
+    args = parser.parse_args()
+    if args.backend is not None and args.stats:
+        parser.error('--stats is not supported by --backend scipy')
+
+    dsl_file = args.dsl_file
+
+    if args.watch:
+        watch(args)
+        return
+
+    # DSLファイルからカタログを読み込み（コンパイル済みキャッシュがあればパースしない）
     print(f"Loading catalog from {dsl_file}...", file=sys.stderr)
-    cat = Catalog.from_dsl(dsl_file)
+    cat = Catalog.load(dsl_file, use_cache=not args.no_catalog_cache)
 
     print(f"Catalog loaded:", file=sys.stderr)
     print(f"  Types: {len(cat.types)}", file=sys.stderr)
     print(f"  Functions: {len(cat.funcs)}", file=sys.stderr)
-    print(f"\nSearching for path: {src_type} -> {goal_type}", file=sys.stderr)
-    print(f"Max cost: {max_cost}\n", file=sys.stderr)
+    print(f"\nSearching for path: {args.src_type} -> {args.goal_type}", file=sys.stderr)
+    print(f"Max cost: {args.max_cost}\n", file=sys.stderr)
+
+    index = None
+    # 前計算のインデックスは探索しないので、--stats では使わずに探索して計測する
+    if (args.k is None and args.min_confidence is None and args.beam is None and args.backend is None
+            and not args.stats):
+        index = PathIndex.load(dsl_file, cat) or ContractionHierarchy.load(dsl_file, cat)
+    run_search(cat, args, index)
+
+def watch(args):
+    """カタログを監視し、変更を反映するたびに探索をやり直す"""
+    from catalog_watch import CatalogWatcher
+
+    print(f"Watching {args.dsl_file}...", file=sys.stderr)
+    watcher = CatalogWatcher(args.dsl_file)
+    cat = watcher.catalog
+    print(f"  Files: {len(watcher.paths)}, Types: {len(cat.types)}, "
+          f"Functions: {len(cat.funcs)}\n", file=sys.stderr)
+    run_search(cat, args)
+
+    def report_error(e):
+        print(f"\n✗ {e} (catalog unchanged)", file=sys.stderr)
+
+    try:
+        for changes in watcher.watch(on_error=report_error):
+            for change in changes:
+                print(f"\n↻ {change.path}: +{len(change.added)} -{len(change.removed)} "
+                      f"~{len(change.updated)} fn, {len(change.types)} type(s), "
+                      f"{change.parsed_blocks} block(s) parsed in {change.elapsed * 1000:.1f} ms",
+                      file=sys.stderr)
+            run_search(cat, args)
+    except KeyboardInterrupt:
+        pass
+
+def run_search(cat, args, index=None):
+    """引数の指定どおりに探索し、結果を JSON（stdout）とサマリー（stderr）で出力する"""
+    src_type = args.src_type
+    goal_type = args.goal_type
+    max_cost = args.max_cost
 
     # 型合成を実行
-    results = synthesize_backward(cat, src_type=src_type, goal_type=goal_type, max_cost=max_cost)
+    stats = SearchStats() if args.stats else None
+    if args.beam is not None:
+        beam = synthesize_beam(cat, src_type, goal_type, beam_width=args.beam,
+                               max_cost=max_cost, stats=stats)
+        results = beam.results
+        if results and not beam.optimal:
+            print(f"Beam result may be suboptimal by up to {results[0][0] - beam.lower_bound:g}",
+                  file=sys.stderr)
+    elif args.min_confidence is not None:
+        front = synthesize_pareto(cat, src_type, goal_type, max_cost=max_cost,
+                                  min_confidence=args.min_confidence, stats=stats)
+        results = [(cost, path) for cost, _, path in front]
+    elif args.k is not None:
+        results = list(islice(synthesize_k_best(cat, src_type, goal_type, max_cost=max_cost,
+                                                 stats=stats), args.k))
+    elif index is not None:
+        print(f"Using precomputed {type(index).__name__}", file=sys.stderr)
+        results = index.query(src_type, goal_type, max_cost=max_cost)
+    else:
+        results = synthesize_backward(cat, src_type=src_type, goal_type=goal_type, max_cost=max_cost,
+                                      stats=stats, backend=args.backend)
 
     # 結果をJSON形式で出力
     out = {
@@ -70,5 +169,8 @@ def main():
     else:
         print(f"\n✗ No path found from {src_type} to {goal_type}", file=sys.stderr)
 
+    if stats is not None:
+        print(f"\nSearch stats: {json.dumps(stats.to_dict())}", file=sys.stderr)
+
 if __name__ == "__main__":
     main()
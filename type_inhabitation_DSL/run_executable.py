@@ -12,10 +12,14 @@ import sys
 import uuid
 from pathlib import Path
 
-from synth_lib import Catalog, synthesize_backward, path_to_json
+from synth_lib import (Catalog, SearchConstraints, SearchStats, synthesize_backward,
+                       synthesize_pareto, path_to_json)
 from executor import PathExecutor, ExecutionContext, create_mock_context
 from unit_converter import UnitConverter, UnitAwareCatalog
 from provenance import ProvenanceGenerator
+from path_index import PathIndex
+from contraction import ContractionHierarchy
+from query_cache import QueryCache
 
 
 def main():
@@ -29,6 +33,16 @@ def main():
 
     parser.add_argument('--max-cost', type=float, default=50,
                        help='Maximum cost for path search')
+    parser.add_argument('--min-confidence', type=float,
+                       help='Minimum path confidence, enforced during search')
+    parser.add_argument('--forbid', action='append', default=[], metavar='FUNC_ID',
+                       help='Never use this function (can be used multiple times)')
+    parser.add_argument('--allow-kind', action='append', metavar='KIND',
+                       help='Only use functions with this impl kind, e.g. formula (can be used multiple times)')
+    parser.add_argument('--via', action='append', default=[], metavar='TYPE',
+                       help='Pass through this type, in the given order (can be used multiple times)')
+    parser.add_argument('--max-hops', type=int,
+                       help='Maximum number of functions in the path')
     parser.add_argument('--execute', action='store_true',
                        help='Execute the path (not just search)')
     parser.add_argument('--mock', action='store_true',
@@ -45,10 +59,27 @@ def main():
                        help='Provenance output file (default: stdout)')
     parser.add_argument('--unit-conversion', action='store_true',
                        help='Enable automatic unit conversion')
+    parser.add_argument('--stats', action='store_true',
+                       help='Print search statistics to stderr (bypasses precomputed path indexes)')
+    parser.add_argument('--cache', nargs='?', const='', metavar='PATH',
+                       help='Reuse search results across runs via an SQLite cache '
+                            '(default: <catalog>.cache.sqlite)')
+    parser.add_argument('--no-catalog-cache', action='store_true',
+                       help='Always parse the catalog instead of using <catalog>.compiled.bin')
     parser.add_argument('--verbose', '-v', action='store_true',
                        help='Verbose output')
 
     args = parser.parse_args()
+    if args.stats and args.cache is not None:
+        # キャッシュ経由の探索は計測しない（ヒット時は探索自体を行わない）
+        parser.error('--stats cannot be combined with --cache (use --verbose for cache counters)')
+
+    constraints = None
+    if args.forbid or args.allow_kind or args.via or args.max_hops is not None:
+        if args.min_confidence is not None:
+            parser.error('--min-confidence cannot be combined with path constraints')
+        constraints = SearchConstraints(forbidden=args.forbid, allowed_kinds=args.allow_kind,
+                                        waypoints=args.via, max_hops=args.max_hops)
 
     # パラメータをパース
     parameters = {}
@@ -74,11 +105,8 @@ def main():
     if args.verbose:
         print(f"Loading catalog from {args.catalog}...", file=sys.stderr)
 
-    # カタログを読み込み
-    if args.catalog.endswith('.dsl'):
-        cat = Catalog.from_dsl(args.catalog)
-    else:
-        cat = Catalog.from_yaml(args.catalog)
+    # カタログを読み込み（コンパイル済みキャッシュがあればパースしない）
+    cat = Catalog.load(args.catalog, use_cache=not args.no_catalog_cache)
 
     if args.verbose:
         print(f"Catalog loaded: {len(cat.types)} types, {len(cat.funcs)} functions",
@@ -86,10 +114,39 @@ def main():
         print(f"Searching for path: {args.src_type} -> {args.goal_type}",
               file=sys.stderr)
 
-    # パスを探索
-    results = synthesize_backward(cat, src_type=args.src_type,
-                                 goal_type=args.goal_type,
-                                 max_cost=args.max_cost)
+    # パスを探索（全点対インデックスがあれば表引きで答える）
+    stats = SearchStats() if args.stats else None
+    index = None
+    # 前計算のインデックスは探索しないので、--stats では使わずに探索して計測する
+    if args.min_confidence is None and constraints is None and not args.stats:
+        index = PathIndex.load(args.catalog, cat) or ContractionHierarchy.load(args.catalog, cat)
+    if args.min_confidence is not None:
+        # 信頼度の下限を満たすパレートフロントのうち最安のパスを使う
+        front = synthesize_pareto(cat, args.src_type, args.goal_type,
+                                  max_cost=args.max_cost,
+                                  min_confidence=args.min_confidence,
+                                  stats=stats)
+        results = [(cost, path) for cost, _, path in front]
+    elif index is not None:
+        if args.verbose:
+            print(f"Using precomputed {type(index).__name__}", file=sys.stderr)
+        results = index.query(args.src_type, args.goal_type, max_cost=args.max_cost)
+    elif args.cache is not None:
+        cache = QueryCache(path=args.cache or args.catalog + '.cache.sqlite')
+        results = cache.synthesize(cat, args.src_type, args.goal_type,
+                                   max_cost=args.max_cost, constraints=constraints)
+        if args.verbose:
+            print(f"Cache: {json.dumps(cache.stats())}", file=sys.stderr)
+        cache.close()
+    else:
+        results = synthesize_backward(cat, src_type=args.src_type,
+                                     goal_type=args.goal_type,
+                                     max_cost=args.max_cost,
+                                     stats=stats,
+                                     constraints=constraints)
+
+    if stats is not None:
+        print(f"Search stats: {json.dumps(stats.to_dict())}", file=sys.stderr)
 
     if not results:
         print(f"✗ No path found from {args.src_type} to {args.goal_type}",
@@ -0,0 +1,154 @@
+# scipy_backend.py
+"""
+SciPy の疎行列による最短路バックエンド
+
+カタログを scipy.sparse の CSR 行列（行: dom、列: cod、値: コスト）に変換し、
+scipy.sparse.csgraph.dijkstra（コンパイル済みコード）で最短路を求める。
+グラフ全体にわたる集計や多数の src からの一括問い合わせでは、
+Python の heapq ループより大幅に速い。
+
+- 同じ型の組を結ぶ関数が複数あれば最小コストのもの（同点ならカタログ上で先の関数）を使う
+- コスト0の関数は明示的なゼロ要素として保持する（csgraph は疎行列の明示的なゼロを辺として扱う）
+- 証明は predecessors から型の列を復元し、各区間の関数を引いて Func のリストに戻す
+- コストは探索結果ではなく Func のコストを synthesize_backward と同じ順に足し直す
+
+synthesize_backward(..., backend='scipy') からも使える。
+"""
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from synth_lib import Catalog, CompiledCatalog, _require_no_subtyping
+
+# オプショナルな依存関係
+try:
+    import numpy as np
+    from scipy.sparse import csr_matrix
+    from scipy.sparse.csgraph import dijkstra
+    HAS_SCIPY = True
+except ImportError:
+    HAS_SCIPY = False
+
+INF = float('inf')
+
+class SparseGraph:
+    """コンパイル済みカタログの疎行列表現
+
+    matrix[u, v] は型 u から型 v への最小コスト、edge_of[(u, v)] はその関数の辺ID。
+    """
+
+    def __init__(self, cc: CompiledCatalog):
+        if not HAS_SCIPY:
+            raise ImportError("scipy is required for the sparse backend")
+        _require_no_subtyping(cc, 'the scipy backend')
+        self.cc = cc
+        n = cc.num_types
+        edges = np.fromiter(cc.live_edges(), dtype=np.int64)
+        dom = np.frombuffer(cc.dom, dtype=np.dtype('l'))[edges]
+        cod = np.frombuffer(cc.cod, dtype=np.dtype('l'))[edges]
+        cost = np.frombuffer(cc.cost, dtype=np.float64)[edges]
+        keep = dom != cod  # 自己ループは最短路に現れない
+        edges, dom, cod, cost = edges[keep], dom[keep], cod[keep], cost[keep]
+        # (dom, cod) ごとに最小コスト、同点なら辺IDの小さいものを先頭に並べて1本だけ残す
+        order = np.lexsort((edges, cost, cod, dom))
+        edges, dom, cod, cost = edges[order], dom[order], cod[order], cost[order]
+        first = np.ones(len(edges), dtype=bool)
+        first[1:] = (dom[1:] != dom[:-1]) | (cod[1:] != cod[:-1])
+        edges, dom, cod, cost = edges[first], dom[first], cod[first], cost[first]
+        self.matrix = csr_matrix((cost, (dom, cod)), shape=(n, n))
+        self.edge_of: Dict[Tuple[int, int], int] = dict(
+            zip(zip(dom.tolist(), cod.tolist()), edges.tolist()))
+
+    def _path(self, predecessors, src: int, goal: int):
+        """predecessors から src -> goal の (cost, [Func]) を復元する"""
+        cc = self.cc
+        nodes = [goal]
+        v = goal
+        while v != src:
+            v = int(predecessors[v])
+            nodes.append(v)
+        nodes.reverse()
+        path_edges = [self.edge_of[(a, b)] for a, b in zip(nodes, nodes[1:])]
+        # コストは synthesize_backward と同じく goal 側から足し合わせる
+        cost = 0.0
+        for e in reversed(path_edges):
+            cost += cc.cost[e]
+        return cost, cc.to_funcs(path_edges)
+
+    def query(self, src_type: str, goal_type: str, max_cost=INF):
+        """synthesize_backward と同じ形式の [(cost, [Func])] を返す（最短路のみ）"""
+        return self.query_many([(src_type, goal_type)], max_cost)[(src_type, goal_type)]
+
+    def query_many(self, queries: Iterable[Tuple[str, str]], max_cost=INF,
+                   batch_size: int = 256) -> Dict[Tuple[str, str], list]:
+        """(src, goal) の組をまとめて解く
+
+        src ごとにまとめて csgraph.dijkstra を一度ずつ（batch_size 個の src を1回で）呼ぶ。
+        Returns:
+            {(src_type, goal_type): [(cost, [Func])]}
+        """
+        cc = self.cc
+        out: Dict[Tuple[str, str], list] = {}
+        by_src: Dict[int, List[Tuple[str, str]]] = {}
+        for src_type, goal_type in queries:
+            if src_type == goal_type:
+                out[(src_type, goal_type)] = [(0.0, [])]
+                continue
+            src = cc.type_index.get(src_type)
+            if src is None or goal_type not in cc.type_index:
+                out[(src_type, goal_type)] = []
+                continue
+            by_src.setdefault(src, []).append((src_type, goal_type))
+        sources = list(by_src)
+        for start in range(0, len(sources), batch_size):
+            batch = sources[start:start + batch_size]
+            dist, predecessors = dijkstra(self.matrix, directed=True, indices=batch,
+                                          return_predecessors=True, limit=max_cost)
+            for row, src in enumerate(batch):
+                for key in by_src[src]:
+                    goal = cc.type_index[key[1]]
+                    if dist[row, goal] == INF:
+                        out[key] = []
+                        continue
+                    cost, path = self._path(predecessors[row], src, goal)
+                    out[key] = [(cost, path)] if cost <= max_cost else []
+        return out
+
+    def nearest_source(self, src_types: Iterable[str], goal_type: str,
+                       max_cost=INF) -> Optional[Tuple[str, float, list]]:
+        """複数の src のうち goal に最も安く到達できるもの（多始点の最短路）
+
+        Returns:
+            (src_type, cost, [Func])（どこからも到達できなければ None）
+        """
+        cc = self.cc
+        goal = cc.type_index.get(goal_type)
+        srcs = sorted({cc.type_index[t] for t in src_types if t in cc.type_index})
+        if goal is None or not srcs:
+            return None
+        if goal in srcs:
+            return goal_type, 0.0, []
+        dist, predecessors, origin = dijkstra(self.matrix, directed=True, indices=srcs,
+                                              return_predecessors=True, min_only=True,
+                                              limit=max_cost)
+        if dist[goal] == INF:
+            return None
+        src = int(origin[goal])
+        cost, path = self._path(predecessors, src, goal)
+        return cc.type_names[src], cost, path
+
+    def distances(self, src_types: Iterable[str]):
+        """src ごとの全型への最短コストの配列（行: src_types の順、列: 型ID）"""
+        cc = self.cc
+        indices = [cc.type_index[t] for t in src_types]
+        return dijkstra(self.matrix, directed=True, indices=indices)
+
+def sparse_graph(catalog: Catalog) -> SparseGraph:
+    """カタログの疎行列表現を返す（コンパイル済みカタログにキャッシュ）"""
+    cc = catalog.compile()
+    if cc.sparse_graph is None:
+        cc.sparse_graph = SparseGraph(cc)
+    return cc.sparse_graph
+
+def synthesize_scipy(catalog: Catalog, src_type: str, goal_type: str, max_cost=100):
+    """SciPy バックエンドによる最短路（synthesize_backward と同じ形式、最短路のみ）"""
+    return sparse_graph(catalog).query(src_type, goal_type, max_cost)
@@ -1,9 +1,10 @@
 # synth_lib.py
-import yaml, json, heapq
+import yaml, json, heapq, hashlib, math, time
+from array import array
 from collections import defaultdict
-from dataclasses import dataclass
+from dataclasses import dataclass, field, asdict
 from pathlib import Path
-from typing import Union, List
+from typing import Union, List, Optional, Callable, Tuple
 
 @dataclass
 class Func:
@@ -29,38 +30,42 @@ class ProductType:
 
 class Catalog:
     def __init__(self, catalog_dict):
+        self._set_types(catalog_dict.get('types', []))
+        self.funcs = [_make_func(f) for f in catalog_dict.get('functions', [])]
+        self._index_funcs()
+
+    def _set_types(self, types):
         self.types = {}
         self.product_types = {}  # Product型の定義を保持
 
         # 型定義を処理
-        for t in catalog_dict.get('types', []):
-            type_name = t['name']
-            self.types[type_name] = t
-
-            # Product型かどうかをチェック
-            if 'product_of' in t:
-                # Product型の定義
-                components = t['product_of']
-                self.product_types[type_name] = ProductType(type_name, components)
-                self.types[type_name]['is_product'] = True
-        self.funcs = []
-        for f in catalog_dict.get('functions', []):
-            sig = f['sig'].strip()
-            if '->' not in sig:
-                raise ValueError('sig must be A -> B')
-            a,b = [s.strip() for s in sig.split('->',1)]
-            func = Func(id=f['id'], dom=a, cod=b,
-                        cost=float(f.get('cost',1)),
-                        conf=float(f.get('confidence',1.0)),
-                        impl=f.get('impl',{}),
-                        inverse_of=f.get('inverse_of'))
-            self.funcs.append(func)
+        for t in types:
+            self._register_type(t)
+
+    def _register_type(self, t: dict):
+        type_name = t['name']
+        self.types[type_name] = t
+
+        # Product型かどうかをチェック
+        if 'product_of' in t:
+            # Product型の定義
+            components = t['product_of']
+            self.product_types[type_name] = ProductType(type_name, components)
+            self.types[type_name]['is_product'] = True
+        else:
+            self.product_types.pop(type_name, None)
+
+    def _index_funcs(self):
         # index by cod for backward search, and by dom for forward exploration
         self.by_cod = defaultdict(list)
         self.by_dom = defaultdict(list)
+        self._by_id = {}  # 関数ID -> Func（同じIDが複数あれば先のもの）
         for func in self.funcs:
             self.by_cod[func.cod].append(func)
             self.by_dom[func.dom].append(func)
+            self._by_id.setdefault(func.id, func)
+        self._compiled = None
+        self._fingerprint = None
 
     @classmethod
     def from_yaml(cls, yaml_path):
@@ -69,19 +74,219 @@ class Catalog:
             catalog_dict = yaml.safe_load(f)
         return cls(catalog_dict)
 
+    @classmethod
+    def load(cls, path, use_cache: bool = True) -> 'Catalog':
+        """DSL（.dsl）または YAML のカタログを読み込む
+
+        use_cache=True ではファイルの隣のコンパイル済みキャッシュ（catalog_cache.py）を使い、
+        無いか古ければソースを読み込んでキャッシュを作り直す。
+        """
+        if use_cache:
+            try:
+                from catalog_cache import load_catalog
+            except ImportError:
+                import sys
+                sys.path.insert(0, str(Path(__file__).parent))
+                from catalog_cache import load_catalog
+            return load_catalog(path)
+        if str(path).endswith('.dsl'):
+            return cls.from_dsl(path)
+        return cls.from_yaml(path)
+
     @classmethod
     def from_dsl(cls, dsl_path):
-        """DSLファイルからカタログを読み込む"""
+        """DSLファイルからカタログを読み込む
+
+        import "other.dsl" があれば import 先も読み込んで併合する（dsl_imports.py）。
+        """
         try:
-            from dsl_parser import parse_dsl_file
+            from dsl_imports import load_dsl_catalog
         except ImportError:
             import sys
-            # dsl_parser.pyが同じディレクトリにあることを想定
+            # dsl_imports.pyが同じディレクトリにあることを想定
             sys.path.insert(0, str(Path(__file__).parent))
-            from dsl_parser import parse_dsl_file
+            from dsl_imports import load_dsl_catalog
 
-        catalog_dict = parse_dsl_file(dsl_path)
-        return cls(catalog_dict)
+        return load_dsl_catalog(dsl_path, workers=1, use_cache=False)
+
+    @classmethod
+    def from_decls(cls, decls) -> 'Catalog':
+        """宣言（dsl_parser の TypeDecl / FunctionDecl）の列からカタログを作る
+
+        宣言ごとに add_type / add_function で追加するので、
+        カタログ全体の辞書を作らずに読み込める。ImportDecl は読み飛ばす
+        （import を辿るのは dsl_imports.py）。
+        """
+        catalog = cls({})
+        for decl in decls:
+            if hasattr(decl, 'sig'):
+                catalog.add_function(decl.to_dict())
+            elif hasattr(decl, 'name'):
+                catalog.add_type(decl.to_dict())
+        return catalog
+
+    def compile(self) -> 'CompiledCatalog':
+        """探索用のCSR表現を返す（初回呼び出し時に構築してキャッシュ）"""
+        if self._compiled is None:
+            self._compiled = CompiledCatalog(self)
+        return self._compiled
+
+    def landmarks(self, num_landmarks: int = 4) -> 'LandmarkIndex':
+        """ALTヒューリスティック用のランドマーク距離を返す（カタログごとに一度だけ前計算）"""
+        cc = self.compile()
+        index = cc.landmark_indexes.get(num_landmarks)
+        if index is None:
+            index = cc.landmark_indexes[num_landmarks] = LandmarkIndex(cc, num_landmarks)
+        return index
+
+    def reachability(self) -> 'ReachabilityIndex':
+        """型グラフの到達可能性インデックスを返す（初回呼び出し時に構築してキャッシュ）"""
+        cc = self.compile()
+        if cc.reachability is None:
+            cc.reachability = ReachabilityIndex(cc)
+        return cc.reachability
+
+    def can_reach(self, src_type: str, goal_type: str) -> bool:
+        """src_type から goal_type へのパスが存在するか（O(1)）"""
+        if src_type == goal_type:
+            return True
+        cc = self.compile()
+        s = cc.type_index.get(src_type)
+        t = cc.type_index.get(goal_type)
+        if s is None or t is None:
+            return False
+        return self.reachability().can_reach(s, t)
+
+    def is_subtype(self, sub_type: str, super_type: str) -> bool:
+        """sub_type <: super_type か（type A <: B の推移閉包。同じ型なら True）"""
+        if sub_type == super_type:
+            return True
+        cc = self.compile()
+        s = cc.type_index.get(sub_type)
+        t = cc.type_index.get(super_type)
+        if cc.super_bits is None or s is None or t is None:
+            return False
+        return bool((cc.super_bits[s] >> t) & 1)
+
+    def shortest_path_tree(self, goal_type: str) -> Optional['ShortestPathTree']:
+        """goal_type を根とする最短路木を返す（goal ごとにキャッシュ）
+
+        カタログに存在しない型なら None。
+        """
+        cc = self.compile()
+        goal = cc.type_index.get(goal_type)
+        if goal is None:
+            return None
+        tree = cc.path_trees.get(goal)
+        if tree is None:
+            tree = cc.path_trees[goal] = ShortestPathTree(cc, goal)
+        return tree
+
+    def get_function(self, func_id: str) -> Func:
+        """ID から関数を返す（無ければ KeyError）"""
+        return self._by_id[func_id]
+
+    def add_type(self, t: dict) -> dict:
+        """型を追加する（YAML の types の要素と同じ形式。同じ名前の型は置き換える）
+
+        コンパイル済みの表現はその場で更新する。部分型宣言（subtype_of）が変われば
+        部分型の閉包を作り直し、キャッシュ済みの最短路木は計算し直す。
+        """
+        old = self.types.get(t['name'])
+        self._register_type(t)
+        self._fingerprint = None
+        if self._compiled is not None:
+            cc = self._compiled
+            cc.add_type(t['name'])
+            cc.hypergraph = None  # Product型の定義が変わり得る
+            if (old or {}).get('subtype_of') != t.get('subtype_of'):
+                cc.update_subtypes(self)
+        return t
+
+    def remove_type(self, name: str) -> dict:
+        """型宣言を削除する（無ければ KeyError）
+
+        関数のシグネチャに現れる型はコンパイル済みの表現に残る（辺を持たない型と同じ扱い）。
+        部分型宣言を持つ型なら add_type と同じく部分型の閉包を作り直す。
+        """
+        t = self.types.pop(name)
+        self.product_types.pop(name, None)
+        self._fingerprint = None
+        if self._compiled is not None:
+            self._compiled.hypergraph = None  # Product型の定義が変わり得る
+            if t.get('subtype_of'):
+                self._compiled.update_subtypes(self)
+        return t
+
+    def add_function(self, func: Union[Func, dict]) -> Func:
+        """関数を追加する（dict なら YAML の functions の要素と同じ形式）
+
+        by_cod/by_dom とコンパイル済みの表現はその場で更新し、
+        前計算した最短路木・到達可能性インデックスは差分だけ修復する。
+        """
+        if isinstance(func, dict):
+            func = _make_func(func)
+        self.funcs.append(func)
+        self.by_cod[func.cod].append(func)
+        self.by_dom[func.dom].append(func)
+        self._by_id.setdefault(func.id, func)
+        self._fingerprint = None
+        if self._compiled is not None:
+            self._compiled.add_edge(func)
+        return func
+
+    def remove_function(self, func_id: str) -> Func:
+        """関数を削除する（無ければ KeyError）。前計算の扱いは add_function と同じ"""
+        func = self._by_id.pop(func_id)
+        _remove_identical(self.funcs, func)
+        _remove_identical(self.by_cod[func.cod], func)
+        _remove_identical(self.by_dom[func.dom], func)
+        for other in self.funcs:
+            if other.id == func_id:
+                self._by_id[func_id] = other
+                break
+        self._fingerprint = None
+        if self._compiled is not None:
+            cc = self._compiled
+            cc.remove_edge(cc.edge_of(func))
+        return func
+
+    def update_cost(self, func_id: str, cost: Optional[float] = None,
+                    confidence: Optional[float] = None) -> Func:
+        """関数のコスト・信頼度を更新する（無ければ KeyError）
+
+        最短路木はコストが変わった辺に依存する部分だけを修復する。
+        """
+        func = self._by_id[func_id]
+        self._fingerprint = None
+        if confidence is not None:
+            func.conf = float(confidence)
+            if self._compiled is not None:
+                cc = self._compiled
+                cc.conf[cc.edge_of(func)] = func.conf
+        if cost is not None:
+            func.cost = float(cost)
+            if self._compiled is not None:
+                cc = self._compiled
+                cc.set_cost(cc.edge_of(func), func.cost)
+        return func
+
+    def invalidate(self):
+        """コンパイル済み表現と前計算キャッシュを破棄する（カタログを直接変更した後に呼ぶ）"""
+        self._compiled = None
+        self._fingerprint = None
+
+    def fingerprint(self) -> str:
+        """カタログ内容（型と関数）のハッシュ値。保存済みインデックスやキャッシュの照合に使う"""
+        if self._fingerprint is None:
+            content = {
+                'types': self.types,
+                'functions': [[f.id, f.dom, f.cod, f.cost, f.conf, f.impl, f.inverse_of]
+                              for f in self.funcs],
+            }
+            data = json.dumps(content, sort_keys=True, ensure_ascii=False, default=str)
+            self._fingerprint = hashlib.sha256(data.encode('utf-8')).hexdigest()
+        return self._fingerprint
 
     def funcs_returning(self, typ):
         return list(self.by_cod.get(typ, []))
@@ -99,41 +304,1490 @@ class Catalog:
             return self.product_types[type_name].components
         return []
 
-# backward A* (here implemented as Dijkstra-like with zero heuristic)
-def synthesize_backward(catalog: Catalog, src_type: str, goal_type: str, max_cost=100, max_steps=10000):
-    # PQ entries: (est_total_cost, cum_cost, counter, node_type, path_functions_list)
-    # path_functions_list is list of Func objects in forward order (from src to goal)
-    # counter is used as a tiebreaker to avoid comparing path lists
+def _make_func(f: dict) -> Func:
+    """YAML の functions の要素（dict）から Func を作る"""
+    sig = f['sig'].strip()
+    if '->' not in sig:
+        raise ValueError('sig must be A -> B')
+    a,b = [s.strip() for s in sig.split('->',1)]
+    return Func(id=f['id'], dom=a, cod=b,
+                cost=float(f.get('cost',1)),
+                conf=float(f.get('confidence',1.0)),
+                impl=f.get('impl',{}),
+                inverse_of=f.get('inverse_of'))
+
+def _remove_identical(items: list, obj):
+    """リストから obj と同一のオブジェクトを1つ取り除く（== ではなく is で比較）"""
+    for i, item in enumerate(items):
+        if item is obj:
+            del items[i]
+            return
+
+def _csr(keys: array, num_nodes: int):
+    """辺のキー列（dom または cod）から CSR の (offsets, edges) を作る
+
+    counting sort なので同じキー内ではカタログ上の関数の順序が保たれる。
+    """
+    offsets = array('l', [0]) * (num_nodes + 1)
+    for k in keys:
+        offsets[k + 1] += 1
+    for i in range(num_nodes):
+        offsets[i + 1] += offsets[i]
+    fill = array('l', offsets[:-1])
+    edges = array('l', [0]) * len(keys)
+    for e, k in enumerate(keys):
+        edges[fill[k]] = e
+        fill[k] += 1
+    return offsets, edges
+
+def _subtype_closure(declared, num_types: int):
+    """部分型宣言 [(sub, sup)] の推移閉包
+
+    Returns:
+        (super_bits, supertypes, subtypes): super_bits[t] は t の真の上位型のビット集合、
+        supertypes[t]/subtypes[t] は t の真の上位型・下位型の型IDのタプル（昇順）
+    """
+    direct = [[] for _ in range(num_types)]
+    for sub, sup in declared:
+        direct[sub].append(sup)
+    super_bits = [0] * num_types
+    for t in range(num_types):
+        if not direct[t]:
+            continue
+        bits = 0
+        stack = list(direct[t])
+        while stack:
+            u = stack.pop()
+            if not (bits >> u) & 1:
+                bits |= 1 << u
+                stack.extend(direct[u])
+        super_bits[t] = bits & ~(1 << t)  # 循環する宣言でも自身は含めない
+    supertypes = []
+    subtypes = [[] for _ in range(num_types)]
+    for t in range(num_types):
+        supers = []
+        bits = super_bits[t]
+        while bits:
+            low = bits & -bits
+            u = low.bit_length() - 1
+            supers.append(u)
+            subtypes[u].append(t)
+            bits ^= low
+        supertypes.append(tuple(supers))
+    return super_bits, supertypes, [tuple(subs) for subs in subtypes]
+
+class CompiledCatalog:
+    """Catalogを整数インデックスのCSRグラフにコンパイルした探索用の表現
+
+    型名はすべて整数IDにインターンし、関数（辺）は dom/cod/cost/conf の
+    連続した配列として保持する。辺IDは funcs のインデックスに対応する。
+    rev_offsets/rev_edges は cod ごと（後方探索用）、
+    fwd_offsets/fwd_edges は dom ごと（前方探索用）の隣接リスト。
+
+    カタログの変更（Catalog.add_function など）では辺IDを振り直さない。
+    追加した関数は末尾に新しい辺IDを持ち、削除した関数の辺は funcs[e] を None にして
+    隣接リストから外す（全辺を走査するときは live_edges() を使う）。
+
+    部分型宣言（type A <: B）があれば、その推移閉包を型ごとのビット集合 super_bits と
+    真の上位型・下位型のタプル supertypes/subtypes として前計算する。
+    部分型はコスト0の暗黙の辺（A -> B）として探索で辿り、辺としては持たない。
+    宣言が無ければ3つとも None。
+    """
+
+    def __init__(self, catalog: Catalog):
+        self.type_names: List[str] = []
+        self.type_index = {}
+        self.super_bits = self.supertypes = self.subtypes = None
+        for name in catalog.types:
+            self._intern(name)
+        self.funcs: List[Func] = list(catalog.funcs)
+        self.dom = array('l', (self._intern(f.dom) for f in self.funcs))
+        self.cod = array('l', (self._intern(f.cod) for f in self.funcs))
+        self.cost = array('d', (f.cost for f in self.funcs))
+        self.conf = array('d', (f.conf for f in self.funcs))
+        declared = self._declared_subtypes(catalog)
+        if declared:
+            self.super_bits, self.supertypes, self.subtypes = _subtype_closure(
+                declared, len(self.type_names))
+        n = len(self.type_names)
+        self.rev_offsets, self.rev_edges = _csr(self.cod, n)
+        self.fwd_offsets, self.fwd_edges = _csr(self.dom, n)
+        self._init_caches()
+
+    def _init_caches(self):
+        # 前計算インデックス（Catalog.landmarks など）のキャッシュ
+        self.landmark_indexes = {}
+        self.path_trees = {}  # goal -> ShortestPathTree
+        self.hypergraph = None  # hyper_synth.Hypergraph
+        self.reachability = None  # ReachabilityIndex
+        self.sparse_graph = None  # scipy_backend.SparseGraph
+        self.removed = 0  # 削除済みの辺の数
+        self._edge_ids = None  # id(Func) -> 辺ID（カタログの変更時に使う）
+
+    def __getstate__(self):
+        # id(Func) はプロセスをまたぐと無効になる（batch_synth のワーカーへ渡すとき）
+        state = self.__dict__.copy()
+        state['_edge_ids'] = None
+        return state
+
+    def _declared_subtypes(self, catalog: Catalog) -> List[Tuple[int, int]]:
+        """カタログの部分型宣言 [(部分型, 上位型)]（型はインターンする）"""
+        declared = []
+        for name, t in catalog.types.items():
+            supers = t.get('subtype_of')
+            if isinstance(supers, str):
+                supers = [supers]
+            for sup in supers or ():
+                declared.append((self._intern(name), self._intern(sup)))
+        return declared
+
+    def _intern(self, name: str) -> int:
+        idx = self.type_index.get(name)
+        if idx is None:
+            idx = len(self.type_names)
+            self.type_index[name] = idx
+            self.type_names.append(name)
+            if self.super_bits is not None:
+                self.super_bits.append(0)
+                self.supertypes.append(())
+                self.subtypes.append(())
+        return idx
+
+    @property
+    def num_types(self) -> int:
+        return len(self.type_names)
+
+    def to_funcs(self, edges) -> List[Func]:
+        """辺IDの列を Func のリストに戻す"""
+        funcs = self.funcs
+        return [funcs[e] for e in edges]
+
+    def live_edges(self):
+        """削除されていない辺IDを順に返す"""
+        if not self.removed:
+            return range(len(self.funcs))
+        funcs = self.funcs
+        return (e for e in range(len(funcs)) if funcs[e] is not None)
+
+    def edge_of(self, func: Func) -> int:
+        """Func（同一オブジェクト）の辺ID"""
+        if self._edge_ids is None:
+            self._edge_ids = {id(f): e for e, f in enumerate(self.funcs) if f is not None}
+        return self._edge_ids[id(func)]
+
+    def _grow_adjacency(self):
+        """新しく現れた型の分だけ offsets を伸ばす（辺を持たない型として）"""
+        for offsets in (self.rev_offsets, self.fwd_offsets):
+            while len(offsets) <= self.num_types:
+                offsets.append(offsets[-1])
+
+    def _link(self, e: int):
+        """辺 e を隣接リストに加える（辺IDは最大なので各キーの末尾に入る）"""
+        for offsets, edges, k in ((self.rev_offsets, self.rev_edges, self.cod[e]),
+                                  (self.fwd_offsets, self.fwd_edges, self.dom[e])):
+            edges.insert(offsets[k + 1], e)
+            for i in range(k + 1, len(offsets)):
+                offsets[i] += 1
+
+    def _unlink(self, e: int):
+        """辺 e を隣接リストから外す"""
+        for offsets, edges, k in ((self.rev_offsets, self.rev_edges, self.cod[e]),
+                                  (self.fwd_offsets, self.fwd_edges, self.dom[e])):
+            i = offsets[k]
+            while edges[i] != e:
+                i += 1
+            del edges[i]
+            for i in range(k + 1, len(offsets)):
+                offsets[i] -= 1
+
+    def add_type(self, name: str) -> int:
+        """辺を持たない型を追加し、前計算の配列を型の数に合わせる"""
+        if name in self.type_index:
+            return self.type_index[name]
+        t = self._intern(name)
+        self._grow_adjacency()
+        self.landmark_indexes.clear()
+        self.hypergraph = None
+        self.sparse_graph = None
+        if self.reachability is not None:
+            self.reachability.add_types(self.num_types)
+        for tree in self.path_trees.values():
+            tree._grow()
+        return t
+
+    def update_subtypes(self, catalog: Catalog):
+        """カタログの部分型宣言が変わった後に閉包を作り直し、前計算を更新する
+
+        部分型の暗黙の辺はまとめて増減し得るので、最短路木は同じオブジェクトのまま
+        逆向きDijkstraをやり直す（保持している木も以降の変更で修復され続ける）。
+        """
+        declared = self._declared_subtypes(catalog)
+        self._grow_adjacency()
+        if declared:
+            self.super_bits, self.supertypes, self.subtypes = _subtype_closure(
+                declared, self.num_types)
+        else:
+            self.super_bits = self.supertypes = self.subtypes = None
+        self.landmark_indexes.clear()
+        self.hypergraph = None
+        self.reachability = None  # 部分型の辺を含むので次に使うときに作り直す
+        self.sparse_graph = None
+        for tree in self.path_trees.values():
+            tree.rebuild()
+
+    def add_edge(self, func: Func) -> int:
+        """関数を末尾の辺IDとして追加し、前計算を更新する"""
+        e = len(self.funcs)
+        self.funcs.append(func)
+        u, v = self._intern(func.dom), self._intern(func.cod)
+        self.dom.append(u)
+        self.cod.append(v)
+        self.cost.append(func.cost)
+        self.conf.append(func.conf)
+        if self._edge_ids is not None:
+            self._edge_ids[id(func)] = e
+        self._grow_adjacency()
+        self._link(e)
+        # 距離が縮む可能性があるのでランドマークの下界は使えない
+        self.landmark_indexes.clear()
+        self.hypergraph = None
+        self.sparse_graph = None
+        if self.reachability is not None:
+            self.reachability.add_types(self.num_types)
+            if not self.reachability.add_edge(u, v):
+                self.reachability = None  # SCC が併合される：次に使うときに作り直す
+        for tree in self.path_trees.values():
+            tree.edge_decreased(e)
+        return e
+
+    def remove_edge(self, e: int):
+        """辺 e を削除し、前計算を更新する"""
+        func = self.funcs[e]
+        self.funcs[e] = None
+        self.removed += 1
+        if self._edge_ids is not None:
+            del self._edge_ids[id(func)]
+        self._unlink(e)
+        # 距離は縮まないのでランドマークの下界はそのまま使える
+        self.hypergraph = None
+        self.sparse_graph = None
+        if self.reachability is not None:
+            u, v = self.dom[e], self.cod[e]
+            offsets, edges, cod = self.fwd_offsets, self.fwd_edges, self.cod
+            if not any(cod[edges[i]] == v for i in range(offsets[u], offsets[u + 1])):
+                self.reachability = None  # 到達可能性が変わり得る：次に使うときに作り直す
+        for tree in self.path_trees.values():
+            tree.edge_increased(e)
+
+    def set_cost(self, e: int, cost: float):
+        """辺 e のコストを変更し、最短路木を修復する"""
+        old = self.cost[e]
+        self.cost[e] = cost
+        self.sparse_graph = None
+        if cost < old:
+            self.landmark_indexes.clear()
+            for tree in self.path_trees.values():
+                tree.edge_decreased(e)
+        elif cost > old:
+            for tree in self.path_trees.values():
+                tree.edge_increased(e)
+
+INF = float('inf')
+
+@dataclass
+class SearchStats:
+    """探索の計測値
+
+    synthesize_* 関数の stats 引数に渡すと探索中に値が加算される。
+    on_expand に登録したコールバックは型を展開するたびに
+    (型名, 累積コスト) で呼ばれる。
+    """
+    nodes_popped: int = 0
+    edges_relaxed: int = 0
+    heap_pushes: int = 0
+    heap_max: int = 0
+    pruned_by_cost: int = 0
+    pruned_by_visited: int = 0
+    pruned_unreachable: int = 0
+    pruned_by_constraint: int = 0
+    pruned_by_beam: int = 0
+    hit_max_steps: bool = False
+    wall_time: float = 0.0
+    on_expand: List[Callable[[str, float], None]] = field(default_factory=list, repr=False)
+
+    def to_dict(self):
+        """コールバックを除いた計測値の辞書（JSON出力用）"""
+        d = asdict(self)
+        del d['on_expand']
+        return d
+
+def _record_stats(stats: Optional[SearchStats], started: float, popped: int, relaxed: int,
+                  pushes: int, heap_max: int, pruned_cost: int, pruned_visited: int,
+                  hit_max_steps: bool, pruned_unreachable: int = 0,
+                  pruned_constraint: int = 0, pruned_beam: int = 0):
+    """探索ループのローカルカウンタを SearchStats に加算する"""
+    if stats is None:
+        return
+    stats.nodes_popped += popped
+    stats.edges_relaxed += relaxed
+    stats.heap_pushes += pushes
+    stats.heap_max = max(stats.heap_max, heap_max)
+    stats.pruned_by_cost += pruned_cost
+    stats.pruned_by_visited += pruned_visited
+    stats.pruned_unreachable += pruned_unreachable
+    stats.pruned_by_constraint += pruned_constraint
+    stats.pruned_by_beam += pruned_beam
+    stats.hit_max_steps = stats.hit_max_steps or hit_max_steps
+    stats.wall_time += time.perf_counter() - started
+
+@dataclass
+class SearchConstraints:
+    """探索中に適用する制約
+
+    forbidden: 使わない関数IDの集合
+    allowed_kinds: 使ってよい impl.kind の集合（None なら制限なし。例: オフラインでは rest を除く）
+    waypoints: src から goal までに順に経由する型のリスト
+    max_hops: パスに含める関数の最大数（None なら制限なし）
+    """
+    forbidden: frozenset = frozenset()
+    allowed_kinds: Optional[frozenset] = None
+    waypoints: tuple = ()
+    max_hops: Optional[int] = None
+
+    def __post_init__(self):
+        self.forbidden = frozenset(self.forbidden)
+        if self.allowed_kinds is not None:
+            self.allowed_kinds = frozenset(self.allowed_kinds)
+        self.waypoints = tuple(self.waypoints)
+
+    def allows(self, func: Func) -> bool:
+        """関数を使ってよいか"""
+        if func.id in self.forbidden:
+            return False
+        return self.allowed_kinds is None or func.impl.get('kind') in self.allowed_kinds
+
+    def key(self) -> tuple:
+        """ハッシュ可能な正規形（キャッシュのキー用）"""
+        kinds = tuple(sorted(self.allowed_kinds)) if self.allowed_kinds is not None else None
+        return (tuple(sorted(self.forbidden)), kinds, self.waypoints, self.max_hops)
+
+def _dijkstra_all(cc: CompiledCatalog, root: int, reverse: bool = False):
+    """root からの全点最短距離（reverse=True なら root への距離）
+
+    部分型の暗黙の辺（sub -> super、コスト0）も辿る。
+
+    Returns:
+        (dist, via): dist[v] は距離、via[v] は v を最短で確定させた辺ID（-1 は無し）。
+        部分型の辺で確定した場合は -2 - w（w はその辺の反対側の型）
+    """
+    if reverse:
+        offsets, edges, nxt = cc.rev_offsets, cc.rev_edges, cc.dom
+        implicit = cc.subtypes
+    else:
+        offsets, edges, nxt = cc.fwd_offsets, cc.fwd_edges, cc.cod
+        implicit = cc.supertypes
+    cost = cc.cost
+    dist = [INF] * cc.num_types
+    via = [-1] * cc.num_types
+    dist[root] = 0.0
+    pq = [(0.0, root)]
+    while pq:
+        d, v = heapq.heappop(pq)
+        if d > dist[v]:
+            continue
+        for i in range(offsets[v], offsets[v + 1]):
+            e = edges[i]
+            w = nxt[e]
+            nd = d + cost[e]
+            if nd < dist[w]:
+                dist[w] = nd
+                via[w] = e
+                heapq.heappush(pq, (nd, w))
+        if implicit is not None:
+            for w in implicit[v]:
+                if d < dist[w]:
+                    dist[w] = d
+                    via[w] = -2 - v
+                    heapq.heappush(pq, (d, w))
+    return dist, via
+
+def _select_landmarks(cc: CompiledCatalog, num_landmarks: int) -> List[int]:
+    """farthest-point 法でランドマーク型を選ぶ（無向ホップ数で測る）"""
+    n = cc.num_types
+    if n == 0:
+        return []
+    degree = [cc.rev_offsets[v + 1] - cc.rev_offsets[v] +
+              cc.fwd_offsets[v + 1] - cc.fwd_offsets[v] for v in range(n)]
+    landmarks = [max(range(n), key=lambda v: degree[v])]
+    nearest = [INF] * n  # 選択済みランドマークへの最小ホップ数
+    while len(landmarks) < min(num_landmarks, n):
+        # 直前に選んだランドマークから無向BFS
+        hops = {landmarks[-1]: 0}
+        frontier = [landmarks[-1]]
+        while frontier:
+            nxt_frontier = []
+            for v in frontier:
+                for offsets, edges, other in ((cc.fwd_offsets, cc.fwd_edges, cc.cod),
+                                              (cc.rev_offsets, cc.rev_edges, cc.dom)):
+                    for i in range(offsets[v], offsets[v + 1]):
+                        w = other[edges[i]]
+                        if w not in hops:
+                            hops[w] = hops[v] + 1
+                            nxt_frontier.append(w)
+            frontier = nxt_frontier
+        for v in range(n):
+            nearest[v] = min(nearest[v], hops.get(v, INF))
+        # 到達できない成分を優先し、次に最も遠い型を選ぶ
+        candidate = max((v for v in range(n) if v not in landmarks),
+                        key=lambda v: (nearest[v], degree[v]), default=None)
+        if candidate is None:
+            break
+        landmarks.append(candidate)
+    return landmarks
+
+class LandmarkIndex:
+    """ALT (A*, Landmarks, Triangle inequality) ヒューリスティック用の前計算距離
+
+    各ランドマーク L について d(L, x) と d(x, L) を保持し、三角不等式
+      d(s, t) >= d(L, t) - d(L, s)
+      d(s, t) >= d(s, L) - d(t, L)
+    から d(s, t) の下界を求める。下界は許容的かつ一貫的なので、
+    A* の結果はゼロヒューリスティックの探索と一致する。
+    """
+
+    def __init__(self, cc: CompiledCatalog, num_landmarks: int = 4):
+        self.landmarks = _select_landmarks(cc, num_landmarks)
+        self.dist_from = [_dijkstra_all(cc, L)[0] for L in self.landmarks]
+        self.dist_to = [_dijkstra_all(cc, L, reverse=True)[0] for L in self.landmarks]
+
+    def lower_bound(self, s: int, t: int) -> float:
+        """d(s, t) の下界（INF なら s から t へは到達不能）"""
+        best = 0.0
+        for d_from, d_to in zip(self.dist_from, self.dist_to):
+            # d(L, t) - d(L, s)
+            ls, lt = d_from[s], d_from[t]
+            if ls < INF:
+                if lt == INF:
+                    return INF
+                if lt - ls > best:
+                    best = lt - ls
+            # d(s, L) - d(t, L)
+            sl, tl = d_to[s], d_to[t]
+            if tl < INF:
+                if sl == INF:
+                    return INF
+                if sl - tl > best:
+                    best = sl - tl
+        return best
+
+class ReachabilityIndex:
+    """型グラフの到達可能性を強連結成分 (SCC) ごとのビット集合で保持する
+
+    component[v] は型 v の SCC 番号。forward[c] は SCC c から到達できる SCC の集合、
+    backward[c] は SCC c に到達できる SCC の集合（どちらも自身を含み、
+    Python の int をビット集合として使う）。到達判定は O(1) のビット検査になる。
+    部分型の暗黙の辺（sub -> super）も辺として扱う。
+    ビット集合は SCC 数の2乗に比例する（2万型のDAGで向きごとに約25MB）。
+    辺の追加は閉包をその場で更新するが、削除で到達可能性が変わり得る場合や
+    部分型宣言の変更では破棄し、次に使うときに全体を作り直す。
+    """
+
+    def __init__(self, cc: CompiledCatalog):
+        n = cc.num_types
+        offsets, edges, cod = cc.fwd_offsets, cc.fwd_edges, cc.cod
+        supertypes = cc.supertypes
+        # Tarjan 法（反復版）。SCC は逆トポロジカル順（到達先が先）に確定する
+        component = [-1] * n
+        index = [-1] * n
+        low = [0] * n
+        on_stack = [False] * n
+        stack = []
+        counter = 0
+        num_components = 0
+        for root in range(n):
+            if index[root] >= 0:
+                continue
+            work = [(root, offsets[root])]
+            index[root] = low[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack[root] = True
+            while work:
+                v, i = work[-1]
+                end = offsets[v + 1]
+                if supertypes is not None:
+                    end += len(supertypes[v])
+                if i < end:
+                    work[-1] = (v, i + 1)
+                    if i < offsets[v + 1]:
+                        w = cod[edges[i]]
+                    else:
+                        w = supertypes[v][i - offsets[v + 1]]
+                    if index[w] < 0:
+                        index[w] = low[w] = counter
+                        counter += 1
+                        stack.append(w)
+                        on_stack[w] = True
+                        work.append((w, offsets[w]))
+                    elif on_stack[w] and index[w] < low[v]:
+                        low[v] = index[w]
+                    continue
+                work.pop()
+                if work and low[v] < low[work[-1][0]]:
+                    low[work[-1][0]] = low[v]
+                if low[v] == index[v]:
+                    while True:
+                        w = stack.pop()
+                        on_stack[w] = False
+                        component[w] = num_components
+                        if w == v:
+                            break
+                    num_components += 1
+        self.component = component
+        self.num_components = num_components
+
+        # 凝縮DAG上でビット集合の閉包を計算
+        succ = [set() for _ in range(num_components)]
+        for e in cc.live_edges():
+            a, b = component[cc.dom[e]], component[cc.cod[e]]
+            if a != b:
+                succ[a].add(b)
+        if supertypes is not None:
+            for v in range(n):
+                for w in supertypes[v]:
+                    if component[v] != component[w]:
+                        succ[component[v]].add(component[w])
+        forward = [0] * num_components
+        for c in range(num_components):  # 到達先の SCC は番号が小さい
+            bits = 1 << c
+            for d in succ[c]:
+                bits |= forward[d]
+            forward[c] = bits
+        pred = [[] for _ in range(num_components)]
+        for c in range(num_components):
+            for d in succ[c]:
+                pred[d].append(c)
+        backward = [0] * num_components
+        for c in range(num_components - 1, -1, -1):
+            bits = 1 << c
+            for p in pred[c]:
+                bits |= backward[p]
+            backward[c] = bits
+        self.forward = forward
+        self.backward = backward
+
+    def can_reach(self, s: int, t: int) -> bool:
+        """型 s から型 t へのパスが存在するか"""
+        return bool((self.forward[self.component[s]] >> self.component[t]) & 1)
+
+    def add_types(self, num_types: int):
+        """新しく現れた型をそれぞれ単独の SCC として加える"""
+        while len(self.component) < num_types:
+            c = self.num_components
+            self.component.append(c)
+            self.forward.append(1 << c)
+            self.backward.append(1 << c)
+            self.num_components += 1
+
+    def add_edge(self, u: int, v: int) -> bool:
+        """辺 u -> v の追加を閉包に反映する
+
+        SCC が併合される（v から u に到達できる）場合は更新できないので False を返す。
+        """
+        cu, cv = self.component[u], self.component[v]
+        if (self.forward[cu] >> cv) & 1:
+            return True
+        if (self.forward[cv] >> cu) & 1:
+            return False
+        # cu に到達できる SCC はすべて、cv から到達できる SCC に到達できるようになる
+        reach_v, reach_u = self.forward[cv], self.backward[cu]
+        bits = reach_u
+        while bits:
+            low = bits & -bits
+            self.forward[low.bit_length() - 1] |= reach_v
+            bits ^= low
+        bits = reach_v
+        while bits:
+            low = bits & -bits
+            self.backward[low.bit_length() - 1] |= reach_u
+            bits ^= low
+        return True
+
+class ShortestPathTree:
+    """goal を根とする最短路木（全型から goal への最短路）
+
+    逆向きDijkstraを一度だけ実行して保持し、以降の src からの問い合わせは
+    木を辿るだけ（パス長に比例する時間）で答える。
+    """
+
+    def __init__(self, cc: CompiledCatalog, goal: int):
+        self.cc = cc
+        self.goal = goal
+        # dist[v]: v から goal への最短コスト、via[v]: v から出る木の辺
+        # （-2 - w なら関数を使わずに上位型 w へ進む）
+        self.dist, self.via = _dijkstra_all(cc, goal, reverse=True)
+
+    def cost(self, src_type: str) -> float:
+        """src_type から goal への最短コスト（到達不能なら INF）"""
+        v = self.cc.type_index.get(src_type)
+        return INF if v is None else self.dist[v]
+
+    def query(self, src_type: str, max_cost=INF):
+        """synthesize_backward と同じ形式の [(cost, [Func])] を返す（最短路のみ）"""
+        cc = self.cc
+        v = cc.type_index.get(src_type)
+        if v is None or self.dist[v] == INF or self.dist[v] > max_cost:
+            return []
+        edges = []
+        while v != self.goal:
+            e = self.via[v]
+            if e < 0:
+                v = -2 - e
+                continue
+            edges.append(e)
+            v = cc.cod[e]
+        return [(self.dist[cc.type_index[src_type]], cc.to_funcs(edges))]
+
+    def rebuild(self):
+        """木全体を計算し直す（部分型宣言が変わったとき）"""
+        self.dist, self.via = _dijkstra_all(self.cc, self.goal, reverse=True)
+
+    def _grow(self):
+        """カタログに新しく現れた型の分だけ配列を伸ばす"""
+        missing = self.cc.num_types - len(self.dist)
+        if missing > 0:
+            self.dist.extend([INF] * missing)
+            self.via.extend([-1] * missing)
+
+    def edge_decreased(self, e: int):
+        """辺 e が追加された・安くなった後の修復
+
+        距離が縮む型だけを e の始点から逆向きDijkstraで更新する。
+        """
+        self._grow()
+        cc = self.cc
+        dist, via = self.dist, self.via
+        u = cc.dom[e]
+        nd = dist[cc.cod[e]] + cc.cost[e]
+        if not nd < dist[u]:
+            return
+        dist[u] = nd
+        via[u] = e
+        rev_offsets, rev_edges, dom, cost = cc.rev_offsets, cc.rev_edges, cc.dom, cc.cost
+        subtypes = cc.subtypes
+        pq = [(nd, u)]
+        while pq:
+            d, x = heapq.heappop(pq)
+            if d > dist[x]:
+                continue
+            for i in range(rev_offsets[x], rev_offsets[x + 1]):
+                f = rev_edges[i]
+                y = dom[f]
+                nd = d + cost[f]
+                if nd < dist[y]:
+                    dist[y] = nd
+                    via[y] = f
+                    heapq.heappush(pq, (nd, y))
+            if subtypes is not None:
+                for y in subtypes[x]:
+                    if d < dist[y]:
+                        dist[y] = d
+                        via[y] = -2 - x
+                        heapq.heappush(pq, (d, y))
+
+    def edge_increased(self, e: int):
+        """辺 e が削除された・高くなった後の修復
+
+        e が木の辺でなければ何も変わらない。木の辺なら e の始点を根とする
+        部分木の型だけ距離を捨て、部分木の外の型から求め直す。
+        """
+        self._grow()
+        cc = self.cc
+        dist, via = self.dist, self.via
+        u = cc.dom[e]
+        if via[u] != e:
+            return
+        rev_offsets, rev_edges, dom, cost = cc.rev_offsets, cc.rev_edges, cc.dom, cc.cost
+        fwd_offsets, fwd_edges, cod = cc.fwd_offsets, cc.fwd_edges, cc.cod
+        supertypes, subtypes = cc.supertypes, cc.subtypes
+        # 木の上で u を経由して goal に向かう型（u の部分木）
+        affected = {u}
+        stack = [u]
+        while stack:
+            x = stack.pop()
+            for i in range(rev_offsets[x], rev_offsets[x + 1]):
+                f = rev_edges[i]
+                y = dom[f]
+                if via[y] == f and y not in affected:
+                    affected.add(y)
+                    stack.append(y)
+            if subtypes is not None:
+                for y in subtypes[x]:
+                    if via[y] == -2 - x and y not in affected:
+                        affected.add(y)
+                        stack.append(y)
+        for y in affected:
+            dist[y] = INF
+            via[y] = -1
+        # 部分木の外（距離が変わらない型）への辺から候補を作る
+        pq = []
+        for y in affected:
+            for i in range(fwd_offsets[y], fwd_offsets[y + 1]):
+                f = fwd_edges[i]
+                z = cod[f]
+                if z in affected:
+                    continue
+                nd = dist[z] + cost[f]
+                if nd < dist[y]:
+                    dist[y] = nd
+                    via[y] = f
+            if supertypes is not None:
+                for z in supertypes[y]:
+                    if z not in affected and dist[z] < dist[y]:
+                        dist[y] = dist[z]
+                        via[y] = -2 - z
+            if dist[y] < INF:
+                pq.append((dist[y], y))
+        heapq.heapify(pq)
+        while pq:
+            d, x = heapq.heappop(pq)
+            if d > dist[x]:
+                continue
+            for i in range(rev_offsets[x], rev_offsets[x + 1]):
+                f = rev_edges[i]
+                y = dom[f]
+                if y not in affected:
+                    continue
+                nd = d + cost[f]
+                if nd < dist[y]:
+                    dist[y] = nd
+                    via[y] = f
+                    heapq.heappush(pq, (nd, y))
+            if subtypes is not None:
+                for y in subtypes[x]:
+                    if y in affected and d < dist[y]:
+                        dist[y] = d
+                        via[y] = -2 - x
+                        heapq.heappush(pq, (d, y))
+
+def _require_no_subtyping(cc: CompiledCatalog, name: str):
+    """部分型の暗黙の辺を扱えない探索・前計算で、部分型宣言のあるカタログを拒否する"""
+    if cc.subtypes is not None:
+        raise ValueError(f"{name} does not support subtype declarations (type A <: B); "
+                         "use synthesize_backward")
+
+def _known_unreachable(cc: CompiledCatalog, src: int, goal: int) -> bool:
+    """作成済みの到達可能性インデックスで src から goal に到達できないと分かるか
+
+    インデックスは型数の2乗のメモリを使うので、ここでは作らない（無ければ False）。
+    """
+    return cc.reachability is not None and not cc.reachability.can_reach(src, goal)
+
+def _path_edges(node) -> List[int]:
+    """cons セル (edge_id, rest) で表現されたパスを辺IDのリストに展開する"""
+    edges = []
+    while node is not None:
+        e, node = node
+        edges.append(e)
+    return edges
+
+def _src_heuristic(catalog: Catalog, heuristic, src: int):
+    """h(v): src から v までの残りコストの下界（後方探索なので src 側を見積もる）
+
+    heuristic='alt' ならカタログのランドマークを使う。無ければ None。
+    """
+    if heuristic == 'alt':
+        heuristic = catalog.landmarks()
+    if heuristic is None or src < 0:
+        return None
+    h_cache = {}
+    def h(v, _lb=heuristic.lower_bound):
+        hv = h_cache.get(v)
+        if hv is None:
+            hv = h_cache[v] = _lb(src, v)
+        return hv
+    return h
+
+def _backward_search(catalog: Catalog, src_type: str, goal_type: str, max_cost, max_steps,
+                     heuristic, max_results, stats: Optional[SearchStats], deadline=None,
+                     prune_unreachable=None, constraints: Optional[SearchConstraints] = None):
+    """synthesize_backward の探索本体
+
+    制約付きでは探索の状態を (型, 残りの経由点数) に広げ、
+    展開時に制約を満たさない辺を使わない。max_hops があれば状態ごとに
+    展開済みの (コスト, ホップ数) を覚え、コストとホップ数の両方で負けている状態は展開しない。
+    部分型宣言があれば、型 cur の展開で cur の下位型へもコスト0で進む
+    （パスに関数は加わらず、ホップ数も増えない）。
+
+    Returns:
+        (cc, results, pq, timed_out)
+        results は取り出した順の (cost, path_node)、pq は打ち切り時点の残りのヒープ
+        （要素は (est, cost, counter, node, path_node, 残りの経由点数, ホップ数)）
+    """
+    started = time.perf_counter()
+    # 探索はコンパイル済みカタログ上で整数IDのみを使って行い、
+    # 最後に辺IDを Func に戻す
+    cc = catalog.compile()
+    goal = cc.type_index.get(goal_type)
+    if goal is None:
+        # カタログに現れない型：自明なパス以外は存在しない（経由点は goal 自身だけ許す）
+        trivial = src_type == goal_type and (
+            constraints is None or all(t == goal_type for t in constraints.waypoints))
+        return cc, ([(0.0, None)] if trivial else []), [], False
+    src = cc.type_index.get(src_type, -1)
+    rev_offsets, rev_edges = cc.rev_offsets, cc.rev_edges
+    dom, cost = cc.dom, cc.cost
+    subtypes = cc.subtypes
+    on_expand = stats.on_expand if stats is not None else None
+    type_names = cc.type_names
+
+    # 経由点は後方探索なので末尾から順に消化する
+    waypoints = ()
+    max_hops = edge_ok = None
+    if constraints is not None:
+        waypoints = tuple(cc.type_index.get(t, -1) for t in constraints.waypoints)
+        if -1 in waypoints:
+            return cc, [], [], False
+        max_hops = constraints.max_hops
+        if constraints.forbidden or constraints.allowed_kinds is not None:
+            # 辺ごとの判定結果 (0: 未判定, 1: 可, 2: 不可)
+            edge_ok = bytearray(len(cc.funcs))
+            allows = constraints.allows
+            funcs = cc.funcs
+    constrained = constraints is not None
+    start_wp = len(waypoints)
+    while start_wp and waypoints[start_wp - 1] == goal:
+        start_wp -= 1
+
+    # 前計算は途中で打ち切れないので、段階ごとに期限を確かめて以降の前計算を省く
+    # （探索を始めていない状態のヒープを返し、解が無いとは言わない）
+    def expired():
+        return deadline is not None and time.monotonic() >= deadline
+    not_started = [(0.0, 0.0, 0, goal, None, start_wp, 0)]
+    if expired():
+        return cc, [], not_started, True
+
+    h = _src_heuristic(catalog, heuristic, src)
+    if h is not None and h(goal) > max_cost:
+        return cc, [], [], False
+    if expired():
+        return cc, [], not_started, True
+
+    # src から到達できない型は展開しない（そこから src には戻れない）
+    # goal 自体に到達できなければ探索せずに「解なし」と答える
+    # 既定（None）では作成済みのインデックスがあるときだけ使い、探索のために作りはしない
+    reach = None
+    if prune_unreachable:
+        reach = catalog.reachability()
+    elif prune_unreachable is None:
+        reach = cc.reachability
+    useful = None
+    if reach is not None:
+        if src < 0:
+            return cc, [], [], False
+        component = reach.component
+        useful = reach.forward[component[src]]
+        if not (useful >> component[goal]) & 1:
+            return cc, [], [], False
+        useful_cache = {}
+
+    # PQ entries: (est_total_cost, cum_cost, counter, node_id, path_node)
+    # path_node is a persistent cons list (edge_id, rest) in forward order
+    # (from src to goal); all entries share their suffixes
+    # counter is used as a tiebreaker to avoid comparing path nodes
     pq = []
     counter = 0
-    heapq.heappush(pq, (0.0, 0.0, counter, goal_type, []))
+    heapq.heappush(pq, (0.0, 0.0, counter, goal, None, start_wp, 0))
     counter += 1
-    visited_best = {}  # type -> best_cost_seen
+    # node -> best_cost_seen（制約付きでは (node, 経由点数) をキーにする）
+    # max_hops があれば (node, 経由点数) -> 展開済みの [(cost, hops)]
+    if max_hops is not None:
+        expanded_labels = defaultdict(list)
+    else:
+        visited_best = defaultdict(lambda: INF) if constrained else [INF] * cc.num_types
     results = []
     steps = 0
+    relaxed = pruned_cost = pruned_visited = pruned_unreachable = pruned_constraint = 0
+    heap_max = 1
+    timed_out = False
     while pq and steps < max_steps:
-        est_total, cum_cost, _, cur_type, path = heapq.heappop(pq)
+        # 時計の読み取りは64ステップごと
+        if deadline is not None and not (steps & 63) and time.monotonic() >= deadline:
+            timed_out = True
+            break
+        est_total, cum_cost, _, cur, path, wp, hops = heapq.heappop(pq)
         steps += 1
-        if cur_type == src_type:
-            results.append((cum_cost, list(path)))
+        if cur == src and not wp:
+            results.append((cum_cost, path))
+            if max_results is not None and len(results) >= max_results:
+                break
             # continue searching for possibly better alternatives
             continue
         # prune
-        best = visited_best.get(cur_type)
-        if best is not None and cum_cost >= best:
-            continue
-        visited_best[cur_type] = cum_cost
-        # expand: find functions f with f.cod == cur_type
-        for f in catalog.funcs_returning(cur_type):
-            new_cum = cum_cost + f.cost
+        if max_hops is not None:
+            # ホップ数が少なければコストが高くても先で使える（支配されたものだけ捨てる）
+            labels = expanded_labels[(cur, wp)]
+            if any(c <= cum_cost and n <= hops for c, n in labels):
+                pruned_visited += 1
+                continue
+            labels.append((cum_cost, hops))
+        else:
+            state = (cur, wp) if constrained else cur
+            if cum_cost >= visited_best[state]:
+                pruned_visited += 1
+                continue
+            visited_best[state] = cum_cost
+        if on_expand:
+            for callback in on_expand:
+                callback(type_names[cur], cum_cost)
+        # expand: edges e with cod[e] == cur
+        lo, hi = rev_offsets[cur], rev_offsets[cur + 1]
+        if max_hops is not None and hops >= max_hops:
+            hi = lo  # これ以上関数を足せない（部分型へは進める）
+        for i in range(lo, hi):
+            e = rev_edges[i]
+            relaxed += 1
+            if edge_ok is not None:
+                ok = edge_ok[e]
+                if not ok:
+                    ok = edge_ok[e] = 1 if allows(funcs[e]) else 2
+                if ok == 2:
+                    pruned_constraint += 1
+                    continue
+            new_cum = cum_cost + cost[e]
             if new_cum > max_cost:
+                pruned_cost += 1
                 continue
-            new_path = [f] + path  # prepend (because backward)
-            next_type = f.dom
-            heapq.heappush(pq, (new_cum, new_cum, counter, next_type, new_path))
+            nxt = dom[e]
+            if useful is not None:
+                ok = useful_cache.get(nxt)
+                if ok is None:
+                    ok = useful_cache[nxt] = (useful >> component[nxt]) & 1
+                if not ok:
+                    pruned_unreachable += 1
+                    continue
+            est = new_cum
+            if h is not None:
+                est += h(nxt)
+                if est > max_cost:
+                    # 下界込みで max_cost を超えるなら src には届かない
+                    pruned_cost += 1
+                    continue
+            new_wp = wp
+            while new_wp and waypoints[new_wp - 1] == nxt:
+                new_wp -= 1
+            # prepend (because backward): O(1), shares the tail with siblings
+            heapq.heappush(pq, (est, new_cum, counter, nxt, (e, path), new_wp, hops + 1))
             counter += 1
+        # 下位型の値は cur としてそのまま使える：関数を使わないコスト0の暗黙の辺
+        # subtypes は推移閉包なので、下位型として積んだ状態からはさらに下位型へ進まない
+        if subtypes is not None and (dom[path[0]] == cur if path is not None else cur == goal):
+            for nxt in subtypes[cur]:
+                relaxed += 1
+                if useful is not None and not (useful >> component[nxt]) & 1:
+                    pruned_unreachable += 1
+                    continue
+                est = cum_cost
+                if h is not None:
+                    est += h(nxt)
+                    if est > max_cost:
+                        pruned_cost += 1
+                        continue
+                new_wp = wp
+                while new_wp and waypoints[new_wp - 1] == nxt:
+                    new_wp -= 1
+                heapq.heappush(pq, (est, cum_cost, counter, nxt, path, new_wp, hops))
+                counter += 1
+        if len(pq) > heap_max:
+            heap_max = len(pq)
+    _record_stats(stats, started, steps, relaxed, counter, heap_max, pruned_cost,
+                  pruned_visited, bool(pq) and steps >= max_steps, pruned_unreachable,
+                  pruned_constraint)
+    return cc, results, pq, timed_out
+
+# backward A*: heuristic=None ではゼロヒューリスティック（Dijkstra）、
+# heuristic='alt' または LandmarkIndex を渡すと ALT 下界を使う
+# prune_unreachable=True では到達可能性インデックス（無ければ作る）で src に戻れない型を展開しない。
+# 既定の None では作成済み（Catalog.reachability() や、到達可能性インデックスを含めて保存したキャッシュ）のときだけ使う
+# constraints（SearchConstraints）は結果の後処理ではなく展開時に適用する
+# backend='scipy' では scipy.sparse.csgraph で最短路のみを求める（scipy_backend.py）。
+# heuristic・max_steps・max_results・stats・constraints は指定できない
+def synthesize_backward(catalog: Catalog, src_type: str, goal_type: str, max_cost=100, max_steps=10000,
+                        heuristic=None, max_results=None, stats: Optional[SearchStats] = None,
+                        prune_unreachable=None, constraints: Optional[SearchConstraints] = None,
+                        backend: Optional[str] = None):
+    if backend == 'scipy':
+        if constraints is not None:
+            raise ValueError("constraints are not supported by the scipy backend")
+        # 最短路を1本求めるだけなので、探索の制御・計測のオプションは使えない
+        unsupported = [name for name, used in (('heuristic', heuristic is not None),
+                                               ('max_steps', max_steps != 10000),
+                                               ('max_results', max_results is not None),
+                                               ('stats', stats is not None)) if used]
+        if unsupported:
+            raise ValueError(f"{', '.join(unsupported)} not supported by the scipy backend")
+        from scipy_backend import synthesize_scipy
+        return synthesize_scipy(catalog, src_type, goal_type, max_cost)
+    if backend is not None:
+        raise ValueError(f"Unknown search backend: {backend}")
+    cc, results, _, _ = _backward_search(catalog, src_type, goal_type, max_cost, max_steps,
+                                         heuristic, max_results, stats,
+                                         prune_unreachable=prune_unreachable,
+                                         constraints=constraints)
     results.sort(key=lambda x: x[0])
-    return results
+    return [(c, cc.to_funcs(_path_edges(path))) for c, path in results]
+
+@dataclass
+class SearchResult:
+    """打ち切り可能な探索の結果
+
+    results は synthesize_backward と同じ形式の [(cost, [Func])]。
+    optimal が True なら results[0] が最適（results が空なら解が無いこと）まで証明済み。
+    lower_bound は最適コストの下界で、optimal でない場合の最悪の差を見積もるのに使う。
+    """
+    results: list
+    optimal: bool
+    lower_bound: float = 0.0
+    timed_out: bool = False
+
+    @property
+    def best(self):
+        return self.results[0] if self.results else None
+
+def synthesize_anytime(catalog: Catalog, src_type: str, goal_type: str, deadline=None,
+                       time_budget=None, max_cost=100, max_steps=10000, heuristic=None,
+                       stats: Optional[SearchStats] = None, prune_unreachable=None,
+                       constraints: Optional[SearchConstraints] = None) -> SearchResult:
+    """期限付きの後方探索。期限までに見つかった最良のパスを返す
+
+    deadline は time.monotonic() 基準の絶対時刻、time_budget は秒数で、
+    どちらかを指定する。期限切れの時点でヒープから取り出し済みのパスは
+    最適性が証明済み、まだヒープ内にある src 到達パスは暫定解として返す。
+
+    期限にはコンパイル・ランドマーク・到達可能性インデックスの前計算も含まれ、
+    段階ごとに期限を過ぎていれば以降を省いて空の結果（timed_out=True）を返す。
+    ただし前計算の1段階は途中で打ち切れないので、大きなカタログで期限を
+    厳密に守るには catalog.compile()（heuristic='alt' なら catalog.landmarks() も）を
+    先に済ませておく。
+    """
+    if deadline is None and time_budget is not None:
+        deadline = time.monotonic() + time_budget
+    cc, popped, pq, timed_out = _backward_search(catalog, src_type, goal_type, max_cost,
+                                                 max_steps, heuristic, None, stats, deadline,
+                                                 prune_unreachable, constraints)
+    exhausted = not pq
+    src = cc.type_index.get(src_type, -1)
+    found = list(popped)
+    if not exhausted:
+        # まだ取り出されていない src 到達パス（暫定解）
+        found.extend((entry[1], entry[4]) for entry in pq if entry[3] == src and not entry[5])
+    found.sort(key=lambda x: x[0])
+    results = [(c, cc.to_funcs(_path_edges(path))) for c, path in found]
+    if popped or exhausted:
+        # 最初に取り出した src 到達パスが最適（ヒープが空なら解が無いことも証明済み）
+        optimal = True
+        lower_bound = popped[0][0] if popped else INF
+    else:
+        lower_bound = pq[0][0]
+        # 暫定解がヒープの最小キー以下なら、それが次に取り出される最適解
+        optimal = bool(found) and found[0][0] <= lower_bound
+    return SearchResult(results, optimal, lower_bound, timed_out)
+
+def synthesize_beam(catalog: Catalog, src_type: str, goal_type: str, beam_width=1000,
+                    max_cost=100, heuristic=None,
+                    stats: Optional[SearchStats] = None) -> SearchResult:
+    """メモリ上限付きの後方ビーム探索（関数が 10^6 規模のカタログ向け）
+
+    goal からのホップ数ごとの層で、推定コスト（累積コスト + h）の小さい
+    beam_width 個の状態だけを次の層に残す。保持する状態は層の幅で抑えられ、
+    ヒープが際限なく大きくなることはない。
+
+    捨てた状態を通るパスのコストは、その推定コスト以上になる。
+    そのため捨てた状態の推定コストの最小値と見つかった最良コストの小さい方が
+    最適コストの下界になり、SearchResult.lower_bound として返す。
+    best のコストと lower_bound の差が、厳密な探索と比べた最悪の劣化幅になる。
+
+    部分型はコスト0で層を進めないので、型 cur の展開では cur とその下位型の
+    関数をまとめて展開する。到達可能性インデックスは作成済み（Catalog.reachability()）
+    のときだけ枝刈りに使う。
+    """
+    if beam_width < 1:
+        raise ValueError("beam_width must be at least 1")
+    started = time.perf_counter()
+    cc = catalog.compile()
+    goal = cc.type_index.get(goal_type)
+    if catalog.is_subtype(src_type, goal_type):
+        return SearchResult([(0.0, [])], True, 0.0)
+    src = cc.type_index.get(src_type)
+    # 到達可能性インデックスは型数の2乗のメモリを使うので作らず、作成済みのときだけ使う
+    reach = cc.reachability
+    if src is None or goal is None or (reach is not None and not reach.can_reach(src, goal)):
+        return SearchResult([], True, INF)
+    rev_offsets, rev_edges = cc.rev_offsets, cc.rev_edges
+    dom, cost = cc.dom, cc.cost
+    on_expand = stats.on_expand if stats is not None else None
+    type_names = cc.type_names
+    useful = None
+    if reach is not None:
+        component = reach.component
+        useful = reach.forward[component[src]]
+    h = _src_heuristic(catalog, heuristic, src)
+    subtypes = cc.subtypes
+    src_supers = cc.super_bits[src] if subtypes is not None else 0  # ここに着けば src から来られる
+
+    # 層の要素: (est_total_cost, cum_cost, node_id, path_node)
+    layer = [(h(goal) if h is not None else 0.0, 0.0, goal, None)]
+    visited_best = [INF] * cc.num_types
+    found = []
+    dropped_bound = INF  # 捨てた状態の推定コストの最小値
+    popped = relaxed = pushes = pruned_cost = pruned_visited = pruned_unreachable = 0
+    pruned_beam = 0
+    layer_max = 1
+    while layer:
+        candidates = {}  # node -> 次の層の状態（同じ型は最安のみ）
+        for _, cum_cost, cur, path in layer:
+            if cum_cost >= visited_best[cur]:
+                pruned_visited += 1
+                continue
+            visited_best[cur] = cum_cost
+            popped += 1
+            if on_expand:
+                for callback in on_expand:
+                    callback(type_names[cur], cum_cost)
+            group = [cur]
+            if subtypes is not None:
+                for sub in subtypes[cur]:
+                    if cum_cost < visited_best[sub] and (
+                            useful is None or (useful >> component[sub]) & 1):
+                        visited_best[sub] = cum_cost
+                        group.append(sub)
+            if len(group) == 1:
+                slots = range(rev_offsets[cur], rev_offsets[cur + 1])
+            else:
+                slots = (i for x in group for i in range(rev_offsets[x], rev_offsets[x + 1]))
+            for i in slots:
+                e = rev_edges[i]
+                relaxed += 1
+                new_cum = cum_cost + cost[e]
+                if new_cum > max_cost:
+                    pruned_cost += 1
+                    continue
+                nxt = dom[e]
+                if nxt == src or (src_supers >> nxt) & 1:
+                    found.append((new_cum, (e, path)))
+                    continue
+                if useful is not None and not (useful >> component[nxt]) & 1:
+                    pruned_unreachable += 1
+                    continue
+                est = new_cum
+                if h is not None:
+                    est += h(nxt)
+                    if est > max_cost:
+                        pruned_cost += 1
+                        continue
+                if new_cum >= visited_best[nxt]:
+                    pruned_visited += 1
+                    continue
+                old = candidates.get(nxt)
+                if old is not None and old[1] <= new_cum:
+                    pruned_visited += 1
+                    continue
+                candidates[nxt] = (est, new_cum, nxt, (e, path))
+                pushes += 1
+        if len(candidates) > beam_width:
+            # 同じ型は candidates で一意なので、比較が path_node まで及ぶことはない
+            kept = heapq.nsmallest(beam_width + 1, candidates.values())
+            dropped_bound = min(dropped_bound, kept.pop()[0])
+            pruned_beam += len(candidates) - beam_width
+            layer = kept
+        else:
+            layer = list(candidates.values())
+        if len(layer) > layer_max:
+            layer_max = len(layer)
+    _record_stats(stats, started, popped, relaxed, pushes + 1, layer_max, pruned_cost,
+                  pruned_visited, False, pruned_unreachable, pruned_beam=pruned_beam)
+
+    found.sort(key=lambda x: x[0])
+    results = [(c, cc.to_funcs(_path_edges(path))) for c, path in found]
+    if found:
+        lower_bound = min(found[0][0], dropped_bound)
+        return SearchResult(results, found[0][0] <= dropped_bound, lower_bound)
+    return SearchResult(results, dropped_bound == INF, dropped_bound)
+
+def synthesize_bidirectional(catalog: Catalog, src_type: str, goal_type: str, max_cost=100, max_steps=10000,
+                             stats: Optional[SearchStats] = None):
+    """双方向Dijkstra：src から by_dom 方向、goal から by_cod 方向に同時に探索し中間で出会う
+
+    毎ステップ小さい方のフロンティアを展開するため、幅の広いオントロジーでも
+    片側探索よりフロンティアが小さく保たれる。
+
+    Returns:
+        synthesize_backward と同じ形式の [(cost, [Func])]（最短路のみ、見つからなければ空）
+    """
+    started = time.perf_counter()
+    if src_type == goal_type:
+        return [(0.0, [])]
+    cc = catalog.compile()
+    _require_no_subtyping(cc, 'synthesize_bidirectional')
+    src = cc.type_index.get(src_type)
+    goal = cc.type_index.get(goal_type)
+    if src is None or goal is None or _known_unreachable(cc, src, goal):
+        return []
+    on_expand = stats.on_expand if stats is not None else None
+
+    # side 0: src からの前方探索、side 1: goal からの後方探索
+    adjacency = ((cc.fwd_offsets, cc.fwd_edges, cc.cod),
+                 (cc.rev_offsets, cc.rev_edges, cc.dom))
+    cost = cc.cost
+    dist = ({src: 0.0}, {goal: 0.0})
+    via = ({}, {})
+    pqs = ([(0.0, src)], [(0.0, goal)])
+    best, meet = INF, None
+    steps = 0
+    relaxed = pruned_cost = pruned_visited = 0
+    pushes = heap_max = 2
+    converged = False
+    while pqs[0] and pqs[1] and steps < max_steps:
+        # 両側の最小キーの和が暫定最良を超えたら最適性が確定する
+        if pqs[0][0][0] + pqs[1][0][0] >= best:
+            converged = True
+            break
+        side = 0 if len(pqs[0]) <= len(pqs[1]) else 1
+        d, v = heapq.heappop(pqs[side])
+        steps += 1
+        if d > dist[side][v]:
+            pruned_visited += 1
+            continue
+        if on_expand:
+            for callback in on_expand:
+                callback(cc.type_names[v], d)
+        offsets, edges, nxt = adjacency[side]
+        mine, other = dist[side], dist[1 - side]
+        for i in range(offsets[v], offsets[v + 1]):
+            e = edges[i]
+            relaxed += 1
+            w = nxt[e]
+            nd = d + cost[e]
+            if nd > max_cost:
+                pruned_cost += 1
+                continue
+            if nd >= mine.get(w, INF):
+                pruned_visited += 1
+                continue
+            mine[w] = nd
+            via[side][w] = e
+            heapq.heappush(pqs[side], (nd, w))
+            pushes += 1
+            total = nd + other.get(w, INF)
+            if total < best and total <= max_cost:
+                best, meet = total, w
+        heap_max = max(heap_max, len(pqs[0]) + len(pqs[1]))
+    _record_stats(stats, started, steps, relaxed, pushes, heap_max, pruned_cost,
+                  pruned_visited, not converged and bool(pqs[0] and pqs[1]) and steps >= max_steps)
+
+    if meet is None:
+        return []
+    # src -> meet（前方の via を遡る）と meet -> goal（後方の via を辿る）を連結
+    head = []
+    v = meet
+    while v != src:
+        e = via[0][v]
+        head.append(e)
+        v = cc.dom[e]
+    head.reverse()
+    tail = []
+    v = meet
+    while v != goal:
+        e = via[1][v]
+        tail.append(e)
+        v = cc.cod[e]
+    return [(best, cc.to_funcs(head + tail))]
+
+def synthesize_pareto(catalog: Catalog, src_type: str, goal_type: str, max_cost=100,
+                      min_confidence=0.0, max_steps=100000, stats: Optional[SearchStats] = None):
+    """コストと信頼度の2目的でパレート最適なパスを求める（ラベル設定法）
+
+    各型に (cost, -log conf) のラベル集合を持ち、支配されるラベルは捨てる。
+    min_confidence を下回るラベルは探索中に枝刈りする。
+
+    Returns:
+        パレートフロント [(cost, confidence, [Func])]（コスト昇順＝信頼度昇順）
+    """
+    started = time.perf_counter()
+    if src_type == goal_type:
+        return [(0.0, 1.0, [])]
+    cc = catalog.compile()
+    _require_no_subtyping(cc, 'synthesize_pareto')
+    src = cc.type_index.get(src_type)
+    goal = cc.type_index.get(goal_type)
+    if src is None or goal is None or _known_unreachable(cc, src, goal):
+        return []
+    max_neglog = -math.log(min_confidence) if min_confidence > 0 else INF
+    neglog = [-math.log(c) if c > 0 else INF for c in cc.conf]
+    rev_offsets, rev_edges, dom, cost = cc.rev_offsets, cc.rev_edges, cc.dom, cc.cost
+    on_expand = stats.on_expand if stats is not None else None
+
+    def dominated(labels, c, n):
+        # -log conf の和は加算順で丸め誤差が出るので許容誤差付きで比較する
+        for lc, ln in labels:
+            if lc <= c and ln <= n + 1e-9:
+                return True
+        return False
+
+    settled = defaultdict(list)  # node -> 確定した非支配ラベル [(cost, neglog)]
+    # PQ entries: (cost, neglog, counter, node, path_node)
+    pq = [(0.0, 0.0, 0, goal, None)]
+    counter = 1
+    front = []
+    steps = 0
+    relaxed = pruned_cost = pruned_visited = 0
+    heap_max = 1
+    while pq and steps < max_steps:
+        c, n, _, v, path = heapq.heappop(pq)
+        steps += 1
+        # (cost, neglog) の辞書順で取り出すので、確定済みラベルに支配されなければ非支配
+        if dominated(settled[v], c, n):
+            pruned_visited += 1
+            continue
+        settled[v].append((c, n))
+        if v == src:
+            front.append((c, math.exp(-n), path))
+            continue
+        if on_expand:
+            for callback in on_expand:
+                callback(cc.type_names[v], c)
+        for i in range(rev_offsets[v], rev_offsets[v + 1]):
+            e = rev_edges[i]
+            relaxed += 1
+            nc = c + cost[e]
+            nn = n + neglog[e]
+            if nc > max_cost or nn > max_neglog:
+                pruned_cost += 1
+                continue
+            w = dom[e]
+            if dominated(settled[w], nc, nn):
+                pruned_visited += 1
+                continue
+            heapq.heappush(pq, (nc, nn, counter, w, (e, path)))
+            counter += 1
+        heap_max = max(heap_max, len(pq))
+    _record_stats(stats, started, steps, relaxed, counter, heap_max, pruned_cost,
+                  pruned_visited, bool(pq) and steps >= max_steps)
+    return [(c, conf, cc.to_funcs(_path_edges(path))) for c, conf, path in front]
+
+def _shortest_path(cc: CompiledCatalog, src: int, goal: int, max_cost=INF,
+                   banned_nodes=frozenset(), banned_edges=frozenset(),
+                   stats: Optional[SearchStats] = None):
+    """src から goal への単一最短路（前方Dijkstra）
+
+    banned_nodes / banned_edges に含まれる型・辺は使わない。
+    Returns:
+        (cost, edge_ids) または見つからなければ None
+    """
+    started = time.perf_counter()
+    fwd_offsets, fwd_edges, cod, cost = cc.fwd_offsets, cc.fwd_edges, cc.cod, cc.cost
+    on_expand = stats.on_expand if stats is not None else None
+    dist = {src: 0.0}
+    via = {}
+    pq = [(0.0, src)]
+    found = None
+    popped = relaxed = pruned_cost = pruned_visited = 0
+    pushes = 1
+    heap_max = 1
+    while pq:
+        d, v = heapq.heappop(pq)
+        popped += 1
+        if v == goal:
+            edges = []
+            while v != src:
+                e = via[v]
+                edges.append(e)
+                v = cc.dom[e]
+            edges.reverse()
+            found = (d, edges)
+            break
+        if d > dist[v]:
+            pruned_visited += 1
+            continue
+        if on_expand:
+            for callback in on_expand:
+                callback(cc.type_names[v], d)
+        for i in range(fwd_offsets[v], fwd_offsets[v + 1]):
+            e = fwd_edges[i]
+            w = cod[e]
+            if e in banned_edges or w in banned_nodes:
+                continue
+            relaxed += 1
+            nd = d + cost[e]
+            if nd > max_cost:
+                pruned_cost += 1
+            elif nd >= dist.get(w, INF):
+                pruned_visited += 1
+            else:
+                dist[w] = nd
+                via[w] = e
+                heapq.heappush(pq, (nd, w))
+                pushes += 1
+        heap_max = max(heap_max, len(pq))
+    _record_stats(stats, started, popped, relaxed, pushes, heap_max, pruned_cost,
+                  pruned_visited, False)
+    return found
+
+def synthesize_k_best(catalog: Catalog, src_type: str, goal_type: str, k=None, max_cost=INF,
+                      stats: Optional[SearchStats] = None):
+    """src_type から goal_type への閉路を含まないパスをコスト順に遅延生成する（Yen法）
+
+    synthesize_backward の visited_best による枝刈りと違い、
+    2番目以降のパスも取りこぼさない。必要な数だけ取り出せば
+    そこで探索は止まる。同じコストのパスは発見順に返す。
+
+    stats を渡すと、内部の最短路探索すべての計測値が加算される。
+
+    Yields:
+        (cost, [Func]) をコストの非減少順に、最大 k 件
+    """
+    cc = catalog.compile()
+    _require_no_subtyping(cc, 'synthesize_k_best')
+    src = cc.type_index.get(src_type)
+    goal = cc.type_index.get(goal_type)
+    if src_type == goal_type:
+        if k is None or k > 0:
+            yield (0.0, [])
+        return
+    if src is None or goal is None or _known_unreachable(cc, src, goal):
+        return
+    first = _shortest_path(cc, src, goal, max_cost, stats=stats)
+    if first is None:
+        return
+
+    cod, cost = cc.cod, cc.cost
+    accepted = []              # 確定したパス（辺IDのタプル）
+    seen = {tuple(first[1])}   # 候補に入れたことのあるパス
+    candidates = [(first[0], 0, tuple(first[1]))]
+    counter = 1
+    while candidates and (k is None or len(accepted) < k):
+        path_cost, _, path = heapq.heappop(candidates)
+        accepted.append(path)
+        yield (path_cost, cc.to_funcs(path))
+
+        # 直前のパスの各ノードを分岐点 (spur) として次の候補を作る
+        nodes = [src] + [cod[e] for e in path]
+        root_cost = 0.0
+        for i in range(len(path)):
+            spur = nodes[i]
+            root = path[:i]
+            banned_edges = {p[i] for p in accepted if len(p) > i and p[:i] == root}
+            banned_nodes = set(nodes[:i])
+            spur_path = _shortest_path(cc, spur, goal, max_cost - root_cost,
+                                       banned_nodes, banned_edges, stats)
+            if spur_path is not None:
+                candidate = root + tuple(spur_path[1])
+                if candidate not in seen:
+                    seen.add(candidate)
+                    heapq.heappush(candidates,
+                                   (root_cost + spur_path[0], counter, candidate))
+                    counter += 1
+            root_cost += cost[path[i]]
 
 def path_to_json(path):
     return [ { 'id': f.id, 'sig': f.dom + ' -> ' + f.cod, 'cost': f.cost, 'conf': f.conf } for f in path ]
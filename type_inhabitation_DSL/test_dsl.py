@@ -4,7 +4,8 @@ DSLパーサーと型合成システムの統合テスト
 """
 
 import sys
-from dsl_parser import parse_dsl_string, DSLParser
+import io
+from dsl_parser import parse_dsl_string, DSLParser, DSLSyntaxError, iter_dsl_decls
 from synth_lib import Catalog, synthesize_backward
 
 def test_dsl_parsing():
@@ -241,6 +242,99 @@ def test_cfp_example():
     print("✓ CFP計算の実例: 成功")
     return True
 
+def test_lexer_edge_cases():
+    """字句解析の境界ケースと構文エラーのテスト"""
+    print("\n" + "=" * 60)
+    print("テスト6: 字句解析と構文エラー")
+    print("=" * 60)
+
+    dsl_content = """
+    type A <: B [unit=kg]   # 部分型と属性
+    type B
+    type P = A × B
+
+    fn f {
+      sig: A -> B  # コメント
+      impl: sparql("SELECT ?x WHERE { ?x a <http://example.org/onto#Fuel> }")
+      doc: "閉じ括弧 } を含む説明"
+      cost: 2
+    }
+
+    fn g { sig: B -> A
+      impl: rest("POST", "https://api.example.com/{id}") confidence: 0.5 }
+    """
+
+    catalog = parse_dsl_string(dsl_content)
+    types = {t['name']: t for t in catalog['types']}
+    assert types['A'] == {'name': 'A', 'unit': 'kg', 'subtype_of': ['B']}
+    assert types['P']['product_of'] == ['A', 'B']
+
+    f, g = catalog['functions']
+    # 文字列内の # はコメントではない
+    assert f['impl']['query'].endswith('<http://example.org/onto#Fuel> }')
+    assert f['sig'] == 'A -> B' and f['cost'] == 2.0
+    assert g['impl'] == {'kind': 'rest', 'method': 'POST', 'url': 'https://api.example.com/{id}'}
+    assert g['confidence'] == 0.5
+
+    # 構文エラーは行番号付きで報告する
+    for bad, line in [("type A\nfn f {\n  sig: A -> B\n", 2),
+                      ("fn f {\n  sig: A -> B\n  cost: high\n}", 3),
+                      ("fn f {\n  impl: formula(a + b)\n}", 2)]:
+        try:
+            parse_dsl_string(bad)
+            assert False, f"DSLSyntaxError expected: {bad!r}"
+        except DSLSyntaxError as e:
+            assert e.line == line, (bad, e)
+
+    print("✓ 字句解析と構文エラー: 成功")
+    return True
+
+def test_streaming_parse():
+    """iter_dsl_decls による逐次パースのテスト"""
+    print("\n" + "=" * 60)
+    print("テスト7: 逐次パース")
+    print("=" * 60)
+
+    dsl_content = "".join(f"""
+    type T{i} [unit=kg]
+    fn f{i} {{
+      sig: T{i} -> T{i + 1}
+      doc: "fn f{i}
+    type X は文字列の中"
+      cost: {i + 1}
+    }}
+    """ for i in range(20))
+
+    expected = parse_dsl_string(dsl_content)
+    for chunk_size in (1, 16, 1 << 16):
+        parser = DSLParser()
+        parser.extend(iter_dsl_decls(io.StringIO(dsl_content), chunk_size))
+        assert parser.to_catalog_dict() == expected, chunk_size
+
+    # 宣言はファイルを読み終える前に返る
+    stream = io.StringIO(dsl_content)
+    first = next(iter_dsl_decls(stream, 64))
+    assert first.name == 'T0' and stream.tell() < len(dsl_content)
+
+    # 構文エラーの行番号はファイル全体での行番号
+    bad = "type A\n" * 100 + "fn f {\n  cost: high\n}\n"
+    try:
+        list(iter_dsl_decls(io.StringIO(bad), 8))
+        assert False, "DSLSyntaxError expected"
+    except DSLSyntaxError as e:
+        assert e.line == 102, e
+
+    # 宣言をそのままカタログに追加する（コンパイル済みでも型を追加できる）
+    catalog = Catalog.from_decls(iter_dsl_decls(io.StringIO(dsl_content), 16))
+    assert catalog.fingerprint() == Catalog(expected).fingerprint()
+    assert [f.id for f in synthesize_backward(catalog, 'T0', 'T3')[0][1]] == ['f0', 'f1', 'f2']
+    catalog.add_type({'name': 'Orphan'})
+    assert not catalog.can_reach('Orphan', 'T3')
+    assert catalog.shortest_path_tree('T3').cost('Orphan') == float('inf')
+
+    print("✓ 逐次パース: 成功")
+    return True
+
 def main():
     """すべてのテストを実行"""
     print("\n" + "=" * 60)
@@ -253,6 +347,8 @@ def main():
         test_nested_braces,
         test_inverse_functions,
         test_cfp_example,
+        test_lexer_edge_cases,
+        test_streaming_parse,
     ]
 
     passed = 0
@@ -14,6 +14,7 @@ sys.path.insert(0, str(project_root))
 
 from synth_lib import Catalog, synthesize_backward
 from executor import PathExecutor, ExecutionContext
+from hyper_synth import synthesize_hyper
 
 
 def test_product_type_parsing():
@@ -190,6 +191,56 @@ def test_comparison_single_vs_product():
     return True
 
 
+def test_hypergraph_aggregation():
+    """ハイパーグラフ探索で全Scopeを1つの導出木として集約"""
+    print("\nTest 6: ハイパーグラフ探索による全Scopeの集約")
+    print("=" * 80)
+
+    catalog = Catalog.from_dsl("ghg_scope123_product.dsl")
+
+    tree = synthesize_hyper(catalog, ["Facility", "Organization"], "TotalGHGEmissions")
+    assert tree is not None, "導出木が見つかりません"
+    print(f"✓ 導出木: {tree.proof()}")
+    print(f"  総コスト: {tree.cost}")
+
+    # Product型の構築子で3つのScopeすべてを使う
+    assert tree.func.id == "aggregateAllScopes"
+    allscopes = tree.children[0]
+    assert allscopes.type == "AllScopesEmissions"
+    assert [c.type for c in allscopes.children] == [
+        "Scope1Emissions", "Scope2Emissions", "Scope3Emissions"]
+    func_ids = [f.id for f in tree.funcs()]
+    assert func_ids[-2:] == ["buildAllScopes", "aggregateAllScopes"]
+    assert "scope2Only" not in func_ids
+
+    # 多引数シグネチャと共有部分パス
+    catalog = Catalog({
+        'types': [{'name': n} for n in ['Src', 'Shared', 'A', 'B', 'Out']],
+        'functions': [
+            {'id': 'share', 'sig': 'Src -> Shared', 'cost': 5},
+            {'id': 'toA', 'sig': 'Shared -> A', 'cost': 1},
+            {'id': 'toB', 'sig': 'Shared -> B', 'cost': 2},
+            {'id': 'combine', 'sig': '(A, B) -> Out', 'cost': 1},
+        ],
+    })
+    tree = synthesize_hyper(catalog, "Src", "Out")
+    assert tree.cost == 1 + (5 + 1) + (5 + 2)
+    assert [f.id for f in tree.funcs()] == ["share", "toA", "toB", "combine"]
+    assert tree.children[0].children[0] is tree.children[1].children[0], "共有部分木"
+    assert synthesize_hyper(catalog, "A", "Out") is None
+
+    # 部分型の暗黙の辺は扱えないので拒否する
+    catalog.add_type({'name': 'SubA', 'subtype_of': ['A']})
+    try:
+        synthesize_hyper(catalog, "SubA", "Out")
+        assert False, "ValueError expected"
+    except ValueError:
+        pass
+
+    print("\n" + "=" * 80)
+    return True
+
+
 def main():
     """全テストを実行"""
     print("\n" + "=" * 80)
@@ -201,7 +252,8 @@ def main():
         test_path_to_allscopes,
         test_allscopes_to_total,
         test_execute_product_aggregation,
-        test_comparison_single_vs_product
+        test_comparison_single_vs_product,
+        test_hypergraph_aggregation
     ]
 
     results = []
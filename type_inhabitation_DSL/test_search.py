@@ -0,0 +1,1129 @@
+# test_search.py
+"""
+探索アルゴリズム（synth_lib）のテスト
+"""
+
+import sys
+from dsl_parser import parse_dsl_string
+from synth_lib import (INF, Catalog, SearchConstraints, SearchStats, synthesize_backward, synthesize_k_best,
+                       synthesize_bidirectional, synthesize_pareto, synthesize_anytime,
+                       synthesize_beam)
+
+SEARCH_DSL = """
+type A
+type B
+type C
+type D
+
+fn ab {
+  sig: A -> B
+  impl: formula("b = a")
+  cost: 1
+  confidence: 0.9
+}
+
+fn bc {
+  sig: B -> C
+  impl: formula("c = b")
+  cost: 1
+  confidence: 0.9
+}
+
+fn cd {
+  sig: C -> D
+  impl: formula("d = c")
+  cost: 1
+  confidence: 0.9
+}
+
+fn ac {
+  sig: A -> C
+  impl: formula("c = a")
+  cost: 3
+  confidence: 0.99
+}
+
+fn bd {
+  sig: B -> D
+  impl: formula("d = b")
+  cost: 4
+  confidence: 0.5
+}
+
+fn db {
+  sig: D -> B
+  impl: formula("b = d")
+  cost: 1
+  confidence: 0.9
+}
+"""
+
+def make_catalog():
+    return Catalog(parse_dsl_string(SEARCH_DSL))
+
+def ids(path):
+    return [f.id for f in path]
+
+def test_compiled_catalog():
+    """コンパイル済みカタログ（CSR）の構造テスト"""
+    print("=" * 60)
+    print("テスト: コンパイル済みカタログ")
+    print("=" * 60)
+
+    cat = make_catalog()
+    cc = cat.compile()
+    assert cat.compile() is cc, "コンパイル結果はキャッシュされるべき"
+    assert cc.num_types == 4
+
+    # cod ごとの隣接リストは by_cod と同じ順序
+    for name, funcs in cat.by_cod.items():
+        t = cc.type_index[name]
+        edges = cc.rev_edges[cc.rev_offsets[t]:cc.rev_offsets[t + 1]]
+        assert ids(cc.to_funcs(edges)) == ids(funcs)
+    for name, funcs in cat.by_dom.items():
+        t = cc.type_index[name]
+        edges = cc.fwd_edges[cc.fwd_offsets[t]:cc.fwd_offsets[t + 1]]
+        assert ids(cc.to_funcs(edges)) == ids(funcs)
+
+    results = synthesize_backward(cat, 'A', 'D', max_cost=10)
+    assert results[0][0] == 3.0
+    assert ids(results[0][1]) == ['ab', 'bc', 'cd']
+
+    # カタログに存在しない型
+    assert synthesize_backward(cat, 'A', 'Unknown') == []
+    assert synthesize_backward(cat, 'Unknown', 'Unknown') == [(0.0, [])]
+
+    print("✓ コンパイル済みカタログ: 成功")
+    return True
+
+def make_chain_catalog(length):
+    """T0 -> T1 -> ... -> T{length} の鎖状カタログ"""
+    return Catalog({
+        'types': [{'name': f'T{i}'} for i in range(length + 1)],
+        'functions': [
+            {'id': f'f{i}', 'sig': f'T{i} -> T{i + 1}', 'cost': 1}
+            for i in range(length)
+        ],
+    })
+
+def test_long_chain_path():
+    """長い鎖でのパス復元（親ポインタ表現）のテスト"""
+    print("\n" + "=" * 60)
+    print("テスト: 長い鎖のパス復元")
+    print("=" * 60)
+
+    cat = make_chain_catalog(300)
+    results = synthesize_backward(cat, 'T0', 'T300', max_cost=1000)
+    assert len(results) == 1
+    cost, path = results[0]
+    assert cost == 300.0
+    assert ids(path) == [f'f{i}' for i in range(300)]
+
+    print("✓ 長い鎖のパス復元: 成功")
+    return True
+
+def test_alt_heuristic():
+    """ALTヒューリスティック付きA*がゼロヒューリスティックと同じ結果を返すかのテスト"""
+    print("\n" + "=" * 60)
+    print("テスト: ALTランドマークによるA*")
+    print("=" * 60)
+
+    cat = make_catalog()
+    index = cat.landmarks(2)
+    assert cat.landmarks(2) is index, "ランドマークはカタログごとにキャッシュされるべき"
+
+    cc = cat.compile()
+    for src in cc.type_names:
+        for goal in cc.type_names:
+            plain = synthesize_backward(cat, src, goal, max_cost=10)
+            alt = synthesize_backward(cat, src, goal, max_cost=10, heuristic='alt')
+            assert [c for c, _ in plain] == [c for c, _ in alt], (src, goal)
+
+    # 最良パスのみ（最初に取り出されたものが最適）
+    best = synthesize_backward(cat, 'A', 'D', max_cost=10, heuristic=index, max_results=1)
+    assert len(best) == 1 and best[0][0] == 3.0
+
+    # 下界で到達不能が判明する場合
+    assert synthesize_backward(cat, 'D', 'A', heuristic='alt') == []
+
+    print("✓ ALTランドマークによるA*: 成功")
+    return True
+
+def test_k_best_paths():
+    """閉路を含まないk最短路（Yen法）のテスト"""
+    print("\n" + "=" * 60)
+    print("テスト: k最短路の遅延生成")
+    print("=" * 60)
+
+    cat = make_catalog()
+    plans = list(synthesize_k_best(cat, 'A', 'D'))
+    assert [c for c, _ in plans] == [3.0, 4.0, 5.0]
+    assert [ids(p) for _, p in plans] == [['ab', 'bc', 'cd'], ['ac', 'cd'], ['ab', 'bd']]
+
+    # 遅延生成：必要な件数だけ取り出せる
+    gen = synthesize_k_best(cat, 'A', 'D')
+    assert next(gen)[0] == 3.0
+    assert len(list(synthesize_k_best(cat, 'A', 'D', k=2))) == 2
+
+    # max_cost を超えるパスは返さない
+    assert [c for c, _ in synthesize_k_best(cat, 'A', 'D', max_cost=4)] == [3.0, 4.0]
+    assert list(synthesize_k_best(cat, 'D', 'A')) == []
+    assert list(synthesize_k_best(cat, 'A', 'A')) == [(0.0, [])]
+
+    print("✓ k最短路の遅延生成: 成功")
+    return True
+
+def test_bidirectional_search():
+    """双方向探索が片側探索と同じ最短コストを返すかのテスト"""
+    print("\n" + "=" * 60)
+    print("テスト: 双方向探索")
+    print("=" * 60)
+
+    cat = make_catalog()
+    cc = cat.compile()
+    for src in cc.type_names:
+        for goal in cc.type_names:
+            single = synthesize_backward(cat, src, goal, max_cost=10)
+            both = synthesize_bidirectional(cat, src, goal, max_cost=10)
+            assert [c for c, _ in single[:1]] == [c for c, _ in both], (src, goal)
+
+    cost, path = synthesize_bidirectional(cat, 'A', 'D')[0]
+    assert cost == 3.0 and ids(path) == ['ab', 'bc', 'cd']
+
+    cost, path = synthesize_bidirectional(make_chain_catalog(50), 'T0', 'T50')[0]
+    assert cost == 50.0 and len(path) == 50
+
+    print("✓ 双方向探索: 成功")
+    return True
+
+def test_shortest_path_tree_cache():
+    """goal を根とする最短路木キャッシュのテスト"""
+    print("\n" + "=" * 60)
+    print("テスト: 最短路木キャッシュ")
+    print("=" * 60)
+
+    cat = make_catalog()
+    tree = cat.shortest_path_tree('D')
+    assert cat.shortest_path_tree('D') is tree, "同じ goal の木はキャッシュされるべき"
+    assert cat.shortest_path_tree('Unknown') is None
+
+    cost, path = tree.query('A')[0]
+    assert cost == 3.0 and ids(path) == ['ab', 'bc', 'cd']
+    assert tree.query('D') == [(0.0, [])]
+    assert tree.query('A', max_cost=2) == []
+    assert cat.shortest_path_tree('A').query('D') == []
+
+    # カタログの変更後は invalidate() でキャッシュが破棄される
+    cat.funcs[0].cost = 10
+    cat.invalidate()
+    assert cat.shortest_path_tree('D') is not tree
+    assert cat.shortest_path_tree('D').cost('A') == 4.0
+
+    print("✓ 最短路木キャッシュ: 成功")
+    return True
+
+def test_path_index():
+    """全点対インデックス（NumPy）のテスト"""
+    print("\n" + "=" * 60)
+    print("テスト: 全点対インデックス")
+    print("=" * 60)
+
+    import os
+    import tempfile
+    from path_index import PathIndex, HAS_NUMPY
+
+    if not HAS_NUMPY:
+        print("⚠ numpy が見つかりません。スキップします。")
+        return True
+
+    cat = make_catalog()
+    index = PathIndex.build(cat)
+    cc = cat.compile()
+    for src in cc.type_names:
+        for goal in cc.type_names:
+            expected = synthesize_backward(cat, src, goal, max_cost=10)
+            got = index.query(src, goal, max_cost=10)
+            assert [c for c, _ in expected[:1]] == [c for c, _ in got], (src, goal)
+    assert ids(index.query('A', 'D')[0][1]) == ['ab', 'bc', 'cd']
+
+    # 小数のコストでも synthesize_backward と末尾の桁まで同じコストを返す
+    costs = [0.1, 0.2, 0.3, 0.7, 0.05, 0.15]
+    frac = Catalog({
+        'types': [{'name': f'T{i}'} for i in range(len(costs) + 1)],
+        'functions': [{'id': f'f{i}', 'sig': f'T{i} -> T{i + 1}', 'cost': c}
+                      for i, c in enumerate(costs)],
+    })
+    frac_index = PathIndex.build(frac)
+    for i in range(len(costs) + 1):
+        for j in range(i + 1, len(costs) + 1):
+            assert frac_index.query(f'T{i}', f'T{j}') == \
+                synthesize_backward(frac, f'T{i}', f'T{j}'), (i, j)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        catalog_path = os.path.join(tmp, 'search.dsl')
+        index.save(catalog_path)
+        loaded = PathIndex.load(catalog_path, cat)
+        assert loaded is not None
+        assert loaded.query('A', 'D')[0][0] == 3.0
+        # 内容の異なるカタログには使わない
+        other = make_chain_catalog(3)
+        assert PathIndex.load(catalog_path, other) is None
+
+    print("✓ 全点対インデックス: 成功")
+    return True
+
+def test_pareto_search():
+    """コストと信頼度のパレートフロント探索のテスト"""
+    print("\n" + "=" * 60)
+    print("テスト: パレートフロント探索")
+    print("=" * 60)
+
+    cat = make_catalog()
+    front = synthesize_pareto(cat, 'A', 'D', max_cost=10)
+    # ab∘bc∘cd (3, 0.729) と ac∘cd (4, 0.891) が非支配、ab∘bd (5, 0.45) は支配される
+    assert [c for c, _, _ in front] == [3.0, 4.0]
+    assert [ids(p) for _, _, p in front] == [['ab', 'bc', 'cd'], ['ac', 'cd']]
+    assert abs(front[0][1] - 0.729) < 1e-9
+    assert abs(front[1][1] - 0.891) < 1e-9
+
+    # 信頼度の下限は探索中に適用される
+    front = synthesize_pareto(cat, 'A', 'D', max_cost=10, min_confidence=0.8)
+    assert [ids(p) for _, _, p in front] == [['ac', 'cd']]
+    assert synthesize_pareto(cat, 'A', 'D', min_confidence=0.95) == []
+
+    print("✓ パレートフロント探索: 成功")
+    return True
+
+def test_search_stats():
+    """探索の計測値とコールバックのテスト"""
+    print("\n" + "=" * 60)
+    print("テスト: 探索の計測値")
+    print("=" * 60)
+
+    cat = make_catalog()
+    stats = SearchStats()
+    expanded = []
+    stats.on_expand.append(lambda type_name, cost: expanded.append((type_name, cost)))
+    synthesize_backward(cat, 'A', 'D', max_cost=10, stats=stats)
+
+    assert stats.nodes_popped > 0
+    assert stats.edges_relaxed >= len(expanded)
+    assert stats.heap_pushes >= stats.nodes_popped
+    assert stats.heap_max >= 1
+    assert stats.wall_time > 0
+    assert not stats.hit_max_steps
+    assert expanded[0] == ('D', 0.0), "最初に goal が展開される"
+    assert 'on_expand' not in stats.to_dict()
+
+    # max_cost による枝刈り・max_steps の打ち切りも記録される
+    stats = SearchStats()
+    synthesize_backward(cat, 'A', 'D', max_cost=1, stats=stats)
+    assert stats.pruned_by_cost > 0
+    stats = SearchStats()
+    synthesize_backward(make_chain_catalog(20), 'T0', 'T20', max_steps=5, stats=stats)
+    assert stats.hit_max_steps and stats.nodes_popped == 5
+
+    # 他の探索モードも同じ計測値を埋める
+    for search in (synthesize_bidirectional, synthesize_pareto):
+        stats = SearchStats()
+        search(cat, 'A', 'D', stats=stats)
+        assert stats.nodes_popped > 0 and stats.edges_relaxed > 0
+    stats = SearchStats()
+    list(synthesize_k_best(cat, 'A', 'D', stats=stats))
+    assert stats.nodes_popped > 0
+
+    print("✓ 探索の計測値: 成功")
+    return True
+
+def test_anytime_search():
+    """期限付き探索（暫定解と最適性フラグ）のテスト"""
+    print("\n" + "=" * 60)
+    print("テスト: 期限付き探索")
+    print("=" * 60)
+
+    cat = make_catalog()
+    result = synthesize_anytime(cat, 'A', 'D', time_budget=10.0, max_cost=10)
+    assert result.optimal and not result.timed_out
+    assert result.best[0] == 3.0 and result.lower_bound == 3.0
+
+    # 期限切れ：まだ何も取り出していなければ最適性は未証明
+    result = synthesize_anytime(cat, 'A', 'D', deadline=0.0, max_cost=10)
+    assert result.timed_out and not result.optimal
+    assert result.results == []
+    # 期限には前計算も含まれ、期限切れなら以降の前計算（ランドマーク・到達可能性）を省く
+    cold = make_catalog()
+    result = synthesize_anytime(cold, 'A', 'D', deadline=0.0, heuristic='alt',
+                                prune_unreachable=True)
+    assert result.timed_out and not result.optimal and result.results == []
+    cc = cold.compile()
+    assert not cc.landmark_indexes and cc.reachability is None
+
+    # 打ち切り時点でヒープ内にある src 到達パスを暫定解として返す
+    result = synthesize_anytime(cat, 'A', 'D', max_cost=10, max_steps=2)
+    assert not result.optimal
+    assert result.best == synthesize_anytime(cat, 'A', 'D', max_cost=10).results[1]
+    assert result.best[0] > result.lower_bound
+    # 暫定解がヒープの最小キー以下なら最適性が証明できる
+    result = synthesize_anytime(cat, 'A', 'D', max_cost=10, max_steps=3)
+    assert result.optimal and result.best[0] == 3.0
+
+    # 探索し尽くして解が無い場合は「解なし」が証明済み
+    result = synthesize_anytime(cat, 'D', 'A', time_budget=10.0)
+    assert result.optimal and result.results == []
+
+    print("✓ 期限付き探索: 成功")
+    return True
+
+def test_reachability_pruning():
+    """到達可能性インデックスによる行き止まりの枝刈りのテスト"""
+    print("\n" + "=" * 60)
+    print("テスト: 到達可能性による枝刈り")
+    print("=" * 60)
+
+    cat = make_catalog()
+    assert cat.reachability() is cat.reachability(), "インデックスはキャッシュされるべき"
+    assert cat.can_reach('A', 'D') and cat.can_reach('D', 'B')
+    assert not cat.can_reach('D', 'A') and not cat.can_reach('A', 'Unknown')
+    # B と D は同じ強連結成分
+    reach = cat.reachability()
+    cc = cat.compile()
+    assert reach.component[cc.type_index['B']] == reach.component[cc.type_index['D']]
+
+    # 他の探索は到達可能性インデックスを作らない（作成済みなら早期に「解なし」と答える）
+    fresh = make_catalog()
+    assert synthesize_bidirectional(fresh, 'D', 'A') == []
+    assert synthesize_pareto(fresh, 'D', 'A') == []
+    assert list(synthesize_k_best(fresh, 'D', 'A')) == []
+    assert [c for c, _ in synthesize_bidirectional(fresh, 'A', 'D')] == [3.0]
+    assert fresh.compile().reachability is None
+
+    # 到達不能な組は探索せずに「解なし」
+    stats = SearchStats()
+    assert synthesize_backward(cat, 'D', 'A', stats=stats) == []
+    assert stats.nodes_popped == 0
+    assert synthesize_bidirectional(cat, 'D', 'A') == []
+    assert synthesize_pareto(cat, 'D', 'A') == []
+
+    # src から到達できない型（X0..X9）は goal に向かう辺があっても展開しない
+    cat = Catalog({
+        'types': [{'name': n} for n in ['S', 'M', 'G']] + [{'name': f'X{i}'} for i in range(10)],
+        'functions': [
+            {'id': 'sm', 'sig': 'S -> M', 'cost': 1},
+            {'id': 'mg', 'sig': 'M -> G', 'cost': 1},
+        ] + [{'id': f'x{i}', 'sig': f'X{i} -> G', 'cost': 1} for i in range(10)],
+    })
+    # 既定では探索のためにインデックスを作らない
+    stats = SearchStats()
+    unpruned = synthesize_backward(cat, 'S', 'G', max_cost=10, stats=stats)
+    assert stats.pruned_unreachable == 0 and cat.compile().reachability is None
+    stats = SearchStats()
+    pruned = synthesize_backward(cat, 'S', 'G', max_cost=10, stats=stats, prune_unreachable=True)
+    assert stats.pruned_unreachable == 10
+    assert stats.nodes_popped == 3
+    assert pruned == unpruned == synthesize_backward(cat, 'S', 'G', max_cost=10,
+                                                     prune_unreachable=False)
+    # 作成済みなら既定でも使う
+    stats = SearchStats()
+    synthesize_backward(cat, 'S', 'G', max_cost=10, stats=stats)
+    assert stats.pruned_unreachable == 10
+
+    print("✓ 到達可能性による枝刈り: 成功")
+    return True
+
+def test_search_constraints():
+    """探索中に適用する制約（禁止関数・impl.kind・経由点・ホップ数）のテスト"""
+    print("\n" + "=" * 60)
+    print("テスト: 制約付き探索")
+    print("=" * 60)
+
+    cat = make_catalog()
+
+    def best(constraints, src='A', goal='D'):
+        results = synthesize_backward(cat, src, goal, max_cost=10, constraints=constraints)
+        return ids(results[0][1]) if results else None
+
+    # 制約なしと同じ結果
+    assert best(SearchConstraints()) == ['ab', 'bc', 'cd']
+    assert best(SearchConstraints(forbidden={'bc'})) == ['ac', 'cd']
+    assert best(SearchConstraints(forbidden={'bc', 'ac'})) == ['ab', 'bd']
+    assert best(SearchConstraints(allowed_kinds={'rest'})) is None
+    assert best(SearchConstraints(max_hops=2)) == ['ac', 'cd']
+    assert best(SearchConstraints(max_hops=1)) is None
+
+    # 経由点は順序どおりに通る（D を通ってから B に戻る閉路も許す）
+    assert best(SearchConstraints(waypoints=['C'])) == ['ab', 'bc', 'cd']
+    assert best(SearchConstraints(waypoints=['D']), goal='C') == ['ab', 'bc', 'cd', 'db', 'bc']
+    assert best(SearchConstraints(waypoints=['D', 'B', 'C']), goal='D') == \
+        ['ab', 'bc', 'cd', 'db', 'bc', 'cd']
+    assert best(SearchConstraints(waypoints=['Unknown'])) is None
+
+    # 結果の後処理ではなく展開時に枝刈りされる
+    stats = SearchStats()
+    synthesize_backward(cat, 'A', 'D', max_cost=10, stats=stats,
+                        constraints=SearchConstraints(forbidden={'bd'}))
+    assert stats.pruned_by_constraint > 0
+
+    # 経由点がカタログに無ければ、src == goal でも自明なパスは返さない
+    assert synthesize_backward(cat, 'X', 'X', constraints=SearchConstraints(waypoints=['B'])) == []
+    assert synthesize_backward(cat, 'X', 'X', constraints=SearchConstraints(waypoints=['X'])) == \
+        [(0.0, [])]
+
+    # 関係の無い関数を禁止しても、閉路を何度も回る経路を数え上げない
+    n = 200
+    ring = Catalog({'types': [{'name': f'T{i}'} for i in range(n)], 'functions': [
+        {'id': f'{d}{i}', 'sig': f'T{i} -> T{(i + s) % n}', 'impl': {}, 'cost': 1}
+        for i in range(n) for d, s in (('f', 1), ('b', -1))]})
+    plain, stats, limited = SearchStats(), SearchStats(), SearchStats()
+    expected = synthesize_backward(ring, 'T0', 'T100', max_cost=1000, stats=plain)
+    results = synthesize_backward(ring, 'T0', 'T100', max_cost=1000, stats=stats,
+                                  constraints=SearchConstraints(forbidden={'zzz'}))
+    assert [c for c, _ in results] == [c for c, _ in expected] == [100.0, 100.0]
+    assert stats.nodes_popped < 2 * plain.nodes_popped
+    results = synthesize_backward(ring, 'T0', 'T100', max_cost=1000, stats=limited,
+                                  constraints=SearchConstraints(forbidden={'zzz'}, max_hops=100))
+    assert [c for c, _ in results] == [100.0, 100.0]
+    assert limited.nodes_popped < 2 * plain.nodes_popped
+
+    print("✓ 制約付き探索: 成功")
+    return True
+
+def test_beam_search():
+    """ビーム探索と劣化幅の見積もりのテスト"""
+    print("\n" + "=" * 60)
+    print("テスト: ビーム探索")
+    print("=" * 60)
+
+    cat = make_catalog()
+    # 幅1でも捨てた状態（B, 推定4）より安い解が見つかれば最適が証明できる
+    stats = SearchStats()
+    result = synthesize_beam(cat, 'A', 'D', beam_width=1, max_cost=10, stats=stats)
+    assert result.optimal and result.best[0] == 3.0
+    assert ids(result.best[1]) == ['ab', 'bc', 'cd']
+    assert stats.pruned_by_beam == 1 and stats.heap_max == 1
+    assert synthesize_beam(cat, 'D', 'A').optimal
+    assert synthesize_beam(cat, 'A', 'A').results == [(0.0, [])]
+    # 型数の2乗のメモリを使う到達可能性インデックスは作らない（作成済みなら使う）
+    assert cat.compile().reachability is None
+    cat.reachability()
+    assert synthesize_beam(cat, 'D', 'A').optimal
+    assert synthesize_beam(cat, 'A', 'D', beam_width=1, max_cost=10).best[0] == 3.0
+
+    # 最初の一手が安い方に引きずられる例: S -> Y -> G（3）が最適
+    trap = Catalog({
+        'types': [{'name': n} for n in ['S', 'X', 'Y', 'G']],
+        'functions': [
+            {'id': 'sx', 'sig': 'S -> X', 'cost': 10},
+            {'id': 'xg', 'sig': 'X -> G', 'cost': 1},
+            {'id': 'sy', 'sig': 'S -> Y', 'cost': 1},
+            {'id': 'yg', 'sig': 'Y -> G', 'cost': 2},
+        ],
+    })
+    result = synthesize_beam(trap, 'S', 'G', beam_width=1)
+    assert not result.optimal
+    assert result.best[0] == 11.0 and result.lower_bound == 2.0
+    # 幅が十分なら厳密な探索と同じ
+    result = synthesize_beam(trap, 'S', 'G', beam_width=2)
+    assert result.optimal and ids(result.best[1]) == ['sy', 'yg']
+    assert result.results == synthesize_backward(trap, 'S', 'G')
+
+    print("✓ ビーム探索: 成功")
+    return True
+
+def test_contraction_hierarchy():
+    """縮約階層の前処理と問い合わせのテスト"""
+    print("\n" + "=" * 60)
+    print("テスト: 縮約階層")
+    print("=" * 60)
+
+    import os
+    import tempfile
+    from contraction import ContractionHierarchy
+
+    for cat in (make_catalog(), make_chain_catalog(30)):
+        ch = ContractionHierarchy.build(cat)
+        cc = cat.compile()
+        for src in cc.type_names:
+            for goal in cc.type_names:
+                expected = synthesize_backward(cat, src, goal, max_cost=100)
+                got = ch.query(src, goal, max_cost=100)
+                assert [c for c, _ in expected[:1]] == [c for c, _ in got], (src, goal)
+
+    # ショートカットは元の関数の列に展開される
+    cat = make_catalog()
+    ch = ContractionHierarchy.build(cat)
+    assert ch.query('A', 'D') == synthesize_backward(cat, 'A', 'D', max_results=1)
+    assert ch.query('A', 'D', max_cost=2) == []
+    assert ch.query('A', 'Unknown') == []
+    chain = make_chain_catalog(30)
+    cost, path = ContractionHierarchy.build(chain).query('T0', 'T30')[0]
+    assert cost == 30.0 and ids(path) == [f'f{i}' for i in range(30)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        catalog_path = os.path.join(tmp, 'search.dsl')
+        ch.save(catalog_path)
+        loaded = ContractionHierarchy.load(catalog_path, cat)
+        assert loaded is not None
+        assert loaded.query('A', 'D') == ch.query('A', 'D')
+        # 内容の異なるカタログには使わない
+        assert ContractionHierarchy.load(catalog_path, chain) is None
+
+    print("✓ 縮約階層: 成功")
+    return True
+
+def test_catalog_mutation():
+    """関数の追加・削除・コスト更新と前計算の差分修復のテスト"""
+    print("\n" + "=" * 60)
+    print("テスト: カタログの差分更新")
+    print("=" * 60)
+
+    cat = make_catalog()
+    tree = cat.shortest_path_tree('D')
+    reach = cat.reachability()
+    cc = cat.compile()
+
+    # コスト更新：木の辺が高くなれば部分木だけ求め直す
+    cat.update_cost('bc', cost=5, confidence=0.5)
+    assert cat.get_function('bc').cost == 5.0 and cc.conf[cc.edge_of(cat.get_function('bc'))] == 0.5
+    assert cat.compile() is cc and cat.shortest_path_tree('D') is tree
+    assert tree.query('A')[0][0] == 4.0 and ids(tree.query('A')[0][1]) == ['ac', 'cd']
+    cat.update_cost('bc', cost=1)
+    assert ids(tree.query('A')[0][1]) == ['ab', 'bc', 'cd']
+
+    # 追加：辺IDは末尾に振られ、既存の辺IDは変わらない
+    cat.add_function({'id': 'ad', 'sig': 'A -> D', 'cost': 2})
+    assert ids(cat.funcs_from('A')) == ['ab', 'ac', 'ad']
+    assert cc.edge_of(cat.get_function('ad')) == 6
+    assert tree.query('A')[0][0] == 2.0
+    # SCC を併合しない辺は到達可能性に直接反映する
+    cat.add_function({'id': 'ea', 'sig': 'E -> A', 'cost': 1})
+    assert cat.reachability() is reach and cat.can_reach('E', 'D')
+    assert tree.cost('E') == 3.0
+
+    # 削除：削除した辺は探索に現れない
+    cat.remove_function('ad')
+    assert 'ad' not in ids(cat.funcs) and ids(cat.funcs_returning('D')) == ['cd', 'bd']
+    assert cc.removed == 1 and cat.compile() is cc
+    assert tree.query('A')[0][0] == 3.0
+    assert ids(synthesize_backward(cat, 'A', 'D')[0][1]) == ['ab', 'bc', 'cd']
+    cat.remove_function('ab')
+    cat.remove_function('ac')
+    assert tree.cost('A') == INF and not cat.can_reach('A', 'D')
+
+    # 新しく作り直したカタログと同じ結果
+    fresh = Catalog({'types': [{'name': t} for t in cat.types],
+                     'functions': [{'id': f.id, 'sig': f'{f.dom} -> {f.cod}', 'cost': f.cost}
+                                   for f in cat.funcs]})
+    for src in cc.type_names:
+        assert tree.cost(src) == fresh.shortest_path_tree('D').cost(src), src
+    try:
+        cat.remove_function('ab')
+        assert False, "存在しない関数の削除は KeyError"
+    except KeyError:
+        pass
+
+    print("✓ カタログの差分更新: 成功")
+    return True
+
+def test_synthesize_many():
+    """プロセスプールによる一括合成のテスト"""
+    print("\n" + "=" * 60)
+    print("テスト: 一括合成")
+    print("=" * 60)
+
+    from batch_synth import synthesize_many
+
+    cat = make_catalog()
+    cat.remove_function('db')  # 辺IDに欠番があっても親の Func に戻せる
+    queries = [(src, goal) for src in 'ABCD' for goal in 'ABCD']
+    expected = [synthesize_backward(cat, src, goal, max_cost=10) for src, goal in queries]
+    for workers in (1, 2):
+        done = list(synthesize_many(cat, iter(queries), workers=workers, max_cost=10, chunksize=3))
+        assert sorted(i for i, _, _, _ in done) == list(range(len(queries)))
+        for i, src, goal, results in done:
+            assert (src, goal) == queries[i]
+            assert results == expected[i], (src, goal)
+            # ワーカーは辺IDだけを返し、親のカタログの Func が使われる
+            assert all(f is cat.get_function(f.id) for _, path in results for f in path)
+
+    constraints = SearchConstraints(forbidden={'bc'})
+    [(_, _, _, results)] = synthesize_many(cat, [('A', 'D')], workers=2, constraints=constraints)
+    assert ids(results[0][1]) == ['ac', 'cd']
+
+    print("✓ 一括合成: 成功")
+    return True
+
+def test_query_cache():
+    """探索結果のLRUキャッシュ（メモリとSQLite）のテスト"""
+    print("\n" + "=" * 60)
+    print("テスト: 探索結果のキャッシュ")
+    print("=" * 60)
+
+    import os
+    import tempfile
+    from query_cache import QueryCache
+
+    cat = make_catalog()
+    cache = QueryCache(maxsize=2)
+    first = cache.synthesize(cat, 'A', 'D', max_cost=10)
+    assert first == synthesize_backward(cat, 'A', 'D', max_cost=10)
+    assert cache.synthesize(cat, 'A', 'D', max_cost=10) == first
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # 同じ内容の別のカタログ（読み直したカタログなど）は、そのカタログの Func で返す
+    shared = QueryCache()
+    shared.synthesize(cat, 'A', 'D', max_cost=10)
+    other = make_catalog()
+    again = shared.synthesize(other, 'A', 'D', max_cost=10)
+    assert again == first and all(f is other.get_function(f.id) for f in again[0][1])
+    assert shared.synthesize(other, 'A', 'C', max_cost=10)[0][0] == 2.0
+    assert shared.synthesize(make_catalog(), 'A', 'B', max_cost=10)[0][0] == 1.0
+    assert (shared.hits, shared.misses) == (1, 3)
+
+    # max_cost・制約が違えば別のキー
+    cache.synthesize(cat, 'A', 'D', max_cost=3)
+    limited = cache.synthesize(cat, 'A', 'D', max_cost=10,
+                               constraints=SearchConstraints(forbidden={'bc'}))
+    assert ids(limited[0][1]) == ['ac', 'cd']
+    assert cache.misses == 3 and cache.evictions == 1 and len(cache) == 2
+
+    # カタログを変更すると fingerprint が変わり、古い結果は使われない
+    cat.update_cost('bc', cost=5)
+    assert cache.synthesize(cat, 'A', 'D', max_cost=3) == []
+    assert cache.misses == 4
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'cache.sqlite')
+        cache = QueryCache(path=path)
+        cache.synthesize(cat, 'A', 'D', max_cost=10)
+        cache.close()
+        # 再起動後（別のプロセス・同じ内容のカタログ）も SQLite から取り出せる
+        cache = QueryCache(path=path)
+        other = make_catalog()
+        other.update_cost('bc', cost=5)
+        cached = cache.synthesize(other, 'A', 'D', max_cost=10)
+        assert cache.disk_hits == 1 and cache.misses == 0
+        assert cached == synthesize_backward(other, 'A', 'D', max_cost=10)
+        assert all(f is other.get_function(f.id) for f in cached[0][1])
+        assert cache.purge_stale(make_catalog()) == 1
+        cache.close()
+
+    print("✓ 探索結果のキャッシュ: 成功")
+    return True
+
+def test_scipy_backend():
+    """SciPy 疎行列バックエンドのテスト"""
+    print("\n" + "=" * 60)
+    print("テスト: SciPy バックエンド")
+    print("=" * 60)
+
+    from scipy_backend import HAS_SCIPY, sparse_graph
+
+    # 最短路を1本求めるだけなので、探索の制御・計測のオプションは拒否する
+    cat = make_catalog()
+    for options in ({'heuristic': 'alt'}, {'max_steps': 10}, {'max_results': 1},
+                    {'stats': SearchStats()}):
+        try:
+            synthesize_backward(cat, 'A', 'D', backend='scipy', **options)
+            assert False, f"ValueError expected for {options}"
+        except ValueError as e:
+            assert next(iter(options)) in str(e)
+
+    if not HAS_SCIPY:
+        print("⚠ scipy が見つかりません。スキップします。")
+        return True
+
+    cat.add_function({'id': 'aa', 'sig': 'A -> A2', 'cost': 0})
+    cat.add_function({'id': 'a2c', 'sig': 'A2 -> C', 'cost': 2})
+    cc = cat.compile()
+    for src in cc.type_names:
+        for goal in cc.type_names:
+            expected = synthesize_backward(cat, src, goal, max_cost=10)
+            got = synthesize_backward(cat, src, goal, max_cost=10, backend='scipy')
+            assert [c for c, _ in expected[:1]] == [c for c, _ in got], (src, goal)
+    # コスト0の関数も辺として扱う（同コストのどちらのパスでもよい）
+    cost, path = synthesize_backward(cat, 'A', 'D', backend='scipy')[0]
+    assert cost == 3.0 and ids(path) in (['ab', 'bc', 'cd'], ['aa', 'a2c', 'cd'])
+
+    graph = sparse_graph(cat)
+    assert sparse_graph(cat) is graph
+    many = graph.query_many([('A', 'D'), ('B', 'D'), ('D', 'A'), ('A', 'A')])
+    assert many[('B', 'D')][0][0] == 2.0 and many[('D', 'A')] == [] and many[('A', 'A')] == [(0.0, [])]
+    src, cost, path = graph.nearest_source(['A', 'B'], 'D')
+    assert (src, cost, ids(path)) == ('B', 2.0, ['bc', 'cd'])
+
+    # カタログを変更すると作り直される
+    cat.update_cost('cd', cost=10)
+    assert sparse_graph(cat) is not graph
+    assert synthesize_backward(cat, 'A', 'D', backend='scipy')[0][0] == 5.0
+
+    print("✓ SciPy バックエンド: 成功")
+    return True
+
+def test_subtyping():
+    """部分型宣言（type A <: B）のテスト"""
+    print("\n" + "=" * 60)
+    print("テスト: 部分型")
+    print("=" * 60)
+
+    dsl = """
+    type Electricity [unit=kWh]
+    type PurchasedElectricity <: Electricity [unit=kWh]
+    type GreenElectricity <: PurchasedElectricity
+    type Emission
+
+    fn electricityEmission {
+      sig: Electricity -> Emission
+      impl: formula("e = kwh * 0.5")
+      cost: 2
+    }
+    """
+    catalog_dict = parse_dsl_string(dsl)
+    types = {t['name']: t for t in catalog_dict['types']}
+    assert types['PurchasedElectricity']['subtype_of'] == ['Electricity']
+    assert types['PurchasedElectricity']['unit'] == 'kWh'
+    cat = Catalog(catalog_dict)
+
+    # 推移閉包
+    assert cat.is_subtype('GreenElectricity', 'Electricity')
+    assert not cat.is_subtype('Electricity', 'PurchasedElectricity')
+    assert cat.can_reach('GreenElectricity', 'Emission')
+
+    # 上位型の関数をコスト0の暗黙の辺で再利用する（パスには関数だけが並ぶ）
+    for src in ('PurchasedElectricity', 'GreenElectricity'):
+        cost, path = synthesize_backward(cat, src, 'Emission')[0]
+        assert cost == 2.0 and ids(path) == ['electricityEmission'], src
+        assert ids(synthesize_backward(cat, src, 'Emission', heuristic='alt')[0][1]) == ['electricityEmission']
+        assert synthesize_beam(cat, src, 'Emission', beam_width=1).best[0] == 2.0
+        assert cat.shortest_path_tree('Emission').query(src)[0][0] == 2.0
+    assert synthesize_backward(cat, 'GreenElectricity', 'Electricity') == [(0.0, [])]
+    assert synthesize_backward(cat, 'Electricity', 'GreenElectricity') == []
+    # 部分型はホップ数に数えない
+    limited = SearchConstraints(max_hops=1)
+    assert synthesize_backward(cat, 'GreenElectricity', 'Emission', constraints=limited)[0][0] == 2.0
+
+    # 部分型に専用の関数を足すと、安ければそちらを使う（最短路木も修復される）
+    tree = cat.shortest_path_tree('Emission')
+    cat.add_function({'id': 'greenEmission', 'sig': 'GreenElectricity -> Emission', 'cost': 1})
+    assert tree.query('GreenElectricity')[0][0] == 1.0
+    assert ids(synthesize_backward(cat, 'GreenElectricity', 'Emission')[0][1]) == ['greenEmission']
+    cat.remove_function('greenEmission')
+    assert ids(tree.query('GreenElectricity')[0][1]) == ['electricityEmission']
+
+    # 部分型宣言の追加・削除でも最短路木は同じオブジェクトのまま使える
+    cat.add_type({'name': 'SolarElectricity', 'subtype_of': ['GreenElectricity']})
+    assert cat.shortest_path_tree('Emission') is tree
+    assert tree.query('SolarElectricity')[0][0] == 2.0
+    cat.update_cost('electricityEmission', cost=1)
+    assert tree.cost('SolarElectricity') == 1.0
+    cat.remove_type('SolarElectricity')
+    assert tree.cost('SolarElectricity') == INF and not cat.is_subtype('SolarElectricity', 'Electricity')
+    cat.update_cost('electricityEmission', cost=2)
+    assert tree.cost('GreenElectricity') == 2.0
+
+    # 暗黙の辺を扱えない探索は拒否する
+    try:
+        synthesize_bidirectional(cat, 'PurchasedElectricity', 'Emission')
+        assert False, "ValueError expected"
+    except ValueError:
+        pass
+
+    print("✓ 部分型: 成功")
+    return True
+
+def test_catalog_cache():
+    """コンパイル済みカタログのキャッシュのテスト"""
+    print("\n" + "=" * 60)
+    print("テスト: コンパイル済みカタログのキャッシュ")
+    print("=" * 60)
+
+    import os
+    import tempfile
+    from catalog_cache import cache_path_for, read_catalog_cache
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'search.dsl')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(SEARCH_DSL + "\ntype A2 <: A\n")
+        fresh = Catalog.load(path, use_cache=False)
+        assert not os.path.exists(cache_path_for(path))
+
+        # 初回はパースしてキャッシュを作り、2回目はキャッシュから復元する
+        Catalog.load(path)
+        cached = read_catalog_cache(path)
+        assert cached is not None
+        assert cached.funcs == fresh.funcs and cached.types == fresh.types
+        assert cached.fingerprint() == fresh.fingerprint()
+        # 到達可能性インデックスは既定では保存しない（読み込んだだけで枝刈りを有効にしない）
+        assert cached.compile().reachability is None
+        assert cached.is_subtype('A2', 'A')
+        for src in ('A', 'A2', 'B'):
+            assert synthesize_backward(cached, src, 'D') == synthesize_backward(fresh, src, 'D')
+        # 復元したカタログも変更できる
+        cached.update_cost('bc', cost=5)
+        assert ids(synthesize_backward(cached, 'A', 'D')[0][1]) == ['ac', 'cd']
+
+        # 指定すれば保存し、型の数が上限を超えるカタログでは保存しない
+        import catalog_cache
+        catalog_cache.build_catalog_cache(path, include_reachability=True)
+        reach = read_catalog_cache(path).compile().reachability
+        assert reach is not None and reach.can_reach(0, 0)
+        limit = catalog_cache.REACHABILITY_MAX_TYPES
+        catalog_cache.REACHABILITY_MAX_TYPES = 2
+        try:
+            catalog_cache.build_catalog_cache(path, include_reachability=True)
+        finally:
+            catalog_cache.REACHABILITY_MAX_TYPES = limit
+        assert read_catalog_cache(path).compile().reachability is None
+
+        # 更新時刻だけ変わった場合は内容のハッシュで検証して使う
+        os.utime(path, ns=(0, 0))
+        assert read_catalog_cache(path) is not None
+        # 内容が変われば使わず、Catalog.load が作り直す
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write("type E\n")
+        assert read_catalog_cache(path) is None
+        assert 'E' in Catalog.load(path).types
+        assert 'E' in read_catalog_cache(path).types
+
+        # 壊れたキャッシュは無視する
+        with open(cache_path_for(path), 'wb') as f:
+            f.write(b'broken')
+        assert read_catalog_cache(path) is None
+        assert 'E' in Catalog.load(path).types
+
+    print("✓ コンパイル済みカタログのキャッシュ: 成功")
+    return True
+
+def test_dsl_imports():
+    """import による複数ファイルのカタログのテスト"""
+    print("\n" + "=" * 60)
+    print("テスト: 複数ファイルのカタログ")
+    print("=" * 60)
+
+    import os
+    import tempfile
+    import dsl_imports
+    from catalog_cache import decls_cache_path_for, read_catalog_cache
+    from dsl_imports import DSLImportError, load_dsl_catalog, load_dsl_files
+    from dsl_parser import DSLSyntaxError
+
+    sources = {
+        'all.dsl': 'import "scope/ab.dsl"\nimport "cd.dsl"\ntype D\n',
+        'scope/ab.dsl': 'import "../base.dsl"\nfn ab {\n  sig: A -> B\n  cost: 1\n}\n',
+        'cd.dsl': 'import "base.dsl"\nfn bc {\n  sig: B -> C\n  cost: 1\n}\nfn cd {\n  sig: C -> D\n  cost: 1\n}\n',
+        'base.dsl': 'type A\ntype B\ntype C\n',
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        def write(name, text):
+            path = os.path.join(tmp, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(text)
+            return path
+        for name, text in sources.items():
+            write(name, text)
+        root = os.path.join(tmp, 'all.dsl')
+
+        # import 先が先になる順で併合する（共有される base.dsl は一度だけ）
+        files = load_dsl_files(root, use_cache=False)
+        names = [os.path.relpath(f.path, tmp) for f in files]
+        assert names == ['base.dsl', os.path.join('scope', 'ab.dsl'), 'cd.dsl', 'all.dsl'], names
+        cat = Catalog.from_dsl(root)
+        assert list(cat.types) == ['A', 'B', 'C', 'D']
+        assert ids(synthesize_backward(cat, 'A', 'D')[0][1]) == ['ab', 'bc', 'cd']
+
+        # 並列に読んでも同じ順・同じ内容
+        saved = dsl_imports.PARALLEL_MIN_BYTES
+        dsl_imports.PARALLEL_MIN_BYTES = 0
+        try:
+            parallel = load_dsl_catalog(root, workers=2, use_cache=False)
+        finally:
+            dsl_imports.PARALLEL_MIN_BYTES = saved
+        assert parallel.fingerprint() == cat.fingerprint()
+
+        # ファイルごとのキャッシュ：変更したファイルだけをパースし直す
+        assert Catalog.load(root).fingerprint() == cat.fingerprint()
+        assert all(os.path.exists(decls_cache_path_for(f.path)) for f in files)
+        calls = []
+        parse = dsl_imports.parse_dsl_source
+        dsl_imports.parse_dsl_source = lambda path: calls.append(path) or parse(path)
+        try:
+            write('cd.dsl', sources['cd.dsl'].replace('cost: 1\n}\nfn cd', 'cost: 7\n}\nfn cd'))
+            assert read_catalog_cache(root) is None  # import 先の変更も検出する
+            reloaded = Catalog.load(root)
+        finally:
+            dsl_imports.parse_dsl_source = parse
+        assert calls == [os.path.join(tmp, 'cd.dsl')], calls
+        assert reloaded.get_function('bc').cost == 7.0
+        assert read_catalog_cache(root).get_function('bc').cost == 7.0
+
+        # 循環と存在しない import 先
+        write('base.dsl', 'import "all.dsl"\n' + sources['base.dsl'])
+        try:
+            load_dsl_files(root, use_cache=False)
+            assert False, "DSLImportError expected"
+        except DSLImportError as e:
+            assert 'import cycle' in str(e) and 'base.dsl' in str(e), e
+        write('base.dsl', 'import "missing.dsl"\n')
+        try:
+            load_dsl_files(root, use_cache=False)
+            assert False, "DSLImportError expected"
+        except DSLImportError as e:
+            assert 'missing.dsl' in str(e), e
+
+        # 構文エラーにはファイル名が付く
+        write('base.dsl', 'fn f {\n  cost: high\n}\n')
+        try:
+            load_dsl_files(root, use_cache=False)
+            assert False, "DSLSyntaxError expected"
+        except DSLSyntaxError as e:
+            assert e.path == os.path.join(tmp, 'base.dsl') and e.line == 2, e
+
+    print("✓ 複数ファイルのカタログ: 成功")
+    return True
+
+def test_catalog_watch():
+    """カタログの監視と差分反映のテスト"""
+    print("\n" + "=" * 60)
+    print("テスト: カタログの監視")
+    print("=" * 60)
+
+    import os
+    import tempfile
+    from catalog_watch import CatalogWatcher, split_blocks
+    from dsl_parser import DSLSyntaxError
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'search.dsl')
+        stamp = [0]
+
+        def save(text):
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(text)
+            stamp[0] += 1  # 同じ時刻・同じサイズの書き込みでも変更として検出させる
+            os.utime(path, ns=(stamp[0], stamp[0]))
+
+        text = SEARCH_DSL
+        save(text)
+        assert ''.join(split_blocks(text)) == text
+        watcher = CatalogWatcher(path)
+        cat = watcher.catalog
+        assert cat.fingerprint() == Catalog.from_dsl(path).fingerprint()
+        tree = cat.shortest_path_tree('D')
+        cat.reachability()
+        assert watcher.poll() == []
+
+        def check(edited):
+            # 差分を反映したカタログは読み込み直したカタログと同じ結果を返す
+            fresh = Catalog.from_dsl(path)
+            assert sorted(f.id for f in cat.funcs) == sorted(f.id for f in fresh.funcs)
+            for src in 'ABCD':
+                assert tree.cost(src) == fresh.shortest_path_tree('D').cost(src), (edited, src)
+                assert cat.can_reach(src, 'D') == fresh.can_reach(src, 'D'), (edited, src)
+                assert ([c for c, _ in synthesize_backward(cat, src, 'D')] ==
+                        [c for c, _ in synthesize_backward(fresh, src, 'D')]), (edited, src)
+
+        # コストだけの変更は update_cost で反映し、変わったブロックだけをパースする
+        text = text.replace('formula("c = b")\n  cost: 1', 'formula("c = b")\n  cost: 9')
+        save(text)
+        [change] = watcher.poll()
+        assert change.updated == ['bc'] and not change.added and not change.removed
+        assert change.parsed_blocks == 1
+        check('cost')
+
+        # シグネチャの変更・関数の追加・型の追加
+        text = text.replace('sig: C -> D', 'sig: B -> D') + 'type E\nfn ea {\n  sig: E -> A\n  cost: 1\n}\n'
+        save(text)
+        [change] = watcher.poll()
+        assert change.removed == ['cd'] and sorted(change.added) == ['cd', 'ea']
+        assert change.types == ['E'] and 'E' in cat.types
+        check('sig')
+        assert tree.cost('E') == cat.shortest_path_tree('D').cost('E') < INF
+
+        # 構文エラーは反映しない（直して保存すれば反映される）
+        save(text + 'fn broken {\n  sig: A -> D\n')
+        try:
+            watcher.poll()
+            assert False, "DSLSyntaxError expected"
+        except DSLSyntaxError as e:
+            assert e.path == path
+        assert 'broken' not in {f.id for f in cat.funcs}
+        text += 'fn broken {\n  sig: A -> D\n  cost: 0.5\n}\n'
+        save(text)
+        [change] = watcher.poll()
+        assert change.added == ['broken']
+        check('fixed')
+
+        # 部分型宣言の追加・削除（保持している最短路木もそのまま修復され続ける）
+        save(text + 'type G <: B\n')
+        [change] = watcher.poll()
+        assert change.types == ['G'] and tree.cost('G') == tree.cost('B') < INF
+        text = text.replace('formula("c = b")\n  cost: 9', 'formula("c = b")\n  cost: 1')
+        save(text + 'type G <: B\n')
+        watcher.poll()
+        check('subtype')
+        assert tree.cost('G') == cat.shortest_path_tree('D').cost('G') == tree.cost('B')
+        save(text)
+        [change] = watcher.poll()
+        assert change.types == ['G'] and tree.cost('G') == INF
+        check('subtype removed')
+
+        # import の追加と削除
+        other = os.path.join(tmp, 'other.dsl')
+        with open(other, 'w', encoding='utf-8') as f:
+            f.write('type F\nfn fa {\n  sig: F -> A\n  cost: 1\n}\n')
+        save('import "other.dsl"\n' + text)
+        changes = watcher.poll()
+        assert [c.path for c in changes] == [other, path]
+        assert changes[0].added == ['fa'] and sorted(watcher.paths) == sorted([path, other])
+        assert tree.cost('F') < INF
+        save(text)
+        changes = watcher.poll()
+        assert changes[-1].path == other and changes[-1].removed == ['fa']
+        assert 'F' not in cat.types and watcher.paths == [path]
+        check('import')
+
+    print("✓ カタログの監視: 成功")
+    return True
+
+def main():
+    """すべてのテストを実行"""
+    tests = [
+        test_compiled_catalog,
+        test_long_chain_path,
+        test_alt_heuristic,
+        test_k_best_paths,
+        test_bidirectional_search,
+        test_shortest_path_tree_cache,
+        test_path_index,
+        test_pareto_search,
+        test_search_stats,
+        test_anytime_search,
+        test_reachability_pruning,
+        test_search_constraints,
+        test_beam_search,
+        test_contraction_hierarchy,
+        test_catalog_mutation,
+        test_synthesize_many,
+        test_query_cache,
+        test_scipy_backend,
+        test_subtyping,
+        test_catalog_cache,
+        test_dsl_imports,
+        test_catalog_watch,
+    ]
+
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            print(f"\n✗ テスト失敗: {test.__name__}")
+            print(f"  エラー: {e}")
+            failed += 1
+
+    print(f"\n成功: {len(tests) - failed}/{len(tests)}")
+    return 0 if failed == 0 else 1
+
+if __name__ == '__main__':
+    sys.exit(main())